@@ -2,6 +2,12 @@
 ASGI config for DairySync project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The dashboard and animal detail pages keep their sync views here too unless
+DAIRYSYNC_ASYNC_VIEWS=1 is set (see settings):
+
+    uvicorn DairySync.asgi:application --workers 4
+
+``manage.py bench_async_views`` compares the async views' throughput with WSGI.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
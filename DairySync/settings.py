@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,11 +44,13 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'dairysyncapp.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'dairysyncapp.middleware.TenantMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -56,7 +59,8 @@ ROOT_URLCONF = 'DairySync.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to PerformanceMiddleware
+        'BACKEND': 'dairysyncapp.templating.TimedDjangoTemplates',
         'DIRS': ['templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -82,6 +86,130 @@ DATABASES = {
     }
 }
 
+# Set DAIRYSYNC_DB_PROFILE=production to tune SQLite for several concurrent
+# writers. WAL lets readers carry on while a write commits, and
+# synchronous=NORMAL is safe under WAL (only the last commits can be lost on
+# power failure, never the file). busy_timeout makes a blocked writer wait
+# for the lock instead of failing with "database is locked", and IMMEDIATE
+# transactions take the write lock at BEGIN, so a transaction that read first
+# never has to upgrade its lock mid-way (SQLite fails that upgrade at once,
+# whatever the timeout). cache_size is in KiB when negative.
+DAIRYSYNC_DB_PROFILE = os.environ.get('DAIRYSYNC_DB_PROFILE', 'development')
+
+DAIRYSYNC_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+DAIRYSYNC_SQLITE_PRODUCTION = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in DAIRYSYNC_SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 5,
+    },
+}
+
+# Set DAIRYSYNC_DB_ENGINE=postgresql to use PostgreSQL instead, configured
+# from the POSTGRES_* variables, with psycopg's connection pool (install
+# "psycopg[binary,pool]"). Pooled connections replace CONN_MAX_AGE, which
+# must stay 0. Migration 0019 partitions DailyLog by year there; run
+# "manage.py create_log_partitions" yearly to add the next partition.
+# For a local server:
+#   docker run -d -p 5432:5432 -e POSTGRES_DB=dairysync -e POSTGRES_PASSWORD=dairysync postgres:17
+DAIRYSYNC_DB_ENGINE = os.environ.get('DAIRYSYNC_DB_ENGINE', 'sqlite')
+
+if DAIRYSYNC_DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'dairysync'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.environ.get('POSTGRES_POOL_MAX_SIZE', 10)),
+                    'timeout': 10,
+                },
+            },
+        }
+    }
+elif DAIRYSYNC_DB_PROFILE == 'production':
+    DATABASES['default'].update(DAIRYSYNC_SQLITE_PRODUCTION)
+
+
+# Caches
+# The 'views' cache holds view data invalidated by model signals (see
+# dairysyncapp/caching.py). It must be shared by every process that writes
+# (web workers, run_worker, management commands): with a per-process cache
+# such as LocMemCache a write in one process never invalidates another's
+# entries, which then stay stale until they time out. The file cache works
+# for processes on one host; use Redis or Memcached across hosts.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'views': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.view_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    'perf': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.perf_cache',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+DAIRYSYNC_VIEW_CACHE_ALIAS = 'views'
+DAIRYSYNC_VIEW_CACHE_TIMEOUT = 300
+
+# Request timing histograms kept by PerformanceMiddleware. Each process
+# aggregates in memory and writes a snapshot every FLUSH_INTERVAL seconds to
+# the 'perf' cache, shared between processes, where perf_report reads them.
+# Off by default; set DAIRYSYNC_PERF=1 to collect.
+DAIRYSYNC_PERF_ENABLED = os.environ.get('DAIRYSYNC_PERF') == '1'
+DAIRYSYNC_PERF_CACHE_ALIAS = 'perf'
+DAIRYSYNC_PERF_FLUSH_INTERVAL = 10
+
+# Route the dashboard and animal detail pages to their async views, which
+# gather their independent queries. Off by default, also under ASGI: the
+# async ORM still runs every query on the request's one sync thread, so the
+# gathered queries run one at a time and the thread hops only add cost.
+# bench_async_views (400 requests, 16 clients, 200 animals x 90 days):
+#   wsgi  151 req/s, p50  57 ms
+#   asgi   73 req/s, p50 216 ms
+# Set DAIRYSYNC_ASYNC_VIEWS=1 to try them, e.g. with
+#   uvicorn DairySync.asgi:application --workers 4
+DAIRYSYNC_ASYNC_VIEWS = os.environ.get('DAIRYSYNC_ASYNC_VIEWS') == '1'
+
+# Large imports and exports, bulk deletes and the maintenance tasks run as
+# background jobs queued in the Job table, so no broker is needed. Start a
+# worker (one process per CPU by default) next to the web server:
+#   python manage.py run_worker
+# Uploaded import files and finished exports are kept in this directory,
+# which the worker and the web server must share.
+DAIRYSYNC_JOB_FILES_DIR = BASE_DIR / 'job_files'
+
+# Default prices for the feed efficiency report's cost columns; the report
+# page can override them. Leave None to hide feed cost and margin.
+DAIRYSYNC_FEED_COST_PER_KG = None
+DAIRYSYNC_MILK_PRICE_PER_LITRE = None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -113,6 +241,9 @@ USE_I18N = True
 
 USE_TZ = True
 
+# where login_required sends anonymous users
+LOGIN_URL = 'login'
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
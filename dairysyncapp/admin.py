@@ -2,7 +2,12 @@ from django.contrib import admin
 from dairysyncapp.models import *
 
 # Register your models here.
+admin.site.register(Farm)
 admin.site.register(Profile)
 admin.site.register(Animal)
 admin.site.register(DailyLog)
 
+admin.site.register(AnimalProductionRollup)
+admin.site.register(HerdStats)
+admin.site.register(HerdDayStats)
+admin.site.register(Job)
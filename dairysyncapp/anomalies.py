@@ -0,0 +1,242 @@
+"""
+Batch anomaly detection over daily logs.
+
+Each animal's milk, temperature, feed and water series is compared with
+its own recent history: a rolling mean and standard deviation over the
+previous ``ROLLING_WINDOW`` logs, and an exponentially weighted moving
+average (EWMA) of the days before. A value is flagged when it departs from
+both by at least ``Z_THRESHOLD`` rolling standard deviations in the
+worrying direction, e.g. a sudden milk drop, which is often the first sign
+of mastitis, or a temperature spike.
+
+The herd is scored at once: logs are laid out as an (animal, day) NumPy
+matrix, rolling sums come from cumulative sums along the rows, and the
+EWMA advances one column at a time for every animal together.
+
+Runs are incremental. Each AnomalyScan records how far it read each
+farm's change sequence, and the next run rescores only the animals whose
+logs were written or deleted since, from their earliest changed date, with
+``WARMUP_DAYS`` of earlier history so the baselines are the same as a
+full rescore. Farms whose sequence has not moved are not queried at all.
+"""
+import operator
+from datetime import date, timedelta
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Min, Q
+
+from .caching import invalidate
+from .models import AnomalyFlag, AnomalyScan, DailyLog, SyncCounter, Tombstone
+
+ROLLING_WINDOW = 14
+EWMA_ALPHA = 0.2
+# logs needed before an animal's value can be flagged
+MIN_HISTORY = 7
+Z_THRESHOLD = 3.0
+# history read before the first rescored day; EWMA weights fall below 1e-5 after 60 days
+WARMUP_DAYS = 60
+
+# metric -> (DailyLog column, direction that is a problem, smallest standard
+# deviation, smallest change from the EWMA as a fraction of it); the last two
+# keep normal day-to-day noise in a steady series from being flagged
+METRICS = {
+    'milk': ('total_milk', -1, 0.5, 0.2),
+    'temperature': ('temperature', 1, 0.2, 0.015),
+    'feed': ('feed_amount', -1, 0.5, 0.2),
+    'water': ('water', -1, 2.0, 0.2),
+}
+
+FLAG_BATCH_SIZE = 1000
+RANGES_PER_QUERY = 100
+
+
+def require_numpy():
+    try:
+        import numpy
+    except ImportError as exc:
+        raise ImportError('Anomaly detection requires the numpy package.') from exc
+    return numpy
+
+
+def score_series(np, group, position, values, direction, min_std, min_change):
+    """
+    Score one metric laid out by ``group`` (animal index) and ``position``
+    (log index within the animal). Returns ``(flagged, expected, zscore)``
+    arrays aligned with ``values``; NaN values are skipped.
+    """
+    groups, length = group.max() + 1, position.max() + 1
+    matrix = np.full((groups, length), np.nan)
+    matrix[group, position] = values
+    present = ~np.isnan(matrix)
+    filled = np.where(present, matrix, 0.0)
+
+    # sums over the previous ROLLING_WINDOW columns from cumulative sums
+    def previous(array):
+        cumulative = np.zeros((groups, length + 1))
+        np.cumsum(array, axis=1, out=cumulative[:, 1:])
+        columns = np.arange(length)
+        return cumulative[:, columns] - cumulative[:, np.maximum(columns - ROLLING_WINDOW, 0)]
+
+    count = previous(present.astype(np.float64))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = previous(filled) / count
+        variance = previous(filled * filled) / count - mean * mean
+    std = np.maximum(np.sqrt(np.maximum(variance, 0.0)), min_std)
+
+    # EWMA of the values before each column
+    expected = np.full((groups, length), np.nan)
+    ewma = np.full(groups, np.nan)
+    for column in range(length):
+        expected[:, column] = ewma
+        value = matrix[:, column]
+        ewma = np.where(
+            np.isnan(value), ewma,
+            np.where(np.isnan(ewma), value, EWMA_ALPHA * value + (1 - EWMA_ALPHA) * ewma),
+        )
+
+    zscore = (matrix - mean) / std
+    ewma_zscore = (matrix - expected) / std
+    with np.errstate(invalid='ignore'):
+        flagged = (
+            present
+            & (count >= MIN_HISTORY)
+            & (direction * zscore >= Z_THRESHOLD)
+            & (direction * ewma_zscore >= Z_THRESHOLD)
+            & (direction * (matrix - expected) >= min_change * np.abs(expected))
+        )
+    return flagged[group, position], expected[group, position], zscore[group, position]
+
+
+def score_logs(np, animal, day, columns):
+    """
+    Score logs sorted by animal then day. ``columns`` maps each METRICS
+    column to a float array (NaN for missing). Returns a list of
+    ``(animal_id, ordinal day, metric, value, expected, zscore)``.
+    """
+    n = len(animal)
+    if not n:
+        return []
+    first = np.ones(n, dtype=bool)
+    first[1:] = animal[1:] != animal[:-1]
+    group = np.cumsum(first) - 1
+    starts = np.flatnonzero(first)
+    position = np.arange(n) - starts[group]
+
+    flags = []
+    for metric, (column, direction, min_std, min_change) in METRICS.items():
+        values = columns[column]
+        flagged, expected, zscore = score_series(np, group, position, values, direction, min_std, min_change)
+        for index in np.flatnonzero(flagged).tolist():
+            flags.append((
+                int(animal[index]), int(day[index]), metric,
+                float(values[index]), float(expected[index]), float(zscore[index]),
+            ))
+    return flags
+
+
+def changed_ranges(read_up_to, up_to):
+    """
+    ``Q`` objects matching, for each farm whose sequence moved, its rows
+    numbered after ``read_up_to`` and up to ``up_to``; both are
+    ``{farm key: sequence}`` (JSON keys are strings)
+    """
+    ranges = []
+    for key, last in up_to.items():
+        first = read_up_to.get(str(key), 0)
+        if last > first:
+            farm = Q(farm_id=key) if key else Q(farm__isnull=True)
+            ranges.append(farm & Q(sync_seq__gt=first, sync_seq__lte=last))
+    return ranges
+
+
+def changed_animals(read_up_to, up_to):
+    """
+    ``{animal_id: earliest changed date}`` for the logs written or deleted
+    between the ``read_up_to`` and ``up_to`` sequences of each farm
+    """
+    changed = {}
+    ranges = changed_ranges(read_up_to, up_to)
+    # a few farms per query keeps the OR within SQLite's expression depth
+    for start in range(0, len(ranges), RANGES_PER_QUERY):
+        condition = reduce(operator.or_, ranges[start:start + RANGES_PER_QUERY])
+        sources = [
+            DailyLog.objects.filter(condition),
+            Tombstone.objects.filter(condition, kind='dailylog'),
+        ]
+        for queryset in sources:
+            for animal_id, first_date in queryset.order_by().values('animal_id').annotate(
+                first_date=Min('date')
+            ).values_list('animal_id', 'first_date'):
+                if animal_id is not None and (animal_id not in changed or first_date < changed[animal_id]):
+                    changed[animal_id] = first_date
+    return changed
+
+
+def _load_logs(np, animal_ids, since):
+    queryset = DailyLog.objects.order_by('animal_id', 'date')
+    if animal_ids is not None:
+        queryset = queryset.filter(animal_id__in=animal_ids)
+    if since is not None:
+        queryset = queryset.filter(date__gte=since - timedelta(days=WARMUP_DAYS))
+    names = [column for column, _, _, _ in METRICS.values()]
+    rows = list(queryset.values_list('animal_id', 'date', 'farm_id', *names).iterator(chunk_size=5000))
+    animal = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    day = np.fromiter((row[1].toordinal() for row in rows), dtype=np.int64, count=len(rows))
+    columns = {
+        name: np.fromiter(
+            (np.nan if row[offset] is None else float(row[offset]) for row in rows),
+            dtype=np.float64, count=len(rows),
+        )
+        for offset, name in enumerate(names, start=3)
+    }
+    farms = {row[0]: row[2] for row in rows}
+    return animal, day, columns, farms
+
+
+def detect_anomalies(full=False):
+    """
+    Score the logs changed since the last scan, or every log with
+    ``full``, replace their flags and return the AnomalyScan recorded
+    """
+    np = require_numpy()
+    up_to = SyncCounter.values()
+    previous = AnomalyScan.objects.order_by('-id').first()
+
+    if full or previous is None:
+        animal_ids = since = None
+    else:
+        changed = changed_animals(previous.sync_seqs, up_to)
+        if not changed:
+            return AnomalyScan.objects.create(sync_seqs=up_to)
+        # rescoring every changed animal from the earliest change keeps this to one query
+        animal_ids, since = set(changed), min(changed.values())
+
+    animal, day, columns, farms = _load_logs(np, animal_ids, since)
+    flags = [
+        AnomalyFlag(
+            animal_id=animal_id, farm_id=farms[animal_id], date=date.fromordinal(ordinal), metric=metric,
+            value=value, expected=expected, zscore=zscore,
+        )
+        for animal_id, ordinal, metric, value, expected, zscore in score_logs(np, animal, day, columns)
+        if since is None or ordinal >= since.toordinal()
+    ]
+
+    with transaction.atomic():
+        stale = AnomalyFlag.objects.all()
+        if animal_ids is not None:
+            stale = stale.filter(animal_id__in=animal_ids, date__gte=since)
+        stale.delete()
+        AnomalyFlag.objects.bulk_create(flags, batch_size=FLAG_BATCH_SIZE)
+        scan = AnomalyScan.objects.create(sync_seqs=up_to, rows_scored=len(animal), flags=len(flags))
+    invalidate('anomaly')
+    return scan
+
+
+def recent_anomalies(today, days=7, limit=20):
+    """Flags from the last ``days`` days, newest first"""
+    return (
+        AnomalyFlag.objects.filter(date__gte=today - timedelta(days=days))
+        .select_related('animal')
+        .order_by('-date', 'zscore')[:limit]
+    )
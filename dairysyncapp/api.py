@@ -0,0 +1,325 @@
+"""
+JSON API over animals and daily logs for the field app.
+
+List endpoints page newest first with opaque keyset cursors (``?cursor=``,
+``?page_size=``), and every GET takes ``?fields=a,b`` to return only those
+columns, which are also the only columns read from the database.
+
+Detail responses carry an ``ETag`` and ``Last-Modified`` derived from
+``updated_at``; list responses carry an ``ETag`` built from one grouped
+query over the listed rows (each farm's highest ``sync_seq`` and row
+count), so an unchanged list is answered without reading or serializing
+the page. Matching ``If-None-Match`` / ``If-Modified-Since`` requests get
+``304 Not Modified``, and writes honour ``If-Match`` with ``412``.
+"""
+import base64
+import hashlib
+import json
+from functools import wraps
+
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Q
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_http_methods
+
+from .filters import LOG_SORTS, filter_logs
+from .models import Animal, DailyLog, Job
+from .tenancy import current_farm_id
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+ANIMAL_FIELDS = [
+    'id', 'name', 'species', 'breed', 'gender', 'health_status', 'created_at', 'updated_at',
+]
+ANIMAL_WRITABLE = ['name', 'species', 'breed', 'gender', 'health_status']
+
+LOG_FIELDS = [
+    'id', 'animal_id', 'date', 'morning_milk', 'afternoon_milk', 'evening_milk', 'total_milk',
+    'feed_amount', 'water', 'temperature', 'health_observations', 'activity', 'notes',
+    'created_at', 'updated_at',
+]
+LOG_WRITABLE = [
+    'animal_id', 'date', 'morning_milk', 'afternoon_milk', 'evening_milk', 'feed_amount',
+    'water', 'temperature', 'health_observations', 'activity', 'notes',
+]
+
+JOB_FIELDS = [
+    'id', 'kind', 'status', 'progress', 'total', 'message', 'result', 'error', 'attempts',
+    'created_at', 'started_at', 'finished_at',
+]
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400, details=None):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def json_response(data, status=200):
+    """``data`` as JSON, with dates and decimals encoded"""
+    return JsonResponse(data, status=status, encoder=DjangoJSONEncoder)
+
+
+def api_view(*methods):
+    """Require one of ``methods`` and a logged-in user, and turn ApiError into JSON"""
+    def decorator(view):
+        @require_http_methods(methods)
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return json_response({'error': 'Authentication required.'}, status=401)
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as e:
+                body = {'error': str(e)}
+                if e.details:
+                    body['details'] = e.details
+                return json_response(body, status=e.status)
+            except PermissionDenied as e:
+                return json_response({'error': str(e) or 'Permission denied.'}, status=403)
+        return wrapper
+    return decorator
+
+
+def _requested_fields(request, allowed):
+    fields = [name.strip() for name in request.GET.get('fields', '').split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields or list(allowed)
+
+
+def _page_size(request):
+    try:
+        page_size = int(request.GET.get('page_size', API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('page_size must be a whole number.')
+    return max(1, min(page_size, API_MAX_PAGE_SIZE))
+
+
+def _encode_cursor(value, row_id):
+    raw = json.dumps([value, row_id], cls=DjangoJSONEncoder).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return value, int(row_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ApiError('Invalid cursor.')
+
+
+def _keyset_page(request, queryset, column, fields):
+    """
+    Return ``(rows, next_cursor)`` for the page of ``queryset`` ordered by
+    (-column, -id) that starts after ``?cursor=``
+    """
+    cursor = request.GET.get('cursor')
+    if cursor:
+        value, last_id = _decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f'{column}__lt': value}) | Q(**{column: value, 'id__lt': last_id}))
+    page_size = _page_size(request)
+
+    # the ordering columns are read even when not requested, to build the cursor
+    columns = list(dict.fromkeys([*fields, column, 'id']))
+    try:
+        rows = list(queryset.order_by(f'-{column}', '-id').values(*columns)[:page_size + 1])
+    except (ValidationError, ValueError):
+        raise ApiError('Invalid cursor.')
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = _encode_cursor(rows[-1][column], rows[-1]['id'])
+    return [{name: row[name] for name in fields} for row in rows], next_cursor
+
+
+def conditional_json(request, changes, build):
+    """
+    Answer a GET with ``build()`` as JSON, skipping it when the client's
+    ETag still matches the query string and the rows of the ``changes``
+    queryset: for each farm, their highest ``sync_seq``, which every write
+    in the farm raises, and their count, which every delete lowers.
+    Sequences are numbered per farm, so one maximum over several farms
+    would miss writes in all but the busiest.
+    """
+    state = sorted(
+        changes.order_by().values('farm_id').annotate(latest=Max('sync_seq'), count=Count('id'))
+        .values_list('farm_id', 'latest', 'count'),
+        key=lambda row: row[0] or 0,
+    )
+    etag = quote_etag(hashlib.sha1(
+        f"{state}:{current_farm_id()}:{request.get_full_path()}".encode()
+    ).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+
+    response = json_response(build())
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _list_response(request, changes, build):
+    """Answer a list GET with ``build()``'s rows and cursor, conditionally on ``changes``"""
+    def page():
+        rows, next_cursor = build()
+        return {'results': rows, 'next_cursor': next_cursor}
+    return conditional_json(request, changes, page)
+
+
+def _detail_validators(queryset, pk):
+    """Return ``(etag, last_modified)`` for one row from its ``updated_at``"""
+    updated_at = queryset.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        raise ApiError('Not found.', status=404)
+    return quote_etag(f'{pk}-{updated_at.timestamp():.6f}'), int(updated_at.timestamp())
+
+
+def _detail_response(request, queryset, pk, allowed, status=200):
+    fields = _requested_fields(request, allowed)
+    etag, last_modified = _detail_validators(queryset, pk)
+    if request.method in ('GET', 'HEAD'):
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+
+    row = queryset.filter(pk=pk).values(*fields).first()
+    response = json_response(row, status=status)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _check_preconditions(request, queryset, pk):
+    """412 when If-Match / If-Unmodified-Since no longer match the stored row"""
+    etag, last_modified = _detail_validators(queryset, pk)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        raise ApiError('The resource has changed since it was fetched.', status=412)
+
+
+def read_body(request):
+    """The request's JSON object body, or ApiError"""
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError('Request body must be JSON.')
+    if not isinstance(data, dict):
+        raise ApiError('Request body must be a JSON object.')
+    return data
+
+
+def _save(obj, data, writable):
+    unknown = [name for name in data if name not in writable]
+    if unknown:
+        raise ApiError(f"Field(s) cannot be written: {', '.join(unknown)}")
+    for name, value in data.items():
+        setattr(obj, name, value)
+    try:
+        obj.full_clean()
+    except ValidationError as e:
+        raise ApiError('Invalid data.', details=e.message_dict)
+    obj.save()
+    return obj
+
+
+def _check_animal(data):
+    # a log may only name an animal of the current farm; malformed ids are
+    # left for full_clean() to report
+    if 'animal_id' not in data:
+        return data
+    try:
+        found = Animal.objects.filter(pk=data['animal_id']).exists()
+    except (TypeError, ValueError, ValidationError):
+        return data
+    if not found:
+        raise ApiError('Invalid data.', details={'animal': ['Animal not found.']})
+    return data
+
+
+@api_view('GET', 'HEAD', 'POST')
+def animals(request):
+    if request.method == 'POST':
+        animal = _save(Animal(), read_body(request), ANIMAL_WRITABLE)
+        return _detail_response(request, Animal.objects.all(), animal.pk, ANIMAL_FIELDS, status=201)
+
+    fields = _requested_fields(request, ANIMAL_FIELDS)
+    queryset = Animal.objects.all()
+    return _list_response(request, queryset, lambda: _keyset_page(request, queryset, 'id', fields))
+
+
+@api_view('GET', 'HEAD', 'PATCH', 'DELETE')
+def animal(request, animal_id):
+    queryset = Animal.objects.all()
+    if request.method in ('GET', 'HEAD'):
+        return _detail_response(request, queryset, animal_id, ANIMAL_FIELDS)
+
+    _check_preconditions(request, queryset, animal_id)
+    instance = queryset.get(pk=animal_id)
+    if request.method == 'DELETE':
+        instance.delete()
+        return HttpResponse(status=204)
+    _save(instance, read_body(request), ANIMAL_WRITABLE)
+    return _detail_response(request, queryset, animal_id, ANIMAL_FIELDS)
+
+
+@api_view('GET', 'HEAD', 'POST')
+def logs(request):
+    """
+    Daily logs, filtered like manage_logs (animal, date_from, date_to,
+    health) and ordered by date or, with ``?sort=milk``, by total milk
+    """
+    if request.method == 'POST':
+        log = _save(DailyLog(created_by=request.user), _check_animal(read_body(request)), LOG_WRITABLE)
+        return _detail_response(request, DailyLog.objects.all(), log.pk, LOG_FIELDS, status=201)
+
+    fields = _requested_fields(request, LOG_FIELDS)
+    sort = request.GET.get('sort', 'date')
+    if sort not in LOG_SORTS:
+        raise ApiError(f"sort must be one of: {', '.join(LOG_SORTS)}")
+
+    try:
+        queryset, _ = filter_logs(request.GET)
+    except (ValidationError, ValueError) as e:
+        raise ApiError(f'Invalid filter: {e}')
+    queryset = queryset.select_related(None)
+    return _list_response(
+        request, queryset, lambda: _keyset_page(request, queryset, LOG_SORTS[sort], fields)
+    )
+
+
+@api_view('GET', 'HEAD', 'PATCH', 'DELETE')
+def log(request, log_id):
+    queryset = DailyLog.objects.all()
+    if request.method in ('GET', 'HEAD'):
+        return _detail_response(request, queryset, log_id, LOG_FIELDS)
+
+    _check_preconditions(request, queryset, log_id)
+    instance = queryset.get(pk=log_id)
+    if request.method == 'DELETE':
+        instance.delete()
+        return HttpResponse(status=204)
+    _save(instance, _check_animal(read_body(request)), LOG_WRITABLE)
+    return _detail_response(request, queryset, log_id, LOG_FIELDS)
+
+
+@api_view('GET', 'HEAD')
+def job(request, job_id):
+    """Status and progress of a background job, polled by the job page"""
+    instance = Job.objects.filter(pk=job_id).first()
+    if instance is None:
+        raise ApiError('Not found.', status=404)
+    body = {name: getattr(instance, name) for name in JOB_FIELDS}
+    body.update(percent=instance.percent, finished=instance.is_finished)
+    response = json_response(body)
+    patch_cache_control(response, private=True, no_store=True)
+    return response
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class DairysyncappConfig(AppConfig):
     name = 'dairysyncapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
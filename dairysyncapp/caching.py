@@ -0,0 +1,196 @@
+"""
+Cache for the data behind read-heavy views.
+
+Views cache the database-derived part of their context (not the rendered
+response, which carries per-user CSRF tokens and flash messages) under a
+key built from the view name, its parameters and the current version of
+every tag the data depends on. Model signals replace a tag's version when
+matching rows change, so only the entries that depend on them go stale.
+
+The ``SCOPED_TAGS`` ('animal', 'dailylog') also exist per farm. A write
+replaces the plain tag, which unscoped (staff) views depend on, and the
+tag of each farm it touched, e.g. ``dailylog:farm:7``; a view scoped to a
+farm depends on its farm's tag instead of the plain one. A write in one
+farm therefore leaves every other farm's entries alone. Invalidating
+without naming farms, as whole-table rebuilds do, replaces
+``dailylog:farm:*``, which every farm's views also depend on.
+
+The backend is the ``CACHES`` alias named by ``DAIRYSYNC_VIEW_CACHE_ALIAS``
+(``views`` by default). Tag versions must be seen by every process that
+writes, so it has to be shared: file, Redis or Memcached. The hit and miss
+counters use ``incr``, which the file backend does not make atomic, so
+they are approximate there.
+"""
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .tenancy import NO_FARM, current_farm_id
+
+VIEW_CACHE_ALIAS = getattr(settings, 'DAIRYSYNC_VIEW_CACHE_ALIAS', 'views')
+VIEW_CACHE_TIMEOUT = getattr(settings, 'DAIRYSYNC_VIEW_CACHE_TIMEOUT', 300)
+
+# tags with a version per farm as well as the plain one
+SCOPED_TAGS = {'animal', 'dailylog'}
+
+# views using the cache, reported by the view_cache_stats command
+CACHED_VIEWS = ['vet_dashboard', 'animal_listing_page', 'animal_detail', 'feed_efficiency']
+
+_MISSING = object()
+
+
+def get_cache():
+    return caches[VIEW_CACHE_ALIAS]
+
+
+def _tag_key(tag):
+    return f'dairysync:tag:{tag}'
+
+
+def _farm_tag(tag, farm_id):
+    return f'{tag}:farm:{farm_id or 0}'
+
+
+def _view_tags(tags):
+    """The tags a view in the current farm depends on, for the plain ``tags``"""
+    farm_id = current_farm_id()
+    if farm_id is None or farm_id is NO_FARM:
+        return list(tags)
+    view_tags = []
+    for tag in tags:
+        if tag in SCOPED_TAGS:
+            view_tags += [_farm_tag(tag, farm_id), f'{tag}:farm:*']
+        else:
+            view_tags.append(tag)
+    return view_tags
+
+
+def _stats_key(view_name, kind):
+    return f'dairysync:stats:{view_name}:{kind}'
+
+
+def _tag_versions(cache, tags):
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # a fresh random version can never collide with entries cached
+            # under a version that was evicted
+            cache.add(key, uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _entry_key(view_name, params, tags, versions):
+    # querysets are scoped to the request's farm, so the data is too
+    digest = hashlib.sha1(repr((current_farm_id(), params, tags, versions)).encode()).hexdigest()
+    return f'dairysync:view:{view_name}:{digest}'
+
+
+def _count(cache, view_name, kind):
+    key = _stats_key(view_name, kind)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def invalidate(*tags, farm_ids=None):
+    """
+    Give each tag a new version, orphaning every entry built on the old one.
+    ``farm_ids`` names the farms whose rows changed, for the SCOPED_TAGS;
+    None means every farm.
+
+    Inside a transaction this waits for the commit: bumped earlier, a
+    concurrent reader could cache the rows as they were before the commit
+    under the new version.
+    """
+    bumped = []
+    for tag in tags:
+        bumped.append(tag)
+        if tag in SCOPED_TAGS:
+            if farm_ids is None:
+                bumped.append(f'{tag}:farm:*')
+            else:
+                bumped.extend({_farm_tag(tag, farm_id) for farm_id in farm_ids})
+    if bumped:
+        transaction.on_commit(
+            lambda: get_cache().set_many({_tag_key(tag): uuid4().hex for tag in bumped}, None)
+        )
+
+
+def cached(view_name, params, tags, build):
+    """
+    Return ``(value, hit)`` for ``view_name`` and ``params``, calling
+    ``build()`` to compute and store the value on a miss.
+
+    ``params`` must have a stable repr; ``tags`` name the data the value
+    depends on, e.g. ``['animal', 'animal:7']``.
+    """
+    cache = get_cache()
+    tags = _view_tags(tags)
+    key = _entry_key(view_name, params, tags, _tag_versions(cache, tags))
+
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _count(cache, view_name, 'hits')
+        return value, True
+
+    value = build()
+    cache.set(key, value, VIEW_CACHE_TIMEOUT)
+    _count(cache, view_name, 'misses')
+    return value, False
+
+
+async def _atag_versions(cache, tags):
+    keys = [_tag_key(tag) for tag in tags]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, uuid4().hex, None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+async def _acount(cache, view_name, kind):
+    key = _stats_key(view_name, kind)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, None):
+            await cache.aincr(key)
+
+
+async def acached(view_name, params, tags, build):
+    """Async version of ``cached()``; ``build()`` returns an awaitable"""
+    cache = get_cache()
+    tags = _view_tags(tags)
+    key = _entry_key(view_name, params, tags, await _atag_versions(cache, tags))
+
+    value = await cache.aget(key, _MISSING)
+    if value is not _MISSING:
+        await _acount(cache, view_name, 'hits')
+        return value, True
+
+    value = await build()
+    await cache.aset(key, value, VIEW_CACHE_TIMEOUT)
+    await _acount(cache, view_name, 'misses')
+    return value, False
+
+
+def stats(view_names=CACHED_VIEWS):
+    """Return ``{view_name: {'hits': n, 'misses': n}}`` from the shared counters"""
+    cache = get_cache()
+    keys = {
+        (view_name, kind): _stats_key(view_name, kind)
+        for view_name in view_names for kind in ('hits', 'misses')
+    }
+    values = cache.get_many(list(keys.values()))
+    report = {view_name: {'hits': 0, 'misses': 0} for view_name in view_names}
+    for (view_name, kind), key in keys.items():
+        report[view_name][kind] = values.get(key, 0)
+    return report
@@ -0,0 +1,198 @@
+"""
+Maintenance of the HerdStats and HerdDayStats counters.
+
+The dashboard headline (animals, today's logs, animals by health status)
+used to count Animal and DailyLog rows on every load. The counts are now
+kept in one HerdStats row per farm and one HerdDayStats row per farm and
+day, so the headline is a primary-key lookup however large the herd.
+
+Signals adjust the counters with ``F()`` increments, inside the writer's
+transaction when it has one, so concurrent writers never lose an update.
+Bulk writes that skip signals (imports, herd entry, batched deletes)
+recount the (farm, day) buckets they touched instead. Anything else that
+bypasses both, such as raw SQL, leaves the counters drifted until
+``manage.py reconcile_stats`` recomputes them from the tables.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+
+from .models import Animal, DailyLog, HerdDayStats, HerdStats
+from .tenancy import NO_FARM, current_farm_id
+
+HEALTH_FIELDS = {status: f'{status}_count' for status, _ in Animal.HEALTH_STATUS_CHOICES}
+STATS_FIELDS = ['animal_count'] + list(HEALTH_FIELDS.values())
+
+STATS_BATCH_SIZE = 1000
+
+
+def farm_key(farm_id):
+    return farm_id or 0
+
+
+def _increment(queryset, create, changes):
+    with transaction.atomic():
+        if not queryset.update(**{field: F(field) + delta for field, delta in changes.items()}):
+            # first count for this farm or day
+            create()
+            queryset.update(**{field: F(field) + delta for field, delta in changes.items()})
+
+
+def count_animal(farm_id, health_status, delta):
+    """Add ``delta`` (1 or -1) animals of ``health_status`` to the farm's counts"""
+    key = farm_key(farm_id)
+    changes = {'animal_count': delta}
+    if health_status in HEALTH_FIELDS:
+        changes[HEALTH_FIELDS[health_status]] = delta
+    _increment(
+        HerdStats.objects.filter(pk=key),
+        lambda: HerdStats.objects.get_or_create(pk=key),
+        changes,
+    )
+
+
+def count_log(farm_id, day, delta):
+    """Add ``delta`` (1 or -1) logs to the farm's count for ``day``"""
+    key = farm_key(farm_id)
+    _increment(
+        HerdDayStats.objects.filter(farm_key=key, date=day),
+        lambda: HerdDayStats.objects.get_or_create(farm_key=key, date=day),
+        {'log_count': delta},
+    )
+
+
+def _farm_filter(keys):
+    farm_ids = {key for key in keys if key}
+    condition = Q(farm_id__in=farm_ids)
+    if 0 in keys:
+        condition |= Q(farm_id__isnull=True)
+    return condition
+
+
+def _write_day_counts(counts):
+    HerdDayStats.objects.bulk_create(
+        [HerdDayStats(farm_key=key, date=day, log_count=count) for (key, day), count in counts.items()],
+        batch_size=STATS_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['farm_key', 'date'],
+        update_fields=['log_count'],
+    )
+
+
+def refresh_log_counts(keys):
+    """
+    Recount the logs of an iterable of (farm_id, date) pairs, such as the
+    rows written by a bulk insert, with one grouped query.
+    """
+    wanted = {(farm_key(farm_id), day) for farm_id, day in keys}
+    if not wanted:
+        return
+    counts = dict.fromkeys(wanted, 0)
+    rows = (
+        # unscoped: the counters of every farm touched are recounted
+        DailyLog._base_manager.order_by()
+        .filter(_farm_filter({key for key, _ in wanted}), date__in={day for _, day in wanted})
+        .values('farm_id', 'date').annotate(log_count=Count('id'))
+    )
+    for row in rows:
+        key = (farm_key(row['farm_id']), row['date'])
+        if key in counts:
+            counts[key] = row['log_count']
+    with transaction.atomic():
+        _write_day_counts(counts)
+
+
+def _animal_counts():
+    counts = {}
+    rows = Animal._base_manager.order_by().values('farm_id', 'health_status').annotate(count=Count('id'))
+    for row in rows:
+        stats = counts.setdefault(farm_key(row['farm_id']), dict.fromkeys(STATS_FIELDS, 0))
+        stats['animal_count'] += row['count']
+        if row['health_status'] in HEALTH_FIELDS:
+            stats[HEALTH_FIELDS[row['health_status']]] += row['count']
+    return counts
+
+
+def reconcile():
+    """
+    Recompute every counter from the Animal and DailyLog tables, fixing
+    only the rows that drifted, and return the number of rows fixed
+    """
+    with transaction.atomic():
+        animal_counts = _animal_counts()
+        stored = {row.pop('id'): row for row in HerdStats.objects.values('id', *STATS_FIELDS)}
+        stale = [
+            HerdStats(id=key, **counts) for key, counts in animal_counts.items() if stored.get(key) != counts
+        ]
+        HerdStats.objects.bulk_create(
+            stale, batch_size=STATS_BATCH_SIZE,
+            update_conflicts=True, unique_fields=['id'], update_fields=STATS_FIELDS,
+        )
+        removed = HerdStats.objects.exclude(pk__in=animal_counts).delete()[0]
+
+        day_counts = {
+            (farm_key(farm_id), day): count
+            for farm_id, day, count in DailyLog._base_manager.order_by()
+            .values('farm_id', 'date').annotate(count=Count('id')).values_list('farm_id', 'date', 'count')
+        }
+        stored = {
+            (key, day): (pk, count)
+            for pk, key, day, count in HerdDayStats.objects.values_list('id', 'farm_key', 'date', 'log_count')
+        }
+        stale_days = {
+            key: count for key, count in day_counts.items() if stored.get(key, (None, None))[1] != count
+        }
+        _write_day_counts(stale_days)
+        gone = [pk for key, (pk, _) in stored.items() if key not in day_counts]
+        for start in range(0, len(gone), STATS_BATCH_SIZE):
+            removed += HerdDayStats.objects.filter(pk__in=gone[start:start + STATS_BATCH_SIZE]).delete()[0]
+    return len(stale) + len(stale_days) + removed
+
+
+def _empty_stats():
+    return dict.fromkeys(STATS_FIELDS + ['logs_today'], 0)
+
+
+def _scoped_stats(farm_id, today):
+    logs_today = HerdDayStats.objects.filter(farm_key=OuterRef('pk'), date=today).values('log_count')[:1]
+    return HerdStats.objects.filter(pk=farm_id).annotate(logs_today=Subquery(logs_today)).values(
+        *STATS_FIELDS, 'logs_today'
+    )
+
+
+def _herd_totals(row):
+    stats = _empty_stats()
+    stats.update({name: value for name, value in row.items() if value is not None})
+    return {
+        'total_animals': stats['animal_count'],
+        'total_logs_today': stats['logs_today'],
+        'health_counts': {status: stats[field] for status, field in HEALTH_FIELDS.items()},
+    }
+
+
+def herd_stats(today):
+    """
+    The dashboard headline for the current farm: ``total_animals``,
+    ``total_logs_today`` and ``health_counts`` by health status. Scoped to
+    a farm this is one primary-key lookup; unscoped it sums every farm.
+    Users without a farm see zeros.
+    """
+    farm_id = current_farm_id()
+    if farm_id is NO_FARM:
+        return _herd_totals({})
+    if farm_id is not None:
+        return _herd_totals(_scoped_stats(farm_id, today).first() or {})
+    row = HerdStats.objects.aggregate(**{field: Sum(field) for field in STATS_FIELDS})
+    row['logs_today'] = HerdDayStats.objects.filter(date=today).aggregate(total=Sum('log_count'))['total']
+    return _herd_totals(row)
+
+
+async def aherd_stats(today):
+    """Async version of ``herd_stats()``"""
+    farm_id = current_farm_id()
+    if farm_id is NO_FARM:
+        return _herd_totals({})
+    if farm_id is not None:
+        return _herd_totals(await _scoped_stats(farm_id, today).afirst() or {})
+    row = await HerdStats.objects.aaggregate(**{field: Sum(field) for field in STATS_FIELDS})
+    row['logs_today'] = (await HerdDayStats.objects.filter(date=today).aaggregate(total=Sum('log_count')))['total']
+    return _herd_totals(row)
@@ -0,0 +1,138 @@
+"""
+Bulk deletion of daily logs.
+
+``QuerySet.delete()`` loads every row into a model instance so it can send
+``post_delete`` for each one, which on a large filter means one rollup
+refresh, one cache invalidation and one tombstone insert per log, all in
+one long transaction. The only receivers connected to DailyLog deletes are
+this app's own (rollups, day counters, view cache, delta sync tombstones),
+and all of them have bulk equivalents, so logs are instead deleted in
+id-ordered batches with a plain ``DELETE ... WHERE id IN (...)`` and the
+receivers' work is done once per batch. If another app connects its own receiver or
+a model gains a foreign key to DailyLog, each batch falls back to
+``QuerySet.delete()`` so nothing is skipped.
+
+Listing receivers and the plain DELETE use private Django APIs
+(``PRIVATE_APIS``). They are only reached through ``_private_call()``, and
+if a Django upgrade removes or changes them deletes fall back to
+``QuerySet.delete()`` as well.
+"""
+from django.db import models, transaction
+from django.db.models import Count, Max, Min, QuerySet
+from django.db.models.signals import Signal, post_delete, pre_delete
+
+from .caching import invalidate
+from .counters import refresh_log_counts
+from .models import DailyLog, SyncCounter, Tombstone
+from .rollups import refresh_rollups_for
+from .signals import count_log_on_delete, invalidate_log_views, record_log_tombstone, update_rollups_on_delete
+
+DELETE_BATCH_SIZE = 1000
+
+# post_delete receivers whose work delete_logs does itself for each batch
+BULK_HANDLED_RECEIVERS = {
+    record_log_tombstone, invalidate_log_views, update_rollups_on_delete, count_log_on_delete,
+}
+
+# private Django methods the raw delete relies on, as (class, method name)
+PRIVATE_APIS = [(Signal, '_live_receivers'), (QuerySet, '_raw_delete')]
+
+
+def summarize_logs(queryset):
+    """
+    Count, date range and animals of ``queryset`` in one aggregate query;
+    ``animal_name`` is only set when all the logs belong to one animal
+    """
+    summary = queryset.order_by().aggregate(
+        count=Count('id'),
+        animals=Count('animal', distinct=True),
+        first_date=Min('date'),
+        last_date=Max('date'),
+        animal_name=Min('animal__name'),
+    )
+    if summary['animals'] != 1:
+        summary['animal_name'] = None
+    return summary
+
+
+def _private_call(obj, name, *args):
+    """
+    ``obj.name(*args)`` for one of ``PRIVATE_APIS``, or None when this
+    Django version no longer has the method or its signature changed
+    """
+    method = getattr(obj, name, None)
+    if not callable(method):
+        return None
+    try:
+        return method(*args)
+    except TypeError:
+        return None
+
+
+def _live_receivers(signal):
+    # Signal has no public way to list receivers; Django < 5.0 returned a flat list
+    receivers = _private_call(signal, '_live_receivers', DailyLog)
+    if isinstance(receivers, tuple):
+        receivers = [receiver for group in receivers for receiver in group]
+    return None if receivers is None else set(receivers)
+
+
+def can_raw_delete():
+    """Whether a plain DELETE plus the bulk bookkeeping is equivalent to QuerySet.delete()"""
+    if any(rel.on_delete is not models.DO_NOTHING for rel in DailyLog._meta.related_objects):
+        return False
+    if pre_delete.has_listeners(DailyLog):
+        return False
+    if not all(callable(getattr(owner, name, None)) for owner, name in PRIVATE_APIS):
+        return False
+    receivers = _live_receivers(post_delete)
+    return receivers is not None and receivers <= BULK_HANDLED_RECEIVERS
+
+
+def _raw_delete_batch(rows):
+    ids = [log_id for log_id, _, _, _ in rows]
+    queryset = DailyLog.objects.filter(id__in=ids)
+    deleted = _private_call(queryset, '_raw_delete', DailyLog.objects.db)
+    if deleted is None:
+        # the signal receivers do the bookkeeping
+        return queryset.delete()[0]
+
+    tombstones = [
+        Tombstone(kind='dailylog', farm_id=farm_id, object_id=log_id, animal_id=animal_id, date=log_date)
+        for log_id, animal_id, log_date, farm_id in rows
+    ]
+    SyncCounter.stamp(tombstones)
+    Tombstone.objects.bulk_create(tombstones)
+    refresh_rollups_for((animal_id, log_date) for _, animal_id, log_date, _ in rows)
+    refresh_log_counts((farm_id, log_date) for _, _, log_date, farm_id in rows)
+    return deleted
+
+
+def delete_logs(queryset, batch_size=DELETE_BATCH_SIZE, progress=None):
+    """
+    Delete every log matched by ``queryset`` in batches of ``batch_size``,
+    each in its own short transaction, and return the number deleted.
+    ``progress``, if given, is called with the running total after each batch.
+    """
+    raw = can_raw_delete()
+    queryset = queryset.select_related(None).order_by('id')
+    deleted = 0
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).values_list('id', 'animal_id', 'date', 'farm_id')[:batch_size])
+        if not rows:
+            return deleted
+        last_id = rows[-1][0]
+
+        with transaction.atomic():
+            if raw:
+                deleted += _raw_delete_batch(rows)
+            else:
+                deleted += DailyLog.objects.filter(id__in=[row[0] for row in rows]).delete()[0]
+        if raw:
+            invalidate(
+                'dailylog', *{f'animal:{animal_id}' for _, animal_id, _, _ in rows},
+                farm_ids={farm_id for _, _, _, farm_id in rows},
+            )
+        if progress:
+            progress(deleted)
@@ -0,0 +1,150 @@
+"""
+Streaming exports of filtered daily logs.
+
+Rows are pulled from the database with ``.iterator(chunk_size=...)`` and
+encoded chunk by chunk, so memory use is bounded by the chunk size rather
+than by the number of logs being exported.
+"""
+import csv
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (header, queryset lookup) in file column order
+EXPORT_COLUMNS = [
+    ('date', 'date'),
+    ('animal_id', 'animal_id'),
+    ('animal', 'animal__name'),
+    ('breed', 'animal__breed'),
+    ('morning_milk', 'morning_milk'),
+    ('afternoon_milk', 'afternoon_milk'),
+    ('evening_milk', 'evening_milk'),
+    ('total_milk', 'total_milk'),
+    ('feed_amount', 'feed_amount'),
+    ('water', 'water'),
+    ('temperature', 'temperature'),
+    ('health_observations', 'health_observations'),
+    ('activity', 'activity'),
+    ('notes', 'notes'),
+]
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def iter_export_rows(logs, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield plain tuples for ``logs`` in EXPORT_COLUMNS order"""
+    lookups = [lookup for _, lookup in EXPORT_COLUMNS]
+    return logs.values_list(*lookups).iterator(chunk_size=chunk_size)
+
+
+def iter_export_chunks(logs, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of up to ``chunk_size`` row tuples"""
+    chunk = []
+    for row in iter_export_rows(logs, chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _Echo:
+    """File-like object whose write() hands the written value straight back"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(logs, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the CSV export one chunk of encoded rows at a time"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    for chunk in iter_export_chunks(logs, chunk_size):
+        yield ''.join(writer.writerow(row) for row in chunk)
+
+
+class _ChunkSink:
+    """Write-only sink collecting the bytes pyarrow produces between drains"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def require_pyarrow():
+    """Import pyarrow eagerly so callers can fail before streaming starts"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ImportError('Parquet export requires the pyarrow package.') from exc
+    return pyarrow, pyarrow.parquet
+
+
+def parquet_schema():
+    pa, _ = require_pyarrow()
+
+    money = pa.decimal128(12, 3)
+    return pa.schema([
+        ('date', pa.date32()),
+        ('animal_id', pa.int64()),
+        ('animal', pa.string()),
+        ('breed', pa.string()),
+        ('morning_milk', money),
+        ('afternoon_milk', money),
+        ('evening_milk', money),
+        ('total_milk', money),
+        ('feed_amount', money),
+        ('water', money),
+        ('temperature', money),
+        ('health_observations', pa.string()),
+        ('activity', pa.string()),
+        ('notes', pa.string()),
+    ])
+
+
+def iter_parquet(logs, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield a Parquet file with one row group per chunk of logs.
+
+    Requires the optional pyarrow package.
+    """
+    pa, pq = require_pyarrow()
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in iter_export_chunks(logs, chunk_size):
+            columns = list(zip(*chunk))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,74 @@
+"""
+Query-string filters shared by the pages, the JSON API and background jobs.
+
+``filter_logs`` applies the manage-logs filters, which the bulk delete
+form and the delete job reuse, and ``parse_range`` reads the date range
+of the reports and time series. They live here rather than in the views
+so that api, jobs and timeseries need not import the views module.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import DailyLog
+
+DEFAULT_RANGE_DAYS = 30
+
+# manage_logs sort options: keyset column, newest/largest first, ties on id
+LOG_SORTS = {
+    'date': 'date',
+    'milk': 'total_milk',
+}
+
+
+def filter_logs(params):
+    """
+    Apply the manage-logs filters (animal, date_from, date_to, health) from
+    a QueryDict and return the queryset together with the active filters
+    """
+    filters = {
+        'animal': params.get('animal', ''),
+        'date_from': params.get('date_from', ''),
+        'date_to': params.get('date_to', ''),
+        'health': params.get('health', ''),
+    }
+
+    logs = DailyLog.objects.select_related('animal').order_by('-date', '-id')
+
+    if filters['animal']:
+        logs = logs.filter(animal_id=filters['animal'])
+
+    if filters['date_from']:
+        logs = logs.filter(date__gte=filters['date_from'])
+
+    if filters['date_to']:
+        logs = logs.filter(date__lte=filters['date_to'])
+
+    if filters['health']:
+        logs = logs.filter(health_observations=filters['health'])
+
+    return logs, filters
+
+
+def parse_range(params):
+    """
+    ``(start, end)`` from ``start``/``end`` (YYYY-MM-DD) or ``days`` ending
+    at ``end``, by default the last ``DEFAULT_RANGE_DAYS`` up to today.
+    Raises ValueError for a malformed or inverted range.
+    """
+    today = timezone.now().date()
+    end = params.get('end')
+    end = parse_date(end) if end else today
+    if params.get('start'):
+        start = parse_date(params['start'])
+    else:
+        days = int(params.get('days', DEFAULT_RANGE_DAYS))
+        if days < 1:
+            raise ValueError('days must be at least 1')
+        start = end - timedelta(days=days - 1) if end else None
+    if start is None or end is None:
+        raise ValueError('dates must be YYYY-MM-DD')
+    if start > end:
+        raise ValueError('start must not be after end')
+    return start, end
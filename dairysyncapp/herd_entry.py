@@ -0,0 +1,120 @@
+"""
+Herd-wide daily log entry.
+
+The entry grid posts one row of milk, feed and water per animal for a
+single date. Every row is validated before anything is written, then new
+logs are inserted with one bulk_create and existing logs for the date are
+updated with one bulk_update, all in a single transaction.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import invalidate
+from .counters import refresh_log_counts
+from .imports import IMPORT_DEFAULTS
+from .models import Animal, DailyLog, SyncCounter
+from .rollups import refresh_rollups_for
+
+GRID_FIELDS = ['morning_milk', 'afternoon_milk', 'evening_milk', 'feed_amount', 'water']
+
+GRID_BATCH_SIZE = 500
+
+
+def grid_input_name(field, animal_id):
+    return f'{field}_{animal_id}'
+
+
+class HerdEntryResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        # animal id -> list of messages
+        self.errors = {}
+
+    def add_error(self, animal_id, message):
+        self.errors.setdefault(animal_id, []).append(message)
+
+
+def read_grid(data, animal_ids):
+    """
+    Return ``{animal_id: {field: raw value}}`` for the animals with at least
+    one grid cell filled in; blank rows are left alone
+    """
+    rows = {}
+    for animal_id in animal_ids:
+        values = {field: (data.get(grid_input_name(field, animal_id)) or '').strip() for field in GRID_FIELDS}
+        if any(values.values()):
+            rows[animal_id] = values
+    return rows
+
+
+def clean_grid(rows, result):
+    """Validate every row, recording per-animal errors, and return the cleaned values"""
+    cleaned = {}
+    for animal_id, values in rows.items():
+        row = {}
+        for field in GRID_FIELDS:
+            try:
+                row[field] = DailyLog._meta.get_field(field).clean(values[field] or IMPORT_DEFAULTS[field], None)
+            except ValidationError as exc:
+                for message in exc.messages:
+                    result.add_error(animal_id, f"{DailyLog._meta.get_field(field).verbose_name}: {message}")
+        cleaned[animal_id] = row
+    return cleaned
+
+
+def save_herd_entries(log_date, rows, user=None):
+    """
+    Write the grid ``rows`` for ``log_date``, or nothing at all if any row
+    is invalid. Returns a HerdEntryResult.
+    """
+    result = HerdEntryResult()
+    cleaned = clean_grid(rows, result)
+    if result.errors or not cleaned:
+        return result
+
+    now = timezone.now()
+    farms = dict(Animal.objects.filter(id__in=cleaned).values_list('id', 'farm_id'))
+    for animal_id in cleaned.keys() - farms.keys():
+        result.add_error(animal_id, 'Animal not found.')
+    if result.errors:
+        return result
+
+    with transaction.atomic():
+        existing = {
+            log.animal_id: log
+            for log in DailyLog.objects.select_for_update().filter(date=log_date, animal_id__in=cleaned)
+        }
+        created, updated = [], []
+        for animal_id, values in cleaned.items():
+            log = existing.get(animal_id)
+            if log is None:
+                log = DailyLog(
+                    animal_id=animal_id, farm_id=farms[animal_id], date=log_date, created_by=user,
+                    **{name: value for name, value in IMPORT_DEFAULTS.items() if name not in GRID_FIELDS},
+                )
+                created.append(log)
+            else:
+                # bulk_update does not apply auto_now
+                log.updated_at = now
+                updated.append(log)
+            for field, value in values.items():
+                setattr(log, field, value)
+
+        SyncCounter.stamp(created + updated)
+        DailyLog.objects.bulk_create(created, batch_size=GRID_BATCH_SIZE)
+        DailyLog.objects.bulk_update(
+            updated, GRID_FIELDS + ['updated_at', 'sync_seq'], batch_size=GRID_BATCH_SIZE
+        )
+        refresh_rollups_for((animal_id, log_date) for animal_id in cleaned)
+        refresh_log_counts((log.farm_id, log_date) for log in created)
+    # bulk writes skip the model signals that normally invalidate views
+    invalidate(
+        'dailylog', *{f'animal:{animal_id}' for animal_id in cleaned},
+        farm_ids=set(farms.values()),
+    )
+
+    result.created = len(created)
+    result.updated = len(updated)
+    return result
@@ -0,0 +1,216 @@
+"""
+Bulk import of daily logs from CSV or XLSX exports.
+
+Rows are read lazily from the uploaded file, validated against the
+DailyLog field definitions and upserted on (animal, date) in fixed-size
+batches, so a parlour export of thousands of rows costs a handful of
+queries per batch instead of one round trip per row.
+"""
+import csv
+import io
+import os
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .caching import invalidate
+from .models import Animal, DailyLog, SyncCounter
+from .counters import refresh_log_counts
+from .rollups import refresh_rollups_for
+
+IMPORT_BATCH_SIZE = 500
+
+# same fallbacks as the add_daily_log form
+IMPORT_DEFAULTS = {
+    'morning_milk': 0,
+    'afternoon_milk': 0,
+    'evening_milk': 0,
+    'feed_amount': 0,
+    'water': 0,
+    'health_observations': 'normal',
+    'activity': 'grazing',
+}
+
+IMPORT_FIELDS = [
+    'morning_milk', 'afternoon_milk', 'evening_milk', 'feed_amount', 'water',
+    'temperature', 'health_observations', 'activity', 'notes',
+]
+
+# columns overwritten when a log for the same animal and date already exists
+UPDATE_FIELDS = IMPORT_FIELDS + ['updated_at', 'sync_seq']
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    @property
+    def failed(self):
+        return len({line for line, _ in self.errors})
+
+
+def iter_csv_rows(file):
+    """Yield dict rows from a binary CSV file object without reading it whole"""
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.DictReader(text)
+    finally:
+        text.detach()
+
+
+def iter_xlsx_rows(file):
+    """Yield dict rows from the first sheet of an XLSX workbook"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError as exc:
+        raise ImportError('XLSX import requires the openpyxl package.') from exc
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, [])]
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def iter_rows(file, name=''):
+    """Pick the reader for ``file`` from its extension, defaulting to CSV"""
+    if os.path.splitext(name or getattr(file, 'name', ''))[1].lower() == '.xlsx':
+        return iter_xlsx_rows(file)
+    return iter_csv_rows(file)
+
+
+def _clean_value(value):
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value == '' else value
+
+
+def normalize_row(row):
+    """Strip header and cell whitespace and turn empty cells into None"""
+    return {key.strip(): _clean_value(value) for key, value in row.items() if key}
+
+
+def build_log(row, ids_by_name, user=None):
+    """
+    Validate one normalized import row and return an unsaved DailyLog.
+
+    Raises ValidationError listing every problem found in the row.
+    """
+    errors = []
+
+    animal_id = row.get('animal_id')
+    if animal_id is not None:
+        try:
+            animal_id = int(animal_id)
+        except (TypeError, ValueError):
+            errors.append(f"Invalid animal_id '{animal_id}'.")
+    elif row.get('animal') is not None:
+        animal_id = ids_by_name.get(str(row['animal']))
+        if animal_id is None:
+            errors.append(f"Unknown animal '{row['animal']}'.")
+    else:
+        errors.append('Missing animal or animal_id column.')
+
+    values = {}
+    for name in ['date'] + IMPORT_FIELDS:
+        field = DailyLog._meta.get_field(name)
+        value = row.get(name)
+        if value is None:
+            value = IMPORT_DEFAULTS.get(name)
+        try:
+            values[name] = field.clean(value, None)
+        except ValidationError as exc:
+            errors.extend(f'{name}: {message}' for message in exc.messages)
+
+    if errors:
+        raise ValidationError(errors)
+
+    return DailyLog(animal_id=animal_id, created_by=user, **values)
+
+
+def animal_ids_by_name(rows):
+    """``{name: id}`` of the animals that rows name by ``animal`` instead of ``animal_id``"""
+    names = {str(row['animal']) for row in rows if row.get('animal') is not None and row.get('animal_id') is None}
+    if not names:
+        return {}
+    return dict(Animal.objects.filter(name__in=names).values_list('name', 'id'))
+
+
+def write_batch(batch, result):
+    """
+    Upsert ``batch``, ``{line: DailyLog}`` from build_log(), by (animal, date),
+    recording unknown animals in ``result``
+    """
+    # the last row wins when a file repeats an animal and date
+    logs = list({(log.animal_id, log.date): log for log in batch.values()}.values())
+    # animal id -> farm id, for the animals the current farm can see
+    known = dict(Animal.objects.filter(id__in={log.animal_id for log in logs}).values_list('id', 'farm_id'))
+    for line, log in list(batch.items()):
+        if log.animal_id not in known:
+            result.add_error(line, f'Unknown animal id {log.animal_id}.')
+    logs = [log for log in logs if log.animal_id in known]
+    if not logs:
+        return
+    for log in logs:
+        log.farm_id = known[log.animal_id]
+
+    with transaction.atomic():
+        SyncCounter.stamp(logs)
+        DailyLog.objects.bulk_create(
+            logs,
+            update_conflicts=True,
+            unique_fields=['animal', 'date'],
+            update_fields=UPDATE_FIELDS,
+        )
+        refresh_rollups_for((log.animal_id, log.date) for log in logs)
+        refresh_log_counts((log.farm_id, log.date) for log in logs)
+    # bulk_create skips the model signals that normally invalidate views
+    invalidate(
+        'dailylog', *{f'animal:{log.animal_id}' for log in logs}, farm_ids={log.farm_id for log in logs},
+    )
+    result.imported += len(logs)
+
+
+def import_daily_logs(rows, user=None, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Upsert DailyLog rows from an iterable of dicts in batches of ``batch_size``.
+
+    Returns an ImportResult with the number of rows written and the
+    (line number, message) pairs of every rejected row. ``progress``, if
+    given, is called with the number of rows read after each batch.
+    """
+    result = ImportResult()
+    chunk = []
+    # line 1 is the header row
+    for line, row in enumerate(rows, start=2):
+        chunk.append((line, row))
+        if len(chunk) == batch_size:
+            _import_chunk(chunk, user, result)
+            chunk = []
+            if progress:
+                progress(line - 1)
+    if chunk:
+        _import_chunk(chunk, user, result)
+        if progress:
+            progress(chunk[-1][0] - 1)
+    return result
+
+
+def _import_chunk(chunk, user, result):
+    chunk = [(line, normalize_row(row)) for line, row in chunk]
+    ids_by_name = animal_ids_by_name(row for _, row in chunk)
+    batch = {}
+    for line, row in chunk:
+        try:
+            batch[line] = build_log(row, ids_by_name, user)
+        except ValidationError as exc:
+            for message in exc.messages:
+                result.add_error(line, message)
+    write_batch(batch, result)
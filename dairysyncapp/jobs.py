@@ -0,0 +1,288 @@
+"""
+Background jobs queued in the database.
+
+Work too heavy for a request (large imports and exports, bulk deletes,
+rollup rebuilds, anomaly scans, curve fits) is saved as a Job row and the
+request returns at once. ``manage.py run_worker`` claims due jobs with a
+conditional UPDATE, so several workers can share the table without a
+broker, and runs them in a process pool.
+
+Handlers report progress as they go, which the job pages poll. A job
+that raises is queued again after an exponentially growing delay until
+it has used ``max_attempts``; a JobError fails it at once. A running job
+whose worker stops sending heartbeats is queued again as well.
+
+Jobs run scoped to the farm of the user who queued them. The maintenance
+jobs (rollups, anomalies, curves) are queued from management commands
+with no farm and cover every farm.
+"""
+import os
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .anomalies import detect_anomalies
+from .deletes import delete_logs
+from .exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, iter_csv, iter_parquet
+from .filters import filter_logs
+from .imports import import_daily_logs, iter_rows
+from .lactation import fit_lactation_curves
+from .models import Job
+from .rollups import rebuild_rollups
+from .tenancy import farm_scope, owning_farm_id
+
+JOB_RETRY_DELAY = timedelta(seconds=30)
+# a running job without a heartbeat for this long lost its worker
+JOB_STALE_AFTER = timedelta(minutes=5)
+JOB_POLL_INTERVAL = 2.0
+# least time between two progress writes of one job
+PROGRESS_INTERVAL = 1.0
+
+JOB_ERRORS_KEPT = 100
+
+HANDLERS = {}
+
+
+class JobError(Exception):
+    """A failure retrying cannot fix, such as a missing upload"""
+
+
+def job_handler(kind):
+    """Register ``func(job, progress)`` as the handler of ``kind`` jobs"""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def job_files_dir():
+    return Path(getattr(settings, 'DAIRYSYNC_JOB_FILES_DIR', Path(settings.BASE_DIR) / 'job_files'))
+
+
+def job_file_path(name):
+    """Absolute path of a file kept for a job, creating its directory"""
+    path = stored_job_file(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def stored_job_file(name):
+    """
+    Resolved path of the job file ``name``, raising ValueError when it
+    would lie outside the job files directory
+    """
+    directory = job_files_dir().resolve()
+    path = (directory / name).resolve()
+    if not path.is_relative_to(directory) or path == directory:
+        raise ValueError(f'Job file outside {directory}: {name}')
+    return path
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue(kind, params=None, user=None, farm_id=None, max_attempts=3):
+    """Queue a ``kind`` job for the current farm (or ``farm_id``) and return it"""
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    return Job.objects.create(
+        kind=kind,
+        params=params or {},
+        created_by=user,
+        farm_id=farm_id if farm_id is not None else owning_farm_id(),
+        max_attempts=max_attempts,
+    )
+
+
+def enqueue_import(upload, user=None):
+    """Keep an uploaded import file on disk and queue its import"""
+    farm_id = owning_farm_id()
+    name = f'imports/{uuid.uuid4().hex}{Path(upload.name).suffix.lower()}'
+    with open(job_file_path(name), 'wb') as file:
+        for chunk in upload.chunks():
+            file.write(chunk)
+    return enqueue('import_logs', {'file': name, 'name': upload.name}, user, farm_id=farm_id)
+
+
+def claim_job(worker):
+    """Mark the oldest due job as running by ``worker`` and return its id, or None"""
+    while True:
+        now = timezone.now()
+        job_id = (
+            Job.objects.filter(status='queued', run_after__lte=now)
+            .order_by('run_after', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        # only one worker's update can match while the job is still queued
+        claimed = Job.objects.filter(pk=job_id, status='queued').update(
+            status='running', worker=worker, attempts=F('attempts') + 1,
+            started_at=now, heartbeat_at=now, finished_at=None,
+        )
+        if claimed:
+            return job_id
+
+
+def heartbeat(job_ids):
+    Job.objects.filter(pk__in=job_ids, status='running').update(heartbeat_at=timezone.now())
+
+
+def requeue_stale(timeout=JOB_STALE_AFTER):
+    """Queue again, or fail when out of attempts, the jobs whose worker stopped; returns how many"""
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', heartbeat_at__lt=now - timeout)
+    error = 'The worker stopped responding.'
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', error=error, finished_at=now,
+    )
+    return failed + stale.update(status='queued', error=error, run_after=now)
+
+
+def retry_delay(attempt):
+    return JOB_RETRY_DELAY * 2 ** (attempt - 1)
+
+
+class JobProgress:
+    """Handler callback ``progress(done, total=None, message=None)`` writing at most once a second"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.done = 0
+        self.total = None
+        self.message = None
+        self.written_at = None
+
+    def __call__(self, done, total=None, message=None):
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+        now = timezone.now()
+        if self.written_at is None or (now - self.written_at).total_seconds() >= PROGRESS_INTERVAL:
+            self.flush(now)
+
+    def fields(self):
+        fields = {'progress': self.done}
+        if self.total is not None:
+            fields['total'] = self.total
+        if self.message is not None:
+            fields['message'] = self.message[:200]
+        return fields
+
+    def flush(self, now=None):
+        self.written_at = now or timezone.now()
+        Job.objects.filter(pk=self.job_id).update(heartbeat_at=self.written_at, **self.fields())
+
+
+def fail_job(job, exc):
+    """Record ``exc`` against a claimed job and queue it again if it has attempts left"""
+    now = timezone.now()
+    error = ''.join(traceback.format_exception_only(type(exc), exc)).strip()
+    if isinstance(exc, JobError) or job.attempts >= job.max_attempts:
+        Job.objects.filter(pk=job.pk).update(status='failed', error=error, finished_at=now)
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            status='queued', error=error, run_after=now + retry_delay(job.attempts),
+        )
+
+
+def run_job(job_id):
+    """Run one claimed job to completion or failure and return it reloaded"""
+    job = Job.objects.select_related('created_by').get(pk=job_id)
+    progress = JobProgress(job.pk)
+    try:
+        handler = HANDLERS.get(job.kind)
+        if handler is None:
+            raise JobError(f'No handler for {job.kind} jobs.')
+        with farm_scope(job.farm_id):
+            result = handler(job, progress)
+    except Exception as exc:
+        fail_job(job, exc)
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            status='succeeded', result=result, error='', finished_at=timezone.now(), **progress.fields()
+        )
+    return Job.objects.get(pk=job.pk)
+
+
+def _filtered_logs(job):
+    logs, _ = filter_logs(job.params.get('filters', {}))
+    return logs
+
+
+@job_handler('import_logs')
+def _import_logs(job, progress):
+    try:
+        path = stored_job_file(job.params['file'])
+        file = open(path, 'rb')
+    except (ValueError, FileNotFoundError):
+        raise JobError('The uploaded file is no longer available.')
+    with file:
+        rows = iter_rows(file, job.params.get('name', path.name))
+        result = import_daily_logs(rows, job.created_by, progress=progress)
+    path.unlink()
+    return {
+        'imported': result.imported,
+        'failed': result.failed,
+        'errors': result.errors[:JOB_ERRORS_KEPT],
+        'error_count': len(result.errors),
+    }
+
+
+@job_handler('export_logs')
+def _export_logs(job, progress):
+    export_format = job.params.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise JobError(f'Unsupported export format: {export_format}.')
+    logs = _filtered_logs(job)
+    total = logs.count()
+    progress(0, total)
+
+    content_type, extension = EXPORT_FORMATS[export_format]
+    name = f'exports/job-{job.pk}.{extension}'
+    content = iter_parquet(logs) if export_format == 'parquet' else iter_csv(logs)
+    with open(job_file_path(name), 'wb') as file:
+        for pieces, piece in enumerate(content):
+            file.write(piece.encode() if isinstance(piece, str) else piece)
+            # each piece after the CSV header is about one chunk of rows
+            progress(min(pieces * EXPORT_CHUNK_SIZE, total))
+    progress(total)
+    return {
+        'file': name,
+        'filename': f'dairysync-logs-{timezone.now():%Y%m%d}.{extension}',
+        'content_type': content_type,
+        'rows': total,
+    }
+
+
+@job_handler('delete_logs')
+def _delete_logs(job, progress):
+    logs = _filtered_logs(job)
+    progress(0, logs.count())
+    return {'deleted': delete_logs(logs, progress=progress)}
+
+
+@job_handler('rebuild_rollups')
+def _rebuild_rollups(job, progress):
+    return {'written': rebuild_rollups(job.params.get('animal_ids'))}
+
+
+@job_handler('detect_anomalies')
+def _detect_anomalies(job, progress):
+    scan = detect_anomalies(full=job.params.get('full', False))
+    return {'rows_scored': scan.rows_scored, 'flags': scan.flags}
+
+
+@job_handler('fit_lactation_curves')
+def _fit_lactation_curves(job, progress):
+    return {'refitted': fit_lactation_curves(job.params.get('animal_ids'))}
@@ -0,0 +1,244 @@
+"""
+Lactation curves and yield forecasts.
+
+Each animal's current lactation is fitted with Wood's curve
+``y = a * t**b * exp(-c * t)``, ``t`` being days in milk. Taking logs makes
+it linear, ``ln y = ln a + b ln t - c t``, so the whole herd is fitted in
+one pass: the per-animal least-squares sums are accumulated with
+``numpy.bincount`` and every animal's 3x3 normal equations are solved as
+one stacked array.
+
+Fitted parameters are stored in LactationCurve. Each LactationScan records
+how far a run read each farm's change sequence, so ``fit_lactation_curves``
+only reads the logs written or deleted since and refits those animals; the
+first run fits every animal. Pages read the stored parameters; nothing is
+fitted while serving a request.
+
+The calving date is not recorded, so a lactation is taken to start at the
+first log after a gap of ``DRY_GAP_DAYS`` without milk.
+"""
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Count
+
+from .anomalies import changed_animals
+from .caching import invalidate
+from .models import DailyLog, LactationCurve, LactationScan, SyncCounter
+
+# fewer logs than this in the current lactation leave the curve unfitted
+WOOD_MIN_LOGS = 10
+DRY_GAP_DAYS = 45
+
+PERFORMANCE_WINDOW_DAYS = 7
+UNDERPERFORMING_RATIO = 0.85
+
+FORECAST_DAYS = 30
+COMPARISON_DAYS = 30
+
+CURVE_FIELDS = ['farm', 'lactation_start', 'a', 'b', 'c', 'rmse', 'performance', 'log_count', 'fitted_at']
+
+
+def require_numpy():
+    try:
+        import numpy
+    except ImportError as exc:
+        raise ImportError('Lactation curve fitting requires the numpy package.') from exc
+    return numpy
+
+
+def stale_animal_ids(up_to=None):
+    """
+    Animals whose logs were added, changed or deleted since the last scan,
+    up to the ``{farm key: sequence}`` of ``up_to``, or every animal with
+    logs or a curve before the first scan
+    """
+    if up_to is None:
+        up_to = SyncCounter.values()
+    previous = LactationScan.objects.order_by('-id').first()
+    if previous is None:
+        stale = set(DailyLog.objects.order_by().values_list('animal_id', flat=True).distinct())
+        stale.update(LactationCurve.objects.values_list('animal_id', flat=True))
+        return stale
+    return set(changed_animals(previous.sync_seqs, up_to))
+
+
+def _load_series(np, animal_ids):
+    rows = (
+        DailyLog.objects.filter(animal_id__in=animal_ids, total_milk__gt=0)
+        .order_by('animal_id', 'date')
+        .values_list('animal_id', 'date', 'total_milk')
+    )
+    animal, day, milk = [], [], []
+    for animal_id, log_date, total_milk in rows.iterator(chunk_size=5000):
+        animal.append(animal_id)
+        day.append(log_date.toordinal())
+        milk.append(float(total_milk))
+    return (
+        np.array(animal, dtype=np.int64),
+        np.array(day, dtype=np.int64),
+        np.array(milk, dtype=np.float64),
+    )
+
+
+def fit_wood_curves(animal, day, milk):
+    """
+    Fit Wood's curve to the current lactation of every animal in the
+    ``animal``/``day``/``milk`` arrays, sorted by animal then day.
+
+    Returns a dict of arrays with one entry per animal: ``animal_id``,
+    ``start`` (ordinal day), ``count``, ``a``, ``b``, ``c``, ``rmse`` and
+    ``performance``; animals with too few logs get NaN parameters.
+    """
+    np = require_numpy()
+    n = len(animal)
+    if not n:
+        return None
+
+    first_of_animal = np.ones(n, dtype=bool)
+    first_of_animal[1:] = animal[1:] != animal[:-1]
+    group = np.cumsum(first_of_animal) - 1
+    groups = group[-1] + 1
+
+    # each row's lactation starts at the latest animal change or dry gap before it
+    new_lactation = first_of_animal.copy()
+    new_lactation[1:] |= (day[1:] - day[:-1]) >= DRY_GAP_DAYS
+    start_index = np.maximum.accumulate(np.where(new_lactation, np.arange(n), 0))
+    last_of_animal = np.r_[first_of_animal[1:], True]
+    current = start_index == start_index[last_of_animal][group]
+
+    start_day = day[start_index[last_of_animal]]
+    group, day, milk = group[current], day[current], milk[current]
+    t = (day - start_day[group] + 1).astype(np.float64)
+    log_t, log_y = np.log(t), np.log(milk)
+
+    def total(weights):
+        return np.bincount(group, weights=weights, minlength=groups)
+
+    count = np.bincount(group, minlength=groups)
+    # normal equations for the columns [1, ln t, -t]
+    s_lt, s_t = total(log_t), total(t)
+    normal = np.empty((groups, 3, 3))
+    normal[:, 0] = np.stack([count, s_lt, -s_t], axis=1)
+    normal[:, 1] = np.stack([s_lt, total(log_t * log_t), -total(log_t * t)], axis=1)
+    normal[:, 2] = np.stack([-s_t, -total(log_t * t), total(t * t)], axis=1)
+    target = np.stack([total(log_y), total(log_t * log_y), -total(t * log_y)], axis=1)
+
+    # pinv rather than solve so a degenerate animal cannot fail the whole herd
+    coef = np.einsum('gij,gj->gi', np.linalg.pinv(normal), target)
+    a, b, c = np.exp(coef[:, 0]), coef[:, 1], coef[:, 2]
+    unfitted = count < WOOD_MIN_LOGS
+    a[unfitted] = b[unfitted] = c[unfitted] = np.nan
+
+    expected = a[group] * t ** b[group] * np.exp(-c[group] * t)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rmse = np.sqrt(total((milk - expected) ** 2) / count)
+        last_day = day[np.r_[group[1:] != group[:-1], True]]
+        recent = day > last_day[group] - PERFORMANCE_WINDOW_DAYS
+        performance = total(np.where(recent, milk, 0)) / total(np.where(recent, expected, 0))
+
+    return {
+        'animal_id': animal[last_of_animal],
+        'start': start_day,
+        'count': count,
+        'a': a, 'b': b, 'c': c,
+        'rmse': rmse,
+        'performance': performance,
+    }
+
+
+def _optional(value):
+    return None if value != value else float(value)  # NaN -> None
+
+
+def fit_lactation_curves(animal_ids=None):
+    """
+    Refit the curves of ``animal_ids``, or of every animal whose logs
+    changed since the last scan, and return the number of animals refitted
+    """
+    scan = animal_ids is None
+    if scan:
+        # read the sequences first so a log written during the fit is
+        # numbered above them and picked up by the next run
+        up_to = SyncCounter.values()
+        animal_ids = stale_animal_ids(up_to)
+    animal_ids = set(animal_ids)
+    if not animal_ids:
+        if scan:
+            LactationScan.objects.create(sync_seqs=up_to)
+        return 0
+    np = require_numpy()
+
+    state = {
+        animal_id: (farm_id, log_count)
+        for animal_id, farm_id, log_count in DailyLog.objects.filter(animal_id__in=animal_ids)
+        .order_by().values('animal_id', 'farm_id').annotate(log_count=Count('id'))
+        .values_list('animal_id', 'farm_id', 'log_count')
+    }
+    fits = fit_wood_curves(*_load_series(np, animal_ids))
+
+    curves = {
+        animal_id: LactationCurve(animal_id=animal_id, farm_id=farm_id, log_count=log_count)
+        for animal_id, (farm_id, log_count) in state.items()
+    }
+    if fits is not None:
+        for index, animal_id in enumerate(fits['animal_id'].tolist()):
+            curve = curves.get(animal_id)
+            if curve is None:
+                continue
+            curve.lactation_start = date.fromordinal(int(fits['start'][index]))
+            curve.a, curve.b, curve.c = (_optional(fits[name][index]) for name in 'abc')
+            if curve.a is not None:
+                curve.rmse = _optional(fits['rmse'][index])
+                curve.performance = _optional(fits['performance'][index])
+
+    with transaction.atomic():
+        LactationCurve.objects.filter(animal_id__in=animal_ids - set(curves)).delete()
+        LactationCurve.objects.bulk_create(
+            curves.values(),
+            update_conflicts=True,
+            unique_fields=['animal'],
+            update_fields=CURVE_FIELDS,
+        )
+        if scan:
+            LactationScan.objects.create(sync_seqs=up_to, animals_fitted=len(animal_ids))
+    invalidate('lactation', *{f'animal:{animal_id}' for animal_id in animal_ids})
+    return len(animal_ids)
+
+
+def lactation_summary(animal_id, today):
+    """
+    Expected against actual yield over the last ``COMPARISON_DAYS`` and the
+    expected yield for the next ``FORECAST_DAYS``, or None without a curve
+    """
+    curve = LactationCurve.objects.filter(animal_id=animal_id, a__isnull=False).first()
+    if curve is None:
+        return None
+
+    recent = DailyLog.objects.filter(
+        animal_id=animal_id, date__gt=today - timedelta(days=COMPARISON_DAYS), date__lte=today,
+    ).order_by('date').values_list('date', 'total_milk')
+    comparison = [
+        {'date': log_date, 'actual': float(total_milk), 'expected': curve.expected_on(log_date)}
+        for log_date, total_milk in recent
+    ]
+    forecast = [
+        {'date': day, 'expected': curve.expected_on(day)}
+        for day in (today + timedelta(days=offset) for offset in range(1, FORECAST_DAYS + 1))
+    ]
+    return {
+        'curve': curve,
+        'days_in_milk': (today - curve.lactation_start).days + 1,
+        'comparison': comparison,
+        'forecast': forecast,
+        'forecast_total': sum(day['expected'] for day in forecast),
+    }
+
+
+def underperformers(limit=10):
+    """Animals producing furthest below their curve, weakest first"""
+    return (
+        LactationCurve.objects.filter(performance__lt=UNDERPERFORMING_RATIO)
+        .select_related('animal')
+        .order_by('performance')[:limit]
+    )
@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+
+from dairysyncapp.models import Animal, Farm, Profile
+from dairysyncapp.synthetic import generate_herd
+
+MODES = ['wsgi', 'asgi']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare dashboard and animal detail throughput through the WSGI handler '
+        '(sync views) and the ASGI handler (async views) on a synthetic herd'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help='Requests per mode')
+        parser.add_argument('--concurrency', type=int, default=16, help='Clients sending requests at once')
+        parser.add_argument('--animals', type=int, default=200)
+        parser.add_argument('--days', type=int, default=90, help='Days of logs per animal')
+        parser.add_argument(
+            '--cached', action='store_true',
+            help='Keep the view cache on (by default every request queries the database)',
+        )
+        # each mode runs in its own process so the URLconf routes the right views
+        parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.stdout.write(json.dumps(self.run_mode(options)))
+            return
+
+        results = {}
+        for mode in MODES:
+            self.stdout.write(f'Benchmarking {mode}...')
+            completed = subprocess.run(
+                [
+                    sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), 'bench_async_views',
+                    '--mode', mode,
+                    '--requests', str(options['requests']),
+                    '--concurrency', str(options['concurrency']),
+                    '--animals', str(options['animals']),
+                    '--days', str(options['days']),
+                    *(['--cached'] if options['cached'] else []),
+                ],
+                env=dict(os.environ, DAIRYSYNC_ASYNC_VIEWS='1' if mode == 'asgi' else '0'),
+                capture_output=True, text=True,
+            )
+            if completed.returncode:
+                raise CommandError(f'{mode} run failed:\n{completed.stderr}')
+            results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        self.stdout.write(f"{'mode':<6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:<6} {result['throughput']:>8.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f}"
+            )
+
+    def run_mode(self, options):
+        if options['mode'] == 'asgi' and not settings.DAIRYSYNC_ASYNC_VIEWS:
+            raise CommandError('Run the asgi mode with DAIRYSYNC_ASYNC_VIEWS=1.')
+
+        setup_test_environment()
+        with tempfile.TemporaryDirectory() as directory:
+            # a file database so the WSGI worker threads share the herd
+            if connection.vendor == 'sqlite':
+                database = settings.DATABASES['default']
+                database['TEST'] = {**database.get('TEST', {}), 'NAME': str(Path(directory) / 'bench.sqlite3')}
+            old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+            try:
+                generate_herd(animals=options['animals'], days=options['days'])
+                user = User.objects.create_user('bench-vet', 'vet@bench.invalid', 'bench', first_name='Bench')
+                farm = Farm.objects.order_by('id').first()
+                Profile.objects.create(user=user, phone='0700000000', farm_name=farm.name, farm=farm, role='vet')
+                urls = [reverse('vet-dashboard')] + [
+                    reverse('animal-detail', args=[animal_id])
+                    for animal_id in Animal.objects.values_list('id', flat=True)[:20]
+                ]
+
+                overrides = {'DAIRYSYNC_PERF_ENABLED': False}
+                if not options['cached']:
+                    overrides['CACHES'] = {
+                        **settings.CACHES,
+                        settings.DAIRYSYNC_VIEW_CACHE_ALIAS: {
+                            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+                        },
+                    }
+                with override_settings(**overrides):
+                    if options['mode'] == 'asgi':
+                        latencies, elapsed = asyncio.run(
+                            self.run_asgi(user, urls, options['requests'], options['concurrency'])
+                        )
+                    else:
+                        latencies, elapsed = self.run_wsgi(
+                            user, urls, options['requests'], options['concurrency']
+                        )
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'seconds': elapsed,
+            'throughput': len(latencies) / elapsed,
+            'p50_ms': latencies[len(latencies) // 2] * 1000,
+            'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+        }
+
+    def run_wsgi(self, user, urls, total, concurrency):
+        clients = []
+        for _ in range(concurrency):
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            clients.append(client)
+
+        latencies = []
+        errors = []
+
+        def worker(client, indices):
+            try:
+                for index in indices:
+                    start = time.perf_counter()
+                    response = client.get(urls[index % len(urls)])
+                    latencies.append(time.perf_counter() - start)
+                    if response.status_code != 200:
+                        errors.append(f'{urls[index % len(urls)]}: {response.status_code}')
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(client, range(number, total, concurrency)))
+            for number, client in enumerate(clients)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise CommandError(f'{len(errors)} failed request(s), e.g. {errors[0]}')
+        return latencies, elapsed
+
+    async def run_asgi(self, user, urls, total, concurrency):
+        clients = []
+        for _ in range(concurrency):
+            client = AsyncClient(raise_request_exception=False)
+            await client.aforce_login(user)
+            clients.append(client)
+
+        latencies = []
+
+        async def worker(client, indices):
+            for index in indices:
+                start = time.perf_counter()
+                response = await client.get(urls[index % len(urls)])
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise CommandError(f'{urls[index % len(urls)]}: {response.status_code}')
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            worker(client, range(number, total, concurrency))
+            for number, client in enumerate(clients)
+        ))
+        return latencies, time.perf_counter() - start
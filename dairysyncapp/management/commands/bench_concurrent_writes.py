@@ -0,0 +1,113 @@
+import copy
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.test.utils import setup_databases, teardown_databases
+
+from dairysyncapp.models import Animal, DailyLog
+
+# connection settings each profile applies on top of DATABASES['default']
+PROFILES = {
+    'development': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}},
+    'production': settings.DAIRYSYNC_SQLITE_PRODUCTION,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure daily log write throughput with parallel writers against a '
+        'throwaway SQLite file for each database profile'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads')
+        parser.add_argument('--logs', type=int, default=50, help='Logs written by each writer')
+        parser.add_argument(
+            '--profiles', type=lambda value: value.split(','), default=list(PROFILES),
+            help='Comma-separated profiles to compare (default development,production)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark only applies to the SQLite backend.')
+        unknown = set(options['profiles']) - set(PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(sorted(unknown))}")
+
+        self.stdout.write(f"{'profile':<12} {'written':>8} {'locked':>7} {'seconds':>8} {'logs/s':>8}")
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in options['profiles']:
+                written, locked, elapsed = self.run_profile(
+                    profile, Path(directory) / f'{profile}.sqlite3', options['writers'], options['logs'],
+                )
+                self.stdout.write(
+                    f'{profile:<12} {written:>8} {locked:>7} {elapsed:>8.2f} {written / elapsed:>8.1f}'
+                )
+
+    def run_profile(self, profile, path, writers, logs):
+        # DATABASES['default'] is the dict every connection is built from, so
+        # threads opened below pick up the profile and the test database name
+        database = settings.DATABASES['default']
+        original = copy.deepcopy(database)
+        connection.close()
+        database.update(copy.deepcopy(PROFILES[profile]))
+        database['TEST'] = {**database.get('TEST', {}), 'NAME': str(path)}
+
+        old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+        try:
+            herd = Animal.objects.bulk_create([
+                Animal(name=f'Bench Cow {number}', species='Cow', gender='female')
+                for number in range(writers)
+            ])
+            connection.close()
+
+            barrier = threading.Barrier(writers + 1)
+            results = []
+            threads = [
+                threading.Thread(target=self.write_logs, args=(animal.id, logs, barrier, results))
+                for animal in herd
+            ]
+            for thread in threads:
+                thread.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            database.clear()
+            database.update(original)
+
+        return sum(written for written, _ in results), sum(locked for _, locked in results), elapsed
+
+    def write_logs(self, animal_id, logs, barrier, results):
+        """Write logs the way add_daily_log does: check, then insert"""
+        written = locked = 0
+        start = date.today() - timedelta(days=logs)
+        barrier.wait()
+        try:
+            for offset in range(logs):
+                day = start + timedelta(days=offset)
+                try:
+                    with transaction.atomic():
+                        if not DailyLog.objects.filter(animal_id=animal_id, date=day).exists():
+                            DailyLog.objects.create(
+                                animal_id=animal_id, date=day,
+                                morning_milk=8, afternoon_milk=5, evening_milk=7,
+                                feed_amount=20, water=80, temperature=38.6,
+                            )
+                    written += 1
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    locked += 1
+        finally:
+            connection.close()
+            results.append((written, locked))
@@ -0,0 +1,30 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from dairysyncapp.partitions import create_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Create yearly DailyLog partitions on PostgreSQL ahead of the logs that will fill them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--years-ahead', type=int, default=1,
+            help='Create partitions up to this many years after the current one (default 1)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('DailyLog partitioning is only used on PostgreSQL.')
+
+        this_year = date.today().year
+        with transaction.atomic(), connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise CommandError('The DailyLog table is not partitioned; run migrate first.')
+            created = create_partitions(cursor, this_year, this_year + options['years_ahead'])
+
+        for name in created:
+            self.stdout.write(f'  created {name}')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} partition(s) created.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from dairysyncapp.anomalies import detect_anomalies
+from dairysyncapp.jobs import enqueue
+
+
+class Command(BaseCommand):
+    help = (
+        'Flag sudden drops in milk, feed and water and temperature spikes in the daily logs '
+        'changed since the last run; run it after each day\'s logs are in'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rescore every log instead of only changed ones')
+        parser.add_argument('--queue', action='store_true', help='Queue the scan for run_worker instead')
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            job = enqueue('detect_anomalies', {'full': options['full']})
+            self.stdout.write(self.style.SUCCESS(f'Queued job {job.pk}.'))
+            return
+        scan = detect_anomalies(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {scan.rows_scored} log(s), {scan.flags} anomaly flag(s) raised.'
+        ))
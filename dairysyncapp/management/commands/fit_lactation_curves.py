@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from dairysyncapp.jobs import enqueue
+from dairysyncapp.lactation import fit_lactation_curves
+from dairysyncapp.models import DailyLog
+
+
+class Command(BaseCommand):
+    help = (
+        'Fit lactation curves for animals whose daily logs changed since the last run; '
+        'run it periodically, e.g. after the morning milking'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--animal', type=int, action='append', dest='animal_ids',
+            help='Refit this animal id even if unchanged (repeatable)',
+        )
+        parser.add_argument('--all', action='store_true', help='Refit every animal with logs')
+        parser.add_argument('--queue', action='store_true', help='Queue the fit for run_worker instead')
+
+    def handle(self, *args, **options):
+        animal_ids = options['animal_ids']
+        if options['all']:
+            animal_ids = DailyLog.objects.order_by().values_list('animal_id', flat=True).distinct()
+        if options['queue']:
+            params = {'animal_ids': list(animal_ids) if animal_ids is not None else None}
+            job = enqueue('fit_lactation_curves', params)
+            self.stdout.write(self.style.SUCCESS(f'Queued job {job.pk}.'))
+            return
+        fitted = fit_lactation_curves(animal_ids)
+        self.stdout.write(self.style.SUCCESS(f'Fitted lactation curves for {fitted} animal(s).'))
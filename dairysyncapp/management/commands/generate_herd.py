@@ -0,0 +1,35 @@
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dairysyncapp.synthetic import generate_herd
+
+
+class Command(BaseCommand):
+    help = 'Create synthetic farms, animals and daily logs with realistic milk curves'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farms', type=int, default=1)
+        parser.add_argument('--animals', type=int, default=50)
+        parser.add_argument('--days', type=int, default=365, help='Days of logs per animal')
+        parser.add_argument(
+            '--logs', type=int,
+            help='Total logs to create; overrides --days by spreading them over the herd',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        animals = options['animals']
+        if animals < 1 or options['farms'] < 1:
+            raise CommandError('--farms and --animals must be at least 1.')
+        days = options['days']
+        if options['logs']:
+            days = math.ceil(options['logs'] / animals)
+
+        written = generate_herd(
+            farms=options['farms'], animals=animals, days=days,
+            seed=options['seed'], stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {animals} animal(s) on {options['farms']} farm(s) with {written} daily log(s)."
+        ))
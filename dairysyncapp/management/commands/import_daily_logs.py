@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dairysyncapp.imports import IMPORT_BATCH_SIZE, import_daily_logs, iter_rows
+
+
+class Command(BaseCommand):
+    help = 'Upsert daily logs from a CSV or XLSX file, keyed on animal and date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file to import')
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help=f'Rows written per INSERT (default {IMPORT_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as file:
+                result = import_daily_logs(
+                    iter_rows(file, options['path']), batch_size=options['batch_size']
+                )
+        except OSError as exc:
+            raise CommandError(str(exc)) from exc
+
+        for line, message in result.errors:
+            self.stderr.write(f'line {line}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.imported} log(s); {result.failed} row(s) rejected.'
+        ))
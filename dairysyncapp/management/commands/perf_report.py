@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from dairysyncapp import perf
+
+
+class Command(BaseCommand):
+    help = 'Print p50/p95/p99 request timings and query counts per URL name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Output the raw report as JSON')
+        parser.add_argument('--reset', action='store_true', help='Clear the histograms after reporting')
+
+    def handle(self, *args, **options):
+        report = perf.report()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, default=str))
+        elif not report:
+            self.stdout.write('No requests recorded yet.')
+        else:
+            self.stdout.write(
+                f"{'url name':<22} {'metric':<12} {'count':>7} {'mean':>9} {'p50':>7} {'p95':>7} {'p99':>7}"
+            )
+            for url_name, metrics in report.items():
+                for metric, values in metrics.items():
+                    self.stdout.write(
+                        f"{url_name:<22} {metric:<12} {values['count']:>7} "
+                        f"{_fmt(values['mean']):>9} {_fmt(values['p50']):>7} "
+                        f"{_fmt(values['p95']):>7} {_fmt(values['p99']):>7}"
+                    )
+
+        if options['reset']:
+            perf.reset()
+
+
+def _fmt(value):
+    if value is None:
+        return '-'
+    if value == float('inf'):
+        return 'max'
+    return f'{value:.1f}' if isinstance(value, float) else str(value)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from dairysyncapp.jobs import enqueue
+from dairysyncapp.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute AnimalProductionRollup rows from the raw daily logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--animal', type=int, action='append', dest='animal_ids',
+            help='Only rebuild rollups for this animal id (repeatable)',
+        )
+        parser.add_argument('--queue', action='store_true', help='Queue the rebuild for run_worker instead')
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            job = enqueue('rebuild_rollups', {'animal_ids': options['animal_ids']})
+            self.stdout.write(self.style.SUCCESS(f'Queued job {job.pk}.'))
+            return
+        written = rebuild_rollups(options['animal_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} rollup row(s).'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from dairysyncapp.caching import invalidate
+from dairysyncapp.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the HerdStats and HerdDayStats dashboard counters from the animals and daily logs'
+
+    def handle(self, *args, **options):
+        fixed = reconcile()
+        if fixed:
+            # the dashboard caches the headline it read from the counters
+            invalidate('animal', 'dailylog')
+            self.stdout.write(self.style.WARNING(f'Repaired {fixed} counter row(s).'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All counters are correct.'))
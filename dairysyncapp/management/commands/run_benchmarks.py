@@ -0,0 +1,169 @@
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+
+from dairysyncapp.caching import VIEW_CACHE_ALIAS, get_cache
+from dairysyncapp.models import Animal, DailyLog, Profile
+from dairysyncapp.perf import QueryTimer
+from dairysyncapp.synthetic import generate_herd
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the main views against synthetic herds of increasing size in a '
+        'throwaway test database and compare with a JSON baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=lambda value: [int(size) for size in value.split(',')],
+            default=DEFAULT_SIZES, help='Comma-separated DailyLog counts (default 1000,10000,100000,1000000)',
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per view (median is kept)')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='Allowed slowdown over the baseline before failing (0.25 = 25%%)',
+        )
+        parser.add_argument('--output', help='Also write this run\'s results to a JSON file')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        # a throwaway view cache of the configured kind: the real one is
+        # shared with running web workers and is cleared before every request
+        cache_dir = tempfile.TemporaryDirectory()
+        caches = {**settings.CACHES, VIEW_CACHE_ALIAS: {**settings.CACHES[VIEW_CACHE_ALIAS]}}
+        if 'filebased' in caches[VIEW_CACHE_ALIAS]['BACKEND']:
+            caches[VIEW_CACHE_ALIAS]['LOCATION'] = cache_dir.name
+        else:
+            caches[VIEW_CACHE_ALIAS] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        try:
+            with override_settings(DAIRYSYNC_PERF_ENABLED=False, CACHES=caches):
+                results = {
+                    str(size): self.run_size(size, options['repeat'])
+                    for size in options['sizes']
+                }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            cache_dir.cleanup()
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2))
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            # without one nothing is checked, which must not pass silently
+            raise CommandError(
+                f'No baseline at {baseline_path}; nothing was checked. '
+                'Record one with --save-baseline and commit it.'
+            )
+        baseline = json.loads(baseline_path.read_text())
+        for message in uncovered(results, baseline):
+            self.stderr.write(self.style.WARNING(message))
+        regressions = compare(results, baseline, options['threshold'])
+        for message in regressions:
+            self.stderr.write(message)
+        if regressions:
+            raise CommandError(f'{len(regressions)} benchmark regression(s) against {baseline_path}')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def run_size(self, size, repeat):
+        DailyLog.objects.all().delete()
+        Animal.objects.all().delete()
+
+        animals = min(max(size // 365, 5), 2000)
+        days = -(-size // animals)
+        self.stdout.write(f'Generating {animals} animals x {days} days ({size} logs)...')
+        generate_herd(farms=max(animals // 200, 1), animals=animals, days=days)
+
+        # staff, so the vet sees every synthetic farm
+        vet, _ = User.objects.get_or_create(username='benchmark-vet', defaults={'is_staff': True})
+        Profile.objects.get_or_create(
+            user=vet, defaults={'phone': '0700000000', 'farm_name': 'Benchmark', 'role': 'vet'}
+        )
+        client = Client()
+        client.force_login(vet)
+
+        animal_id = Animal.objects.values_list('id', flat=True).first()
+        cases = {
+            'vet_dashboard': lambda: client.get(reverse('vet-dashboard')),
+            'manage_logs': lambda: client.get(reverse('manage-logs')),
+            'manage_logs_filtered': lambda: client.get(reverse('manage-logs'), {'health': 'critical'}),
+            'animal_listing_page': lambda: client.get(reverse('animal-listing')),
+            'animal_detail': lambda: client.get(reverse('animal-detail', args=[animal_id])),
+            'bulk_delete_logs': lambda: client.post(reverse('bulk-delete-logs'), {
+                'log_ids': list(DailyLog.objects.order_by('?').values_list('id', flat=True)[:100]),
+            }),
+        }
+
+        results = {}
+        for name, request in cases.items():
+            timings = []
+            queries = 0
+            for _ in range(repeat):
+                # time cold requests; the view cache would otherwise hide regressions
+                get_cache().clear()
+                timer = QueryTimer()
+                with connection.execute_wrapper(timer):
+                    start = time.perf_counter()
+                    response = request()
+                    timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    raise CommandError(f'{name} returned HTTP {response.status_code}')
+                queries = timer.count
+            results[name] = {'ms': round(statistics.median(timings), 2), 'queries': queries}
+            self.stdout.write(f"  {name:<22} {results[name]['ms']:>9.1f} ms {queries:>6} queries")
+        return results
+
+
+def compare(results, baseline, threshold):
+    """Return one message per view that got slower or issued more queries"""
+    regressions = []
+    for size, views in results.items():
+        for name, current in views.items():
+            previous = baseline.get(size, {}).get(name)
+            if not previous:
+                continue
+            if current['ms'] > previous['ms'] * (1 + threshold):
+                regressions.append(
+                    f"{size} logs / {name}: {current['ms']} ms vs baseline {previous['ms']} ms"
+                )
+            if current['queries'] > previous['queries']:
+                regressions.append(
+                    f"{size} logs / {name}: {current['queries']} queries vs baseline {previous['queries']}"
+                )
+    return regressions
+
+
+def uncovered(results, baseline):
+    """Return one message per measured view the baseline has no figures for"""
+    return [
+        f'{size} logs / {name}: not in the baseline, not checked'
+        for size, views in results.items()
+        for name in views
+        if name not in baseline.get(size, {})
+    ]
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from dairysyncapp import worker
+from dairysyncapp.jobs import (
+    JOB_POLL_INTERVAL, claim_job, fail_job, heartbeat, requeue_stale, run_job, worker_name,
+)
+from dairysyncapp.models import Job
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs (imports, exports, bulk deletes, rollup rebuilds, '
+        'anomaly scans) in a pool of worker processes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1,
+            help='Jobs run at once (default: one per CPU); 0 runs them one by one in this process',
+        )
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty instead of polling')
+        parser.add_argument(
+            '--poll-interval', type=float, default=JOB_POLL_INTERVAL,
+            help='Seconds between checks for new jobs',
+        )
+
+    def handle(self, *args, **options):
+        name = worker_name()
+        self.stdout.write(f'Worker {name} started.')
+        if options['processes'] <= 0:
+            self.run_inline(name, options['once'], options['poll_interval'])
+        else:
+            self.run_pool(name, options['processes'], options['once'], options['poll_interval'])
+
+    def finished(self, job_id, status):
+        style = self.style.SUCCESS if status == 'succeeded' else self.style.WARNING
+        self.stdout.write(style(f'Job {job_id} {status}.'))
+
+    def run_inline(self, name, once, poll_interval):
+        while True:
+            requeue_stale()
+            job_id = claim_job(name)
+            if job_id is None:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+            self.finished(job_id, run_job(job_id).status)
+
+    def run_pool(self, name, processes, once, poll_interval):
+        # spawned processes open their own connections; close ours so none is shared
+        connections.close_all()
+        running = {}
+        pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=worker.setup_process,
+        )
+        try:
+            while True:
+                requeue_stale()
+                heartbeat(running.values())
+                while len(running) < processes:
+                    job_id = claim_job(name)
+                    if job_id is None:
+                        break
+                    running[pool.submit(worker.run_job, job_id)] = job_id
+
+                if not running:
+                    if once:
+                        return
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as exc:
+                        # the process died (e.g. killed for memory) before recording anything
+                        fail_job(Job.objects.get(pk=job_id), exc)
+                        status = Job.objects.values_list('status', flat=True).get(pk=job_id)
+                    self.finished(job_id, status)
+        finally:
+            if running:
+                # interrupted: hand the unfinished jobs back without using up an attempt
+                Job.objects.filter(pk__in=running.values(), status='running').update(
+                    status='queued', attempts=F('attempts') - 1, run_after=timezone.now(),
+                )
+            pool.shutdown(cancel_futures=True)
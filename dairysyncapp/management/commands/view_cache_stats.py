@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from dairysyncapp.caching import stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters for the cached views (shared only with a shared cache backend)'
+
+    def handle(self, *args, **options):
+        for view_name, counts in stats().items():
+            total = counts['hits'] + counts['misses']
+            ratio = counts['hits'] / total if total else 0
+            self.stdout.write(
+                f"{view_name:<22} hits={counts['hits']:<8} misses={counts['misses']:<8} hit_ratio={ratio:.1%}"
+            )
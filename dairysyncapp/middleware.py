@@ -0,0 +1,155 @@
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connections
+
+from . import perf, tenancy
+
+
+def _add_wrapper(timer):
+    for connection in connections.all():
+        connection.execute_wrappers.append(timer)
+
+
+def _remove_wrapper(timer):
+    for connection in connections.all():
+        connection.execute_wrappers.remove(timer)
+
+
+class PerformanceMiddleware:
+    """
+    Time every request and report it in a ``Server-Timing`` header.
+
+    Records the number of SQL queries, total SQL time, template render time
+    and the wall-clock time of the view, and adds them to the per-URL-name
+    histograms read by the ``perf_report`` command. Works in both the WSGI
+    and the ASGI handler. Off unless ``DAIRYSYNC_PERF_ENABLED`` is set.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'DAIRYSYNC_PERF_ENABLED', False)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        timer = perf.QueryTimer()
+        token = perf.template_time.set(0.0)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+            view_time = time.perf_counter() - start
+            render_time = perf.template_time.get()
+        finally:
+            perf.template_time.reset(token)
+
+        url_name, samples = self.finish(request, response, timer, view_time, render_time)
+        if url_name:
+            perf.record(url_name, samples)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        # the ORM runs async views' queries in the request's sync thread, so
+        # the timer has to be installed on that thread's connections
+        timer = perf.QueryTimer()
+        token = perf.template_time.set(0.0)
+        start = time.perf_counter()
+        await sync_to_async(_add_wrapper)(timer)
+        try:
+            response = await self.get_response(request)
+            view_time = time.perf_counter() - start
+            render_time = perf.template_time.get()
+        finally:
+            await sync_to_async(_remove_wrapper)(timer)
+            perf.template_time.reset(token)
+
+        url_name, samples = self.finish(request, response, timer, view_time, render_time)
+        if url_name:
+            # record() only touches memory until a flush is due
+            await sync_to_async(perf.record)(url_name, samples)
+        return response
+
+    def finish(self, request, response, timer, view_time, render_time):
+        """Set the Server-Timing header and return ``(url_name, samples)``"""
+        samples = {
+            'view_ms': view_time * 1000,
+            'sql_ms': timer.elapsed * 1000,
+            'template_ms': render_time * 1000,
+            'queries': timer.count,
+        }
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={samples["sql_ms"]:.1f};desc="{timer.count} queries"',
+            f'tpl;dur={samples["template_ms"]:.1f}',
+            f'view;dur={samples["view_ms"]:.1f}',
+        ])
+
+        match = getattr(request, 'resolver_match', None)
+        return (match.url_name if match else None), samples
+
+
+def _profile_farm_id(user):
+    """
+    The farm of ``user``'s profile; otherwise None (every farm) for staff and
+    NO_FARM for everyone else, anonymous users included
+    """
+    if not user.is_authenticated:
+        return tenancy.NO_FARM
+    try:
+        farm_id = user.profile.farm_id
+    except ObjectDoesNotExist:
+        farm_id = None
+    if farm_id is None and not user.is_staff:
+        return tenancy.NO_FARM
+    return farm_id
+
+
+class TenantMiddleware:
+    """
+    Scope the default managers to the logged-in user's farm for the request.
+
+    Must come after AuthenticationMiddleware. In sync requests the farm is
+    looked up on the first scoped query, so pages that never touch farm
+    data do not pay for the profile query; async requests look it up first.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = tenancy.activate(lambda: _profile_farm_id(request.user))
+        try:
+            return self.get_response(request)
+        finally:
+            tenancy.deactivate(token)
+
+    async def __acall__(self, request):
+        farm_id = await sync_to_async(_profile_farm_id)(request.user)
+        token = tenancy.activate(farm_id)
+        try:
+            return await self.get_response(request)
+        finally:
+            tenancy.deactivate(token)
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0014_alter_dailylog_feed_amount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(fields=['date', 'id'], name='dailylog_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(fields=['health_observations', 'date', 'id'], name='dailylog_health_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(condition=models.Q(('health_observations__in', ['needs_attention', 'critical'])), fields=['health_observations', 'date'], name='dailylog_problem_date_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0015_dailylog_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimalProductionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'ISO Week'), ('month', 'Month')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('log_count', models.PositiveIntegerField(default=0)),
+                ('total_milk', models.DecimalField(decimal_places=3, default=0, help_text='Litres', max_digits=12)),
+                ('total_feed', models.DecimalField(decimal_places=3, default=0, help_text='Kilograms', max_digits=12)),
+                ('total_water', models.DecimalField(decimal_places=3, default=0, help_text='Litres', max_digits=12)),
+                ('avg_temperature', models.DecimalField(blank=True, decimal_places=3, help_text='°C', max_digits=6, null=True)),
+                ('problem_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='production_rollups', to='dairysyncapp.animal')),
+            ],
+            options={
+                'ordering': ['period', '-period_start'],
+                'indexes': [models.Index(fields=['period', 'period_start'], name='rollup_period_start_idx')],
+                'constraints': [models.UniqueConstraint(fields=('animal', 'period', 'period_start'), name='unique_rollup_per_period')],
+            },
+        ),
+    ]
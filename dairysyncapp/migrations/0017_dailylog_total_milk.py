@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0016_animalproductionrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailylog',
+            name='total_milk',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('morning_milk'), '+', models.F('afternoon_milk')), '+', models.F('evening_milk')), output_field=models.DecimalField(decimal_places=3, max_digits=8)),
+        ),
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(fields=['total_milk', 'id'], name='dailylog_total_milk_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0017_dailylog_total_milk'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['name', 'id'], name='animal_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['created_at', 'id'], name='animal_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['species', 'name'], name='animal_species_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['health_status', 'name'], name='animal_health_name_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 6.0 on 2026-10-18 14:10
+
+from django.db import migrations
+
+from dairysyncapp.partitions import partition_daily_logs, unpartition_daily_logs
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('dairysyncapp', '0018_animal_listing_indexes'),
+    ]
+
+    operations = [
+        # yearly range partitions on PostgreSQL, nothing on other backends
+        migrations.RunPython(partition_daily_logs, unpartition_daily_logs, elidable=False),
+    ]
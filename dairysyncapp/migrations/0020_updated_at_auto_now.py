@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0019_partition_dailylog'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='animal',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='dailylog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
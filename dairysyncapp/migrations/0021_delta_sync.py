@@ -0,0 +1,77 @@
+# Generated by Django 6.0 on 2026-10-18 16:05
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing_rows(apps, schema_editor):
+    """
+    Give existing animals and logs distinct sequence numbers (animals by id,
+    then logs by id after the last animal) and start the counter above them
+    """
+    Animal = apps.get_model('dairysyncapp', 'Animal')
+    DailyLog = apps.get_model('dairysyncapp', 'DailyLog')
+    SyncCounter = apps.get_model('dairysyncapp', 'SyncCounter')
+
+    last_animal = Animal.objects.aggregate(last=Max('id'))['last'] or 0
+    last_log = DailyLog.objects.aggregate(last=Max('id'))['last'] or 0
+    Animal.objects.update(sync_seq=F('id'))
+    DailyLog.objects.update(sync_seq=F('id') + last_animal)
+    SyncCounter.objects.create(pk=1, value=last_animal + last_log)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0020_updated_at_auto_now'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('animal', 'Animal'), ('dailylog', 'Daily Log')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('animal_id', models.BigIntegerField(blank=True, null=True)),
+                ('date', models.DateField(blank=True, null=True)),
+                ('sync_seq', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['sync_seq'],
+            },
+        ),
+        migrations.AddField(
+            model_name='animal',
+            name='sync_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='dailylog',
+            name='sync_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['sync_seq'], name='animal_sync_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(fields=['sync_seq'], name='dailylog_sync_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['sync_seq'], name='tombstone_sync_seq_idx'),
+        ),
+        migrations.RunPython(number_existing_rows, migrations.RunPython.noop),
+    ]
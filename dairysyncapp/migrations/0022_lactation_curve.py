@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0021_delta_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LactationCurve',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lactation_start', models.DateField(blank=True, null=True)),
+                ('a', models.FloatField(blank=True, null=True)),
+                ('b', models.FloatField(blank=True, null=True)),
+                ('c', models.FloatField(blank=True, null=True)),
+                ('rmse', models.FloatField(blank=True, help_text='Litres', null=True)),
+                ('performance', models.FloatField(blank=True, null=True)),
+                ('log_count', models.PositiveIntegerField(default=0)),
+                ('last_sync_seq', models.BigIntegerField(default=0)),
+                ('fitted_at', models.DateTimeField(auto_now=True)),
+                ('animal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='lactation_curve', to='dairysyncapp.animal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['performance'], name='lactation_performance_idx')],
+            },
+        ),
+    ]
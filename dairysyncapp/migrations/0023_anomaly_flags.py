@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 17:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0022_lactation_curve'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_sync_seq', models.BigIntegerField(default=0)),
+                ('rows_scored', models.PositiveIntegerField(default=0)),
+                ('flags', models.PositiveIntegerField(default=0)),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-finished_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AnomalyFlag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('metric', models.CharField(choices=[('milk', 'Milk Yield'), ('temperature', 'Temperature'), ('feed', 'Feed Intake'), ('water', 'Water Intake')], max_length=20)),
+                ('value', models.FloatField()),
+                ('expected', models.FloatField()),
+                ('zscore', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomaly_flags', to='dairysyncapp.animal')),
+            ],
+            options={
+                'ordering': ['-date', 'zscore'],
+                'indexes': [models.Index(fields=['date', 'metric'], name='anomaly_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('animal', 'date', 'metric'), name='unique_anomaly_per_metric')],
+            },
+        ),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 6.0 on 2026-10-18 17:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_farms(apps, schema_editor):
+    """
+    Turn each distinct profile farm name into a Farm. Animals had no owner,
+    so they (and their logs) can only be assigned when there is one farm;
+    otherwise they stay unassigned for an administrator to sort out.
+    """
+    Farm = apps.get_model('dairysyncapp', 'Farm')
+    Profile = apps.get_model('dairysyncapp', 'Profile')
+    Animal = apps.get_model('dairysyncapp', 'Animal')
+    DailyLog = apps.get_model('dairysyncapp', 'DailyLog')
+    Tombstone = apps.get_model('dairysyncapp', 'Tombstone')
+
+    for profile in Profile.objects.exclude(farm_name=''):
+        profile.farm, _ = Farm.objects.get_or_create(name=profile.farm_name.strip())
+        profile.save(update_fields=['farm'])
+
+    farms = list(Farm.objects.values_list('id', flat=True))
+    if len(farms) == 1:
+        Animal.objects.update(farm_id=farms[0])
+        DailyLog.objects.update(farm_id=farms[0])
+        Tombstone.objects.update(farm_id=farms[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0023_anomaly_flags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Farm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='animal',
+            name='animal_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='animal',
+            name='animal_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='animal',
+            name='animal_species_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='animal',
+            name='animal_health_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='dailylog',
+            name='dailylog_date_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='dailylog',
+            name='dailylog_health_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='dailylog',
+            name='dailylog_problem_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='dailylog',
+            name='dailylog_total_milk_idx',
+        ),
+        migrations.AddField(
+            model_name='animal',
+            name='farm',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='animals', to='dairysyncapp.farm'),
+        ),
+        migrations.AddField(
+            model_name='dailylog',
+            name='farm',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_logs', to='dairysyncapp.farm'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='farm',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='profiles', to='dairysyncapp.farm'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='farm',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='dairysyncapp.farm'),
+        ),
+        migrations.RunPython(create_farms, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['farm', 'name', 'id'], name='animal_farm_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['farm', 'created_at', 'id'], name='animal_farm_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['farm', 'species', 'name'], name='animal_farm_species_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['farm', 'health_status', 'name'], name='animal_farm_health_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(fields=['farm', 'date', 'id'], name='dailylog_farm_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(fields=['farm', 'total_milk', 'id'], name='dailylog_farm_milk_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(fields=['farm', 'health_observations', 'date', 'id'], name='dailylog_farm_health_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(condition=models.Q(('health_observations__in', ['needs_attention', 'critical'])), fields=['farm', 'health_observations', 'date'], name='dailylog_farm_problem_idx'),
+        ),
+    ]
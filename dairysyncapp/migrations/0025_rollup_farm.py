@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 18:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_animal_farms(apps, schema_editor):
+    Animal = apps.get_model('dairysyncapp', 'Animal')
+    AnimalProductionRollup = apps.get_model('dairysyncapp', 'AnimalProductionRollup')
+    AnimalProductionRollup.objects.update(
+        farm_id=Subquery(Animal.objects.filter(pk=OuterRef('animal_id')).values('farm_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0024_farm_scoping'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='animalproductionrollup',
+            name='rollup_period_start_idx',
+        ),
+        migrations.AddField(
+            model_name='animalproductionrollup',
+            name='farm',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dairysyncapp.farm'),
+        ),
+        migrations.RunPython(copy_animal_farms, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='animalproductionrollup',
+            index=models.Index(fields=['farm', 'period', 'period_start'], name='rollup_farm_period_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 6.0 on 2026-10-18 19:20
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_rows(apps, schema_editor):
+    """Fill the counters from the animals and logs already stored"""
+    Animal = apps.get_model('dairysyncapp', 'Animal')
+    DailyLog = apps.get_model('dairysyncapp', 'DailyLog')
+    HerdStats = apps.get_model('dairysyncapp', 'HerdStats')
+    HerdDayStats = apps.get_model('dairysyncapp', 'HerdDayStats')
+
+    stats = {}
+    for row in Animal.objects.order_by().values('farm_id', 'health_status').annotate(count=Count('id')):
+        farm = stats.setdefault(row['farm_id'] or 0, HerdStats(id=row['farm_id'] or 0))
+        farm.animal_count += row['count']
+        field = f"{row['health_status']}_count"
+        if hasattr(farm, field):
+            setattr(farm, field, getattr(farm, field) + row['count'])
+    HerdStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+    HerdDayStats.objects.bulk_create(
+        (
+            HerdDayStats(farm_key=row['farm_id'] or 0, date=row['date'], log_count=row['count'])
+            for row in DailyLog.objects.order_by().values('farm_id', 'date').annotate(count=Count('id'))
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0026_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HerdStats',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('animal_count', models.IntegerField(default=0)),
+                ('healthy_count', models.IntegerField(default=0)),
+                ('sick_count', models.IntegerField(default=0)),
+                ('recovering_count', models.IntegerField(default=0)),
+                ('unknown_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'herd stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='HerdDayStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('farm_key', models.BigIntegerField()),
+                ('date', models.DateField()),
+                ('log_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'herd day stats',
+                'constraints': [models.UniqueConstraint(fields=('farm_key', 'date'), name='unique_herd_day_stats')],
+            },
+        ),
+        migrations.RunPython(count_existing_rows, migrations.RunPython.noop),
+    ]
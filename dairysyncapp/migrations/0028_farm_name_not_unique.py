@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0027_herd_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='farm',
+            name='name',
+            field=models.CharField(max_length=200),
+        ),
+    ]
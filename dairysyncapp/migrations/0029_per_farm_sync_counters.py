@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+def split_sync_counter(apps, schema_editor):
+    """
+    Start every farm's counter at the old global value, so rows written
+    from now on number above every device's existing high-water mark
+    """
+    AnomalyScan = apps.get_model('dairysyncapp', 'AnomalyScan')
+    Farm = apps.get_model('dairysyncapp', 'Farm')
+    SyncCounter = apps.get_model('dairysyncapp', 'SyncCounter')
+
+    value = SyncCounter.objects.filter(pk=1).values_list('value', flat=True).first() or 0
+    keys = [0] + list(Farm.objects.values_list('pk', flat=True))
+    for key in keys:
+        SyncCounter.objects.update_or_create(pk=key, defaults={'value': value})
+    for scan in AnomalyScan.objects.all():
+        scan.sync_seqs = {str(key): scan.last_sync_seq for key in keys}
+        scan.save(update_fields=['sync_seqs'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0028_farm_name_not_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anomalyscan',
+            name='sync_seqs',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(split_sync_counter, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='anomalyscan',
+            name='last_sync_seq',
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-19 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_animal_farms(apps, schema_editor):
+    Animal = apps.get_model('dairysyncapp', 'Animal')
+    LactationCurve = apps.get_model('dairysyncapp', 'LactationCurve')
+    LactationCurve.objects.update(
+        farm_id=Subquery(Animal.objects.filter(pk=OuterRef('animal_id')).values('farm_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0029_per_farm_sync_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LactationScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sync_seqs', models.JSONField(default=dict)),
+                ('animals_fitted', models.PositiveIntegerField(default=0)),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-finished_at'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='lactationcurve',
+            name='lactation_performance_idx',
+        ),
+        migrations.RemoveField(
+            model_name='lactationcurve',
+            name='last_sync_seq',
+        ),
+        migrations.AddField(
+            model_name='lactationcurve',
+            name='farm',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dairysyncapp.farm'),
+        ),
+        migrations.RunPython(copy_animal_farms, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='lactationcurve',
+            index=models.Index(fields=['farm', 'performance'], name='lactation_farm_performance_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-19 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_animal_farms(apps, schema_editor):
+    Animal = apps.get_model('dairysyncapp', 'Animal')
+    AnomalyFlag = apps.get_model('dairysyncapp', 'AnomalyFlag')
+    AnomalyFlag.objects.update(
+        farm_id=Subquery(Animal.objects.filter(pk=OuterRef('animal_id')).values('farm_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairysyncapp', '0030_lactation_scans'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='anomalyflag',
+            name='anomaly_date_idx',
+        ),
+        migrations.AddField(
+            model_name='anomalyflag',
+            name='farm',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dairysyncapp.farm'),
+        ),
+        migrations.RunPython(copy_animal_farms, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='anomalyflag',
+            index=models.Index(fields=['farm', 'date', 'metric'], name='anomaly_farm_date_idx'),
+        ),
+    ]
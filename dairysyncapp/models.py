@@ -1,10 +1,28 @@
-from django.db import models
+import math
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.db import models
 
+from .tenancy import FarmScopedManager, owning_farm_id
+
 
 # Create your models here.
+class Farm(models.Model):
+    """The tenant every animal and its logs belong to"""
+    # not unique: two farms may share a name, and membership is never by name
+    name = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['name']
+
+
 class Profile(models.Model):
     ROLE_CHOICES = [
         ('farmer', 'Farmer'),
@@ -14,6 +32,7 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     phone = models.CharField(max_length=20)
     farm_name = models.CharField(max_length=200)
+    farm = models.ForeignKey(Farm, on_delete=models.SET_NULL, null=True, blank=True, related_name='profiles')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='farmer')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -25,7 +44,68 @@ class Profile(models.Model):
         ordering = ['-created_at']
    
     
-class Animal(models.Model):
+class SyncCounter(models.Model):
+    """
+    Hands out the change sequence used by delta sync, one per farm. The
+    primary key is the farm id, or 0 for rows without a farm.
+
+    A write locks its farm's row until it commits, so writes within one
+    farm are serialized while different farms never wait on each other.
+    Sequence numbers only order the changes of one farm.
+    """
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def allocate(cls, farm_id, count=1):
+        """
+        Reserve ``count`` sequence numbers of ``farm_id`` and return the last one.
+
+        Call it inside the transaction that writes the numbered rows: the
+        counter row stays locked until commit, so numbers become visible in
+        order and a device never misses a row below its high-water mark.
+        """
+        key = farm_id or 0
+        if not cls.objects.filter(pk=key).update(value=models.F('value') + count):
+            # first write of the farm
+            cls.objects.get_or_create(pk=key)
+            cls.objects.filter(pk=key).update(value=models.F('value') + count)
+        return cls.objects.values_list('value', flat=True).get(pk=key)
+
+    @classmethod
+    def stamp(cls, objs):
+        """Number ``objs``, each with a ``farm_id``, for bulk writes that bypass save()"""
+        by_farm = {}
+        for obj in objs:
+            by_farm.setdefault(obj.farm_id or 0, []).append(obj)
+        # always lock farms in the same order
+        for key in sorted(by_farm):
+            group = by_farm[key]
+            last = cls.allocate(key, len(group))
+            for seq, obj in enumerate(group, start=last - len(group) + 1):
+                obj.sync_seq = seq
+
+    @classmethod
+    def values(cls):
+        """``{farm key: last sequence number}`` of every farm"""
+        return dict(cls.objects.values_list('pk', 'value'))
+
+
+class SyncTracked(models.Model):
+    """Stamps every save with the next change sequence number of the row's farm"""
+    sync_seq = models.BigIntegerField(default=0,editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            self.sync_seq = SyncCounter.allocate(self.farm_id)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'sync_seq'}
+            super().save(*args, **kwargs)
+
+
+class Animal(SyncTracked):
     GENDER_CHOICES = [
         ('male','Male'),
         ('female','Female')
@@ -38,21 +118,46 @@ class Animal(models.Model):
         ('unknown','Unknown')
 
     ]
+    # leads every index below, so needs none of its own
+    farm = models.ForeignKey(Farm,on_delete=models.CASCADE,null=True,blank=True,db_index=False,related_name='animals')
     name = models.CharField(max_length=100)
     species = models.CharField(max_length=100)
     breed = models.CharField(max_length=20)
     gender = models.CharField(max_length=20)
     health_status = models.CharField(max_length=20,choices=HEALTH_STATUS_CHOICES,default='healthy')
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = FarmScopedManager()
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # animals added during a request belong to the requesting user's farm
+        if self.farm_id is None:
+            self.farm_id = owning_farm_id()
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # animal listing search, filters and sort options within a farm
+            models.Index(fields=['farm','name','id'],name='animal_farm_name_idx'),
+            models.Index(fields=['farm','created_at','id'],name='animal_farm_created_idx'),
+            models.Index(fields=['farm','species','name'],name='animal_farm_species_idx'),
+            models.Index(fields=['farm','health_status','name'],name='animal_farm_health_idx'),
+            # delta sync reads rows changed after a device's high-water mark
+            models.Index(fields=['sync_seq'],name='animal_sync_seq_idx'),
+        ]
+
+
+# observations that count as a health issue on the vet dashboard; the partial
+# index on DailyLog is only usable by queries filtering on exactly this list
+PROBLEM_OBSERVATIONS = ['needs_attention','critical']
 
-        
-class DailyLog(models.Model):
+
+class DailyLog(SyncTracked):
     ACTIVITY_CHOICES = [
         ('grazing','Grazing'),
         ('resting','Resting'),
@@ -69,7 +174,11 @@ class DailyLog(models.Model):
         ('critical','Critical'),
     ]
 
+    PROBLEM_OBSERVATIONS = PROBLEM_OBSERVATIONS
+
     animal = models.ForeignKey(Animal,on_delete=models.CASCADE,related_name='daily_logs')
+    # copied from the animal so the farm can lead this table's indexes
+    farm = models.ForeignKey(Farm,on_delete=models.CASCADE,null=True,blank=True,editable=False,db_index=False,related_name='daily_logs')
     date = models.DateField()
 
     # milk production
@@ -99,33 +208,327 @@ class DailyLog(models.Model):
 
     created_by = models.ForeignKey(User,on_delete=models.SET_NULL,null=True,blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
-    @property
-    def total_milk(self):
-        return self.morning_milk + self.afternoon_milk + self.evening_milk
+    # stored by the database so it can be filtered, sorted and summed in SQL
+    total_milk = models.GeneratedField(
+        expression=models.F('morning_milk') + models.F('afternoon_milk') + models.F('evening_milk'),
+        output_field=models.DecimalField(max_digits=8,decimal_places=3),
+        db_persist=True,
+    )
+
+    objects = FarmScopedManager()
 
     def __str__(self):
         return f"{self.animal.name} - {self.date}"
 
+    def clean(self):
+        # foreign key validation reads through the unscoped base manager, so
+        # check the animal against the current farm's as well
+        if self.animal_id is not None and not Animal.objects.filter(pk=self.animal_id).exists():
+            raise ValidationError({'animal': 'Animal not found.'})
+
+    def save(self, *args, **kwargs):
+        # always the animal's farm, also when a log is moved to another animal
+        if self.animal_id is not None:
+            self.farm_id = self.animal.farm_id
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-date','-created_at']
         unique_together = ['animal','date'] 
+        indexes = [
+            # today's count, date ranges and the (date, id) keyset in manage_logs
+            models.Index(fields=['farm','date','id'],name='dailylog_farm_date_idx'),
+            # top producers, litre thresholds and manage_logs sort by production
+            models.Index(fields=['farm','total_milk','id'],name='dailylog_farm_milk_idx'),
+            # manage_logs health filter, ordered by date
+            models.Index(fields=['farm','health_observations','date','id'],name='dailylog_farm_health_idx'),
+            # vet dashboard: recent problem logs only
+            models.Index(
+                fields=['farm','health_observations','date'],
+                name='dailylog_farm_problem_idx',
+                condition=models.Q(health_observations__in=PROBLEM_OBSERVATIONS),
+            ),
+            models.Index(fields=['sync_seq'],name='dailylog_sync_seq_idx'),
+        ]
+
+
+class Tombstone(models.Model):
+    """A deleted Animal or DailyLog, kept so offline devices drop their copy"""
+    KIND_CHOICES = [
+        ('animal','Animal'),
+        ('dailylog','Daily Log'),
+    ]
 
+    kind = models.CharField(max_length=20,choices=KIND_CHOICES)
+    # no constraint: deleting a farm writes tombstones for its animals as it goes
+    farm = models.ForeignKey(Farm,on_delete=models.DO_NOTHING,db_constraint=False,null=True,blank=True,db_index=False,related_name='+')
+    object_id = models.BigIntegerField()
+    # natural key of a deleted log, which devices may hold without its id
+    animal_id = models.BigIntegerField(null=True,blank=True)
+    date = models.DateField(null=True,blank=True)
+    sync_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
 
+    objects = FarmScopedManager()
 
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted"
 
+    class Meta:
+        ordering = ['sync_seq']
+        indexes = [
+            models.Index(fields=['sync_seq'],name='tombstone_sync_seq_idx'),
+        ]
+
+
+class AnimalProductionRollup(models.Model):
+    """Pre-aggregated DailyLog totals per animal for a day, ISO week or month"""
+    PERIOD_CHOICES = [
+        ('day','Day'),
+        ('week','ISO Week'),
+        ('month','Month'),
+    ]
 
+    animal = models.ForeignKey(Animal,on_delete=models.CASCADE,related_name='production_rollups')
+    # copied from the animal so herd series read one farm's rows on the index
+    farm = models.ForeignKey(Farm,on_delete=models.CASCADE,null=True,blank=True,db_index=False,related_name='+')
+    period = models.CharField(max_length=10,choices=PERIOD_CHOICES)
+    # first day of the period (the Monday for ISO weeks)
+    period_start = models.DateField()
 
+    log_count = models.PositiveIntegerField(default=0)
+    total_milk = models.DecimalField(max_digits=12,decimal_places=3,default=0,help_text='Litres')
+    total_feed = models.DecimalField(max_digits=12,decimal_places=3,default=0,help_text='Kilograms')
+    total_water = models.DecimalField(max_digits=12,decimal_places=3,default=0,help_text='Litres')
+    avg_temperature = models.DecimalField(max_digits=6,decimal_places=3,blank=True,null=True,help_text='°C')
+    problem_count = models.PositiveIntegerField(default=0)
 
+    updated_at = models.DateTimeField(auto_now=True)
 
+    objects = FarmScopedManager()
 
-    
+    def __str__(self):
+        return f"{self.animal_id} - {self.period} {self.period_start}"
 
-    
-    
+    class Meta:
+        ordering = ['period','-period_start']
+        constraints = [
+            models.UniqueConstraint(fields=['animal','period','period_start'],name='unique_rollup_per_period'),
+        ]
+        indexes = [
+            # herd-level charts read every animal for a range of periods
+            models.Index(fields=['farm','period','period_start'],name='rollup_farm_period_idx'),
+        ]
+
+
+class HerdStats(models.Model):
+    """
+    Running animal counts of one farm for the dashboard headline, kept by
+    signals and repaired by ``reconcile_stats``. The primary key is the
+    farm id, or 0 for animals without a farm.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    # counters may drift below zero until reconciled, so not Positive*
+    animal_count = models.IntegerField(default=0)
+    healthy_count = models.IntegerField(default=0)
+    sick_count = models.IntegerField(default=0)
+    recovering_count = models.IntegerField(default=0)
+    unknown_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Farm {self.id}: {self.animal_count} animals"
+
+    class Meta:
+        verbose_name_plural = 'herd stats'
 
 
+class HerdDayStats(models.Model):
+    """Number of daily logs of one farm (0 for none) on one date"""
+    farm_key = models.BigIntegerField()
+    date = models.DateField()
+    log_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Farm {self.farm_key} on {self.date}: {self.log_count} logs"
+
+    class Meta:
+        verbose_name_plural = 'herd day stats'
+        constraints = [
+            models.UniqueConstraint(fields=['farm_key','date'],name='unique_herd_day_stats'),
+        ]
+
+
+class LactationCurve(models.Model):
+    """
+    Wood's lactation curve fitted to an animal's current lactation,
+    ``a * t**b * exp(-c * t)`` litres on day ``t`` in milk
+    """
+    animal = models.OneToOneField(Animal,on_delete=models.CASCADE,related_name='lactation_curve')
+    # copied from the animal so the vet dashboard reads one farm's curves on the index
+    farm = models.ForeignKey(Farm,on_delete=models.CASCADE,null=True,blank=True,db_index=False,related_name='+')
+    # first log of the current lactation, standing in for the calving date;
+    # the curve fields stay empty until the lactation has enough logs to fit
+    lactation_start = models.DateField(null=True,blank=True)
+    a = models.FloatField(null=True,blank=True)
+    b = models.FloatField(null=True,blank=True)
+    c = models.FloatField(null=True,blank=True)
+    rmse = models.FloatField(null=True,blank=True,help_text='Litres')
+    # recent actual over expected yield, below 1 for underperformers
+    performance = models.FloatField(null=True,blank=True)
+
+    # logs of the animal when it was fitted
+    log_count = models.PositiveIntegerField(default=0)
+    fitted_at = models.DateTimeField(auto_now=True)
+
+    objects = FarmScopedManager()
+
+    def __str__(self):
+        return f"{self.animal_id} - lactation from {self.lactation_start or '?'}"
+
+    @property
+    def is_fitted(self):
+        return self.a is not None
+
+    def expected_on(self, day):
+        """Expected litres on ``day``, or None without a fitted curve"""
+        if not self.is_fitted:
+            return None
+        t = max((day - self.lactation_start).days + 1, 1)
+        return self.a * t ** self.b * math.exp(-self.c * t)
+
+    class Meta:
+        indexes = [
+            # vet dashboard: the farm's weakest producers first
+            models.Index(fields=['farm','performance'],name='lactation_farm_performance_idx'),
+        ]
+
+
+class AnomalyFlag(models.Model):
+    """A daily log value far outside the animal's own recent baseline"""
+    METRIC_CHOICES = [
+        ('milk','Milk Yield'),
+        ('temperature','Temperature'),
+        ('feed','Feed Intake'),
+        ('water','Water Intake'),
+    ]
+
+    animal = models.ForeignKey(Animal,on_delete=models.CASCADE,related_name='anomaly_flags')
+    # copied from the animal so the vet dashboard reads one farm's flags on the index
+    farm = models.ForeignKey(Farm,on_delete=models.CASCADE,null=True,blank=True,db_index=False,related_name='+')
+    date = models.DateField()
+    metric = models.CharField(max_length=20,choices=METRIC_CHOICES)
+    value = models.FloatField()
+    # EWMA of the previous days, and the rolling z-score against them
+    expected = models.FloatField()
+    zscore = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = FarmScopedManager()
 
+    def __str__(self):
+        return f"{self.animal_id} - {self.metric} on {self.date}"
+
+    class Meta:
+        ordering = ['-date','zscore']
+        constraints = [
+            models.UniqueConstraint(fields=['animal','date','metric'],name='unique_anomaly_per_metric'),
+        ]
+        indexes = [
+            # vet dashboard: the farm's last week of flags, newest first
+            models.Index(fields=['farm','date','metric'],name='anomaly_farm_date_idx'),
+        ]
+
+
+class LactationScan(models.Model):
+    """One fit_lactation_curves run; the latest one is where the next run resumes"""
+    # {farm key: SyncCounter value read up to}, see SyncCounter.values()
+    sync_seqs = models.JSONField(default=dict)
+    animals_fitted = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-finished_at']
 
 
+class AnomalyScan(models.Model):
+    """One detect_anomalies run; the latest one is where the next run resumes"""
+    # {farm key: SyncCounter value read up to}, see SyncCounter.values()
+    sync_seqs = models.JSONField(default=dict)
+    rows_scored = models.PositiveIntegerField(default=0)
+    flags = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-finished_at']
+
+
+class Job(models.Model):
+    """Background work queued in the database and run by ``manage.py run_worker``"""
+    KIND_CHOICES = [
+        ('import_logs','Import Logs'),
+        ('export_logs','Export Logs'),
+        ('delete_logs','Delete Logs'),
+        ('rebuild_rollups','Rebuild Rollups'),
+        ('detect_anomalies','Detect Anomalies'),
+        ('fit_lactation_curves','Fit Lactation Curves'),
+    ]
+
+    STATUS_CHOICES = [
+        ('queued','Queued'),
+        ('running','Running'),
+        ('succeeded','Succeeded'),
+        ('failed','Failed'),
+    ]
+
+    kind = models.CharField(max_length=40,choices=KIND_CHOICES)
+    params = models.JSONField(default=dict,blank=True)
+    status = models.CharField(max_length=20,choices=STATUS_CHOICES,default='queued')
+    # the handler runs scoped to this farm, like the request that queued it
+    farm = models.ForeignKey(Farm,on_delete=models.CASCADE,null=True,blank=True,db_index=False,related_name='jobs')
+    created_by = models.ForeignKey(User,on_delete=models.SET_NULL,null=True,blank=True)
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # a failed attempt pushes this back before the retry
+    run_after = models.DateTimeField(default=timezone.now)
+
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True,blank=True)
+    message = models.CharField(max_length=200,blank=True)
+    result = models.JSONField(null=True,blank=True)
+    error = models.TextField(blank=True)
+
+    worker = models.CharField(max_length=100,blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True,blank=True)
+    finished_at = models.DateTimeField(null=True,blank=True)
+    # refreshed by every progress report; a running job whose heartbeat
+    # stops was lost with its worker and is queued again
+    heartbeat_at = models.DateTimeField(null=True,blank=True)
+
+    objects = FarmScopedManager()
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded','failed')
+
+    @property
+    def percent(self):
+        """Progress as a whole percentage, or None while the total is unknown"""
+        if not self.total:
+            return 100 if self.status == 'succeeded' else None
+        return min(100, self.progress * 100 // self.total)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # workers claim the oldest due job
+            models.Index(fields=['status','run_after','id'],name='job_queue_idx'),
+            # a farm's recent jobs
+            models.Index(fields=['farm','created_at'],name='job_farm_created_idx'),
+        ]
@@ -0,0 +1,175 @@
+"""
+Yearly range partitioning of the DailyLog table on PostgreSQL.
+
+Migration 0019 rebuilds ``dairysyncapp_dailylog`` as a table partitioned by
+``date``, with one partition per year plus a default partition catching
+anything outside them, so date-filtered queries only read the years they
+touch. The ``create_log_partitions`` command adds partitions for coming
+years. Other backends keep the plain table and these helpers do nothing.
+
+PostgreSQL requires the partition key in every primary key and unique
+constraint, so the primary key becomes ``(id, date)``. ``id`` still comes
+from its own identity sequence and Django keeps treating it as the key,
+but no other table can hold a foreign key to DailyLog.
+"""
+import re
+from datetime import date
+
+LOG_TABLE = 'dairysyncapp_dailylog'
+DEFAULT_PARTITION = f'{LOG_TABLE}_default'
+
+
+def partition_name(year):
+    return f'{LOG_TABLE}_y{year}'
+
+
+def yearly_partitions(first_year, last_year):
+    """``(name, start, end)`` for each year, ``end`` being exclusive"""
+    return [
+        (partition_name(year), date(year, 1, 1), date(year + 1, 1, 1))
+        for year in range(first_year, last_year + 1)
+    ]
+
+
+def is_partitioned(cursor, table=LOG_TABLE):
+    cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [table])
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def _table_exists(cursor, table):
+    cursor.execute('SELECT to_regclass(%s)', [table])
+    return cursor.fetchone()[0] is not None
+
+
+def _insertable_columns(cursor, table):
+    # generated columns (total_milk) are computed by each table and cannot be copied
+    cursor.execute(
+        """
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+        """,
+        [table],
+    )
+    return ', '.join(f'"{column}"' for column, in cursor.fetchall())
+
+
+def create_partitions(cursor, first_year, last_year):
+    """
+    Create the missing yearly partitions from ``first_year`` to
+    ``last_year`` and return their names. Rows already sitting in the
+    default partition for those years are moved into the new partitions.
+    """
+    created = []
+    for name, start, end in yearly_partitions(first_year, last_year):
+        if _table_exists(cursor, name):
+            continue
+        bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        in_range = f""""date" >= '{start.isoformat()}' AND "date" < '{end.isoformat()}'"""
+
+        stranded = False
+        if _table_exists(cursor, DEFAULT_PARTITION):
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})')
+            stranded = cursor.fetchone()[0]
+
+        if stranded:
+            columns = _insertable_columns(cursor, DEFAULT_PARTITION)
+            cursor.execute(f'ALTER TABLE {LOG_TABLE} DETACH PARTITION {DEFAULT_PARTITION}')
+            cursor.execute(f'CREATE TABLE {name} PARTITION OF {LOG_TABLE} FOR VALUES {bounds}')
+            cursor.execute(
+                f'INSERT INTO {name} ({columns}) SELECT {columns} FROM {DEFAULT_PARTITION} WHERE {in_range}'
+            )
+            cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}')
+            cursor.execute(f'ALTER TABLE {LOG_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+        else:
+            cursor.execute(f'CREATE TABLE {name} PARTITION OF {LOG_TABLE} FOR VALUES {bounds}')
+        created.append(name)
+    return created
+
+
+def _key_definition(kind, definition, partitioned):
+    """Add or drop ``date`` in a primary key / unique constraint definition"""
+    head, columns = definition.split('(', 1)
+    columns, tail = columns.split(')', 1)
+    columns = [column.strip() for column in columns.split(',')]
+    keys = [column.strip('"') for column in columns]
+    if partitioned and 'date' not in keys:
+        columns.append('"date"')
+    elif not partitioned and kind == 'p' and keys != ['id']:
+        columns = [column for column, key in zip(columns, keys) if key != 'date']
+    return f"{head}({', '.join(columns)}){tail}"
+
+
+def _rebuild(cursor, partitioned):
+    old = f'{LOG_TABLE}_old'
+    cursor.execute(f'ALTER TABLE {LOG_TABLE} RENAME TO {old}')
+
+    # constraint and index names are kept so later migrations can find them
+    cursor.execute(
+        """
+        SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')
+        ORDER BY conname
+        """,
+        [old],
+    )
+    constraints = cursor.fetchall()
+    constraint_names = {name for name, _, _ in constraints}
+    cursor.execute(
+        'SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s',
+        [old],
+    )
+    indexes = [
+        re.sub(rf' ON (ONLY )?(\S+\.)?"?{old}"? ', f' ON {LOG_TABLE} ', definition, count=1)
+        for name, definition in cursor.fetchall() if name not in constraint_names
+    ]
+
+    partition_by = ' PARTITION BY RANGE ("date")' if partitioned else ''
+    cursor.execute(
+        f'CREATE TABLE {LOG_TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING GENERATED '
+        f'INCLUDING IDENTITY INCLUDING CONSTRAINTS){partition_by}'
+    )
+
+    if partitioned:
+        cursor.execute(f'SELECT MIN("date"), MAX("date") FROM {old}')
+        first, last = cursor.fetchone()
+        this_year = date.today().year
+        create_partitions(
+            cursor,
+            min(first.year if first else this_year, this_year),
+            max(last.year if last else this_year, this_year + 1),
+        )
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {LOG_TABLE} DEFAULT')
+
+    columns = _insertable_columns(cursor, old)
+    cursor.execute(f'INSERT INTO {LOG_TABLE} ({columns}) OVERRIDING SYSTEM VALUE SELECT {columns} FROM {old}')
+    cursor.execute(f'DROP TABLE {old}')
+
+    for name, kind, definition in constraints:
+        if kind in ('p', 'u'):
+            definition = _key_definition(kind, definition, partitioned)
+        cursor.execute(f'ALTER TABLE {LOG_TABLE} ADD CONSTRAINT "{name}" {definition}')
+    for definition in indexes:
+        cursor.execute(definition)
+
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {LOG_TABLE}",
+        [LOG_TABLE],
+    )
+
+
+def partition_daily_logs(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            _rebuild(cursor, partitioned=True)
+
+
+def unpartition_daily_logs(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            _rebuild(cursor, partitioned=False)
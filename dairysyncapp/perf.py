@@ -0,0 +1,189 @@
+"""
+Per-request performance metrics.
+
+The PerformanceMiddleware collects SQL, template and wall-clock timings for
+every request and folds them into fixed-bucket histograms per URL name.
+
+Requests only touch process memory. Every ``DAIRYSYNC_PERF_FLUSH_INTERVAL``
+seconds a process writes its cumulative histograms, as one snapshot under
+a key of its own, to the cache alias named by
+``DAIRYSYNC_PERF_CACHE_ALIAS``, and the ``perf_report`` command merges the
+snapshots of every process. Each key has a single writer, so nothing
+relies on ``incr`` being atomic (FileBasedCache's is not), and a snapshot
+lost from the shared list of snapshot keys is re-added on the next flush.
+The last interval of a process that exits is not reported.
+"""
+import os
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+# histogram bucket upper bounds; the last bucket catches everything above
+TIME_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float('inf')]
+QUERY_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000, float('inf')]
+
+METRICS = {
+    'view_ms': TIME_BUCKETS_MS,
+    'sql_ms': TIME_BUCKETS_MS,
+    'template_ms': TIME_BUCKETS_MS,
+    'queries': QUERY_BUCKETS,
+}
+
+REGISTRY_KEY = 'dairysync:perf:snapshots'
+# changed by reset() so that running processes drop what they recorded before
+GENERATION_KEY = 'dairysync:perf:generation'
+
+# template render time of the current request, in seconds
+template_time = ContextVar('template_time', default=None)
+
+_lock = threading.Lock()
+# {url_name: {metric: {'counts': [...], 'sum': float}}} recorded by this process
+_histograms = {}
+_state = {'generation': None, 'flushed_at': 0.0, 'pid': None, 'key': None}
+
+
+def get_cache():
+    return caches[getattr(settings, 'DAIRYSYNC_PERF_CACHE_ALIAS', 'perf')]
+
+
+def _snapshot_key():
+    # forked workers inherit the parent's state, so the key follows the pid
+    if _state['pid'] != os.getpid():
+        _state['pid'] = os.getpid()
+        _state['key'] = f'dairysync:perf:snapshot:{uuid.uuid4().hex}'
+        _histograms.clear()
+    return _state['key']
+
+
+def bucket_index(bounds, value):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            return index
+    return len(bounds) - 1
+
+
+def record(url_name, samples):
+    """Add one request's ``{metric: value}`` samples to this process's histograms"""
+    with _lock:
+        _snapshot_key()
+        metrics = _histograms.setdefault(url_name, {})
+        for metric, value in samples.items():
+            bounds = METRICS[metric]
+            histogram = metrics.setdefault(metric, {'counts': [0] * len(bounds), 'sum': 0.0})
+            histogram['counts'][bucket_index(bounds, value)] += 1
+            histogram['sum'] += value
+        due = time.monotonic() - _state['flushed_at'] >= getattr(settings, 'DAIRYSYNC_PERF_FLUSH_INTERVAL', 10)
+    if due:
+        flush()
+
+
+def flush():
+    """Write this process's histograms to the shared cache"""
+    cache = get_cache()
+    with _lock:
+        key = _snapshot_key()
+        _state['flushed_at'] = time.monotonic()
+        shared = cache.get_many([REGISTRY_KEY, GENERATION_KEY])
+        generation = shared.get(GENERATION_KEY)
+        if generation != _state['generation']:
+            # reset() ran since the last flush
+            _state['generation'] = generation
+            _histograms.clear()
+        if not _histograms:
+            return
+        snapshot = {
+            url_name: {metric: dict(values, counts=list(values['counts'])) for metric, values in metrics.items()}
+            for url_name, metrics in _histograms.items()
+        }
+    cache.set(key, snapshot, None)
+    keys = shared.get(REGISTRY_KEY, set())
+    if key not in keys:
+        cache.set(REGISTRY_KEY, keys | {key}, None)
+
+
+def _merged():
+    cache = get_cache()
+    merged = {}
+    for snapshot in cache.get_many(cache.get(REGISTRY_KEY, set())).values():
+        for url_name, metrics in snapshot.items():
+            for metric, values in metrics.items():
+                histogram = merged.setdefault(url_name, {}).setdefault(
+                    metric, {'counts': [0] * len(METRICS[metric]), 'sum': 0.0}
+                )
+                histogram['counts'] = [a + b for a, b in zip(histogram['counts'], values['counts'])]
+                histogram['sum'] += values['sum']
+    return merged
+
+
+def histogram(url_name, metric):
+    values = _merged().get(url_name, {}).get(metric)
+    return values['counts'] if values else [0] * len(METRICS[metric])
+
+
+def percentile(bounds, counts, fraction):
+    """Upper bound of the bucket holding the ``fraction`` quantile"""
+    total = sum(counts)
+    if not total:
+        return None
+    threshold = fraction * total
+    running = 0
+    for bound, count in zip(bounds, counts):
+        running += count
+        if running >= threshold:
+            return bound
+    return bounds[-1]
+
+
+def report():
+    """
+    Return ``{url_name: {metric: {'count', 'mean', 'p50', 'p95', 'p99'}}}``
+    built from the histograms of every process
+    """
+    flush()
+    result = {}
+    merged = _merged()
+    for url_name in sorted(merged):
+        result[url_name] = {}
+        for metric, bounds in METRICS.items():
+            values = merged[url_name].get(metric, {'counts': [0] * len(bounds), 'sum': 0.0})
+            counts = values['counts']
+            total = sum(counts)
+            result[url_name][metric] = {
+                'count': total,
+                'mean': values['sum'] / total if total else None,
+                'p50': percentile(bounds, counts, 0.50),
+                'p95': percentile(bounds, counts, 0.95),
+                'p99': percentile(bounds, counts, 0.99),
+            }
+    return result
+
+
+def reset():
+    cache = get_cache()
+    cache.delete_many(list(cache.get(REGISTRY_KEY, set())))
+    cache.delete(REGISTRY_KEY)
+    generation = uuid.uuid4().hex
+    cache.set(GENERATION_KEY, generation, None)
+    with _lock:
+        _state['generation'] = generation
+        _histograms.clear()
+
+
+class QueryTimer:
+    """Database execute_wrapper counting queries and their total time"""
+
+    def __init__(self):
+        self.count = 0
+        self.elapsed = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.elapsed += time.perf_counter() - start
+            self.count += 1
@@ -0,0 +1,209 @@
+"""
+Feed conversion efficiency: litres of milk per kilogram of feed.
+
+A report covers any range of days. It is read from AnimalProductionRollup
+rather than DailyLog: the whole months inside the range come from month
+rollups and only the partial months at its ends from day rollups, so a
+year costs about a dozen rows per animal instead of 365. The database
+sums them into one row per animal, and NumPy derives everything else
+from those columns at once: each animal's efficiency and rank, the breed
+totals (``numpy.bincount`` over the breed of each animal) and the herd
+totals.
+
+Efficiency is always total milk over total feed, never a mean of
+ratios, so a breed or herd figure weighs each animal by what it ate.
+Animals with no feed recorded have no efficiency and rank last.
+
+With a feed cost per kilogram the report adds feed cost per litre, and
+with a milk price too the margin of milk income over feed cost. Both
+default to ``DAIRYSYNC_FEED_COST_PER_KG`` and
+``DAIRYSYNC_MILK_PRICE_PER_LITRE``.
+"""
+import csv
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q, Sum
+
+from .caching import cached
+from .exports import _Echo
+from .models import AnimalProductionRollup
+from .rollups import period_bounds
+
+FEED_COST_PER_KG = getattr(settings, 'DAIRYSYNC_FEED_COST_PER_KG', None)
+MILK_PRICE_PER_LITRE = getattr(settings, 'DAIRYSYNC_MILK_PRICE_PER_LITRE', None)
+
+# (header, row key) in file column order
+ANIMAL_COLUMNS = [
+    ('rank', 'rank'),
+    ('animal_id', 'animal_id'),
+    ('animal', 'name'),
+    ('breed', 'breed'),
+    ('logs', 'log_count'),
+    ('total_milk', 'milk'),
+    ('total_feed', 'feed'),
+    ('milk_per_day', 'milk_per_day'),
+    ('efficiency', 'efficiency'),
+    ('herd_ratio', 'herd_ratio'),
+    ('feed_cost', 'feed_cost'),
+    ('feed_cost_per_litre', 'feed_cost_per_litre'),
+    ('margin', 'margin'),
+]
+BREED_COLUMNS = [
+    ('breed', 'breed'),
+    ('animals', 'animals'),
+    ('logs', 'log_count'),
+    ('total_milk', 'milk'),
+    ('total_feed', 'feed'),
+    ('efficiency', 'efficiency'),
+    ('feed_cost_per_litre', 'feed_cost_per_litre'),
+    ('margin', 'margin'),
+]
+REPORT_LEVELS = {'animal': ('animals', ANIMAL_COLUMNS), 'breed': ('breeds', BREED_COLUMNS)}
+
+
+def require_numpy():
+    try:
+        import numpy
+    except ImportError as exc:
+        raise ImportError('Feed efficiency reports require the numpy package.') from exc
+    return numpy
+
+
+def window_filter(start, end):
+    """Rollup rows summing to exactly the days ``start``..``end``"""
+    first_month = start if start.day == 1 else period_bounds('month', start)[1] + timedelta(days=1)
+    # the day after the last whole month
+    after_months = end + timedelta(days=1) if end == period_bounds('month', end)[1] else end.replace(day=1)
+    if first_month >= after_months:
+        return Q(period='day', period_start__range=(start, end))
+    return (
+        Q(period='month', period_start__gte=first_month, period_start__lt=after_months)
+        | Q(period='day', period_start__gte=start, period_start__lt=first_month)
+        | Q(period='day', period_start__gte=after_months, period_start__lte=end)
+    )
+
+
+def _animal_totals(start, end):
+    return (
+        AnimalProductionRollup.objects.filter(window_filter(start, end))
+        .order_by()
+        .values('animal_id', 'animal__name', 'animal__breed')
+        .annotate(milk=Sum('total_milk'), feed=Sum('total_feed'), log_count=Sum('log_count'))
+        .filter(log_count__gt=0)
+    )
+
+
+def _ratio(np, numerator, denominator):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), np.nan)
+
+
+def _value(number, places=3):
+    """A NumPy scalar as a rounded float, or None for NaN"""
+    number = float(number)
+    return None if number != number else round(number, places)
+
+
+def _costs(np, milk, feed, feed_cost, milk_price):
+    if feed_cost is None:
+        return None, None, None
+    cost = feed * feed_cost
+    margin = milk * milk_price - cost if milk_price is not None else np.full(len(milk), np.nan)
+    return cost, _ratio(np, cost, milk), margin
+
+
+def feed_efficiency(start, end, feed_cost=FEED_COST_PER_KG, milk_price=MILK_PRICE_PER_LITRE):
+    """
+    Feed efficiency per animal (best first), per breed and for the herd
+    between ``start`` and ``end``, as
+    ``{'start', 'end', 'days', 'herd', 'breeds', 'animals'}``.
+    """
+    np = require_numpy()
+    rows = list(_animal_totals(start, end))
+    days = (end - start).days + 1
+
+    ids = np.array([row['animal_id'] for row in rows], dtype=np.int64)
+    milk = np.array([float(row['milk']) for row in rows], dtype=np.float64)
+    feed = np.array([float(row['feed']) for row in rows], dtype=np.float64)
+    logs = np.array([row['log_count'] for row in rows], dtype=np.int64)
+    breed_names, breed_of = np.unique(
+        np.array([row['animal__breed'] for row in rows], dtype=object), return_inverse=True,
+    )
+
+    efficiency = _ratio(np, milk, feed)
+    herd_milk, herd_feed = milk.sum(), feed.sum()
+    herd_efficiency = herd_milk / herd_feed if herd_feed > 0 else np.nan
+    # best first, animals without feed last, ties broken by id
+    order = np.lexsort((ids, -np.nan_to_num(efficiency, nan=-np.inf)))
+    cost, cost_per_litre, margin = _costs(np, milk, feed, feed_cost, milk_price)
+
+    animals = []
+    for rank, i in enumerate(order, start=1):
+        row = rows[i]
+        animals.append({
+            'rank': rank,
+            'animal_id': row['animal_id'],
+            'name': row['animal__name'],
+            'breed': row['animal__breed'],
+            'log_count': int(logs[i]),
+            'milk': _value(milk[i]),
+            'feed': _value(feed[i]),
+            'milk_per_day': _value(milk[i] / logs[i]),
+            'efficiency': _value(efficiency[i]),
+            'herd_ratio': _value(efficiency[i] / herd_efficiency),
+            'feed_cost': _value(cost[i], 2) if cost is not None else None,
+            'feed_cost_per_litre': _value(cost_per_litre[i]) if cost is not None else None,
+            'margin': _value(margin[i], 2) if cost is not None else None,
+        })
+
+    groups = len(breed_names)
+    breed_milk = np.bincount(breed_of, weights=milk, minlength=groups)
+    breed_feed = np.bincount(breed_of, weights=feed, minlength=groups)
+    breed_efficiency = _ratio(np, breed_milk, breed_feed)
+    breed_costs = _costs(np, breed_milk, breed_feed, feed_cost, milk_price)
+    breed_animals = np.bincount(breed_of, minlength=groups)
+    breed_logs = np.bincount(breed_of, weights=logs, minlength=groups)
+    breeds = [
+        {
+            'breed': breed_names[g],
+            'animals': int(breed_animals[g]),
+            'log_count': int(breed_logs[g]),
+            'milk': _value(breed_milk[g]),
+            'feed': _value(breed_feed[g]),
+            'efficiency': _value(breed_efficiency[g]),
+            'feed_cost_per_litre': _value(breed_costs[1][g]) if feed_cost is not None else None,
+            'margin': _value(breed_costs[2][g], 2) if feed_cost is not None else None,
+        }
+        for g in np.argsort(-np.nan_to_num(breed_efficiency, nan=-np.inf), kind='stable')
+    ]
+
+    herd_costs = _costs(np, np.array([herd_milk]), np.array([herd_feed]), feed_cost, milk_price)
+    herd = {
+        'animals': len(rows),
+        'log_count': int(logs.sum()),
+        'milk': _value(herd_milk),
+        'feed': _value(herd_feed),
+        'efficiency': _value(herd_efficiency),
+        'feed_cost': _value(herd_costs[0][0], 2) if feed_cost is not None else None,
+        'feed_cost_per_litre': _value(herd_costs[1][0]) if feed_cost is not None else None,
+        'margin': _value(herd_costs[2][0], 2) if feed_cost is not None else None,
+    }
+    return {'start': start, 'end': end, 'days': days, 'herd': herd, 'breeds': breeds, 'animals': animals}
+
+
+def cached_feed_efficiency(start, end, feed_cost=FEED_COST_PER_KG, milk_price=MILK_PRICE_PER_LITRE):
+    """``(report, hit)`` from the view cache, rebuilt when logs or animals change"""
+    return cached(
+        'feed_efficiency', (start, end, feed_cost, milk_price), ['animal', 'dailylog'],
+        lambda: feed_efficiency(start, end, feed_cost, milk_price),
+    )
+
+
+def iter_report_csv(report, level='animal'):
+    """Yield the ``animal`` or ``breed`` rows of a report as CSV lines"""
+    key, columns = REPORT_LEVELS[level]
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in columns])
+    for row in report[key]:
+        yield writer.writerow([row[name] for _, name in columns])
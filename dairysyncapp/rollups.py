@@ -0,0 +1,144 @@
+"""
+Maintenance of the AnimalProductionRollup table.
+
+Each rollup row is recomputed from the raw DailyLog rows of its period, so
+saving or deleting one log touches at most three small buckets (its day,
+ISO week and month) rather than rescanning the animal's history.
+"""
+import operator
+from datetime import timedelta
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import AnimalProductionRollup, DailyLog, PROBLEM_OBSERVATIONS
+
+PERIODS = [period for period, _ in AnimalProductionRollup.PERIOD_CHOICES]
+
+ROLLUP_BATCH_SIZE = 1000
+# emptied buckets removed per DELETE; keeps the OR within SQLite's expression depth
+ROLLUP_DELETE_CHUNK = 100
+
+
+def rollup_aggregates():
+    """Aggregate expressions shared by the incremental and full rebuild paths"""
+    return {
+        'log_count': Count('id'),
+        'total_milk': Sum('total_milk'),
+        'total_feed': Sum('feed_amount'),
+        'total_water': Sum('water'),
+        'avg_temperature': Avg('temperature'),
+        'problem_count': Count('id', filter=Q(health_observations__in=PROBLEM_OBSERVATIONS)),
+    }
+
+
+def period_bounds(period, day):
+    """Return the first and last date of the ``period`` containing ``day``"""
+    if period == 'day':
+        return day, day
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if period == 'month':
+        start = day.replace(day=1)
+        next_month = (start + timedelta(days=32)).replace(day=1)
+        return start, next_month - timedelta(days=1)
+    raise ValueError(f'Unknown rollup period: {period}')
+
+
+ROLLUP_FIELDS = ['log_count', 'total_milk', 'total_feed', 'total_water', 'avg_temperature', 'problem_count']
+
+
+def period_start_expression(period):
+    """SQL expression mapping a log date to the first day of its ``period``"""
+    return {
+        'day': F('date'),
+        'week': TruncWeek('date'),
+        'month': TruncMonth('date'),
+    }[period]
+
+
+def _write_rollups(period, rows):
+    AnimalProductionRollup.objects.bulk_create(
+        [AnimalProductionRollup(period=period, **row) for row in rows],
+        batch_size=ROLLUP_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['animal', 'period', 'period_start'],
+        update_fields=ROLLUP_FIELDS + ['farm', 'updated_at'],
+    )
+
+
+def refresh_rollups(animal_id, day):
+    """Recompute the day, week and month rollups for one animal and date"""
+    refresh_rollups_for([(animal_id, day)])
+
+
+def refresh_rollups_for(keys):
+    """
+    Refresh rollups for an iterable of (animal_id, date) pairs, such as the
+    rows written by a bulk insert.
+
+    Each period is recomputed with one grouped query over the affected
+    animals and dates, and buckets left without logs are removed.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+
+    animal_ids = {animal_id for animal_id, _ in keys}
+    with transaction.atomic():
+        for period in PERIODS:
+            buckets = {(animal_id, period_bounds(period, day)) for animal_id, day in keys}
+            first = min(bounds[0] for _, bounds in buckets)
+            last = max(bounds[1] for _, bounds in buckets)
+            wanted = {(animal_id, bounds[0]) for animal_id, bounds in buckets}
+
+            rows = DailyLog.objects.order_by().filter(
+                animal_id__in=animal_ids, date__range=(first, last)
+            ).values(
+                'animal_id', 'farm_id', period_start=period_start_expression(period)
+            ).annotate(**rollup_aggregates())
+            rows = [row for row in rows if (row['animal_id'], row['period_start']) in wanted]
+            _write_rollups(period, rows)
+
+            emptied = sorted(wanted - {(row['animal_id'], row['period_start']) for row in rows})
+            for start in range(0, len(emptied), ROLLUP_DELETE_CHUNK):
+                buckets = reduce(operator.or_, (
+                    Q(animal_id=animal_id, period_start=period_start)
+                    for animal_id, period_start in emptied[start:start + ROLLUP_DELETE_CHUNK]
+                ))
+                AnimalProductionRollup.objects.filter(buckets, period=period).delete()
+
+
+def rebuild_rollups(animal_ids=None):
+    """
+    Drop and recompute every rollup from DailyLog with grouped queries.
+
+    Returns the number of rollup rows written.
+    """
+    logs = DailyLog.objects.order_by()
+    existing = AnimalProductionRollup.objects.all()
+    if animal_ids:
+        logs = logs.filter(animal_id__in=animal_ids)
+        existing = existing.filter(animal_id__in=animal_ids)
+
+    written = 0
+    with transaction.atomic():
+        existing.delete()
+        for period in PERIODS:
+            rows = logs.values(
+                'animal_id', 'farm_id', period_start=period_start_expression(period)
+            ).annotate(**rollup_aggregates())
+            batch = []
+            for row in rows.iterator(chunk_size=ROLLUP_BATCH_SIZE):
+                batch.append(AnimalProductionRollup(period=period, **row))
+                if len(batch) == ROLLUP_BATCH_SIZE:
+                    AnimalProductionRollup.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+            if batch:
+                AnimalProductionRollup.objects.bulk_create(batch)
+                written += len(batch)
+    return written
@@ -0,0 +1,154 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .caching import invalidate
+from .counters import count_animal, count_log, refresh_log_counts
+from .models import Animal, AnimalProductionRollup, AnomalyFlag, DailyLog, LactationCurve, Profile, SyncCounter, Tombstone
+from .rollups import refresh_rollups
+
+MOVE_BATCH_SIZE = 500
+
+
+@receiver(pre_save, sender=DailyLog)
+def remember_previous_log_bucket(sender, instance, raw=False, **kwargs):
+    """Keep the stored (animal, date) and (farm, date) so a moved log also clears its old buckets"""
+    if raw or instance.pk is None:
+        return
+    previous = DailyLog._base_manager.filter(pk=instance.pk).values_list('animal_id', 'date', 'farm_id').first()
+    if previous:
+        instance._previous_bucket = previous[:2]
+        instance._previous_day = (previous[2], previous[1])
+
+
+@receiver(post_save, sender=DailyLog)
+def update_rollups_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_rollups(instance.animal_id, instance.date)
+    previous = getattr(instance, '_previous_bucket', None)
+    if previous and previous != (instance.animal_id, instance.date):
+        refresh_rollups(*previous)
+
+
+@receiver(post_delete, sender=DailyLog)
+def update_rollups_on_delete(sender, instance, origin=None, **kwargs):
+    # deleting an animal cascades to its logs and rollups alike
+    if isinstance(origin, Animal):
+        return
+    refresh_rollups(instance.animal_id, instance.date)
+
+
+@receiver(post_save, sender=DailyLog)
+def count_log_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_day', None)
+    current = (instance.farm_id, instance.date)
+    if created or previous is None:
+        count_log(*current, 1)
+    elif previous != current:
+        count_log(*previous, -1)
+        count_log(*current, 1)
+
+
+@receiver(post_delete, sender=DailyLog)
+def count_log_on_delete(sender, instance, **kwargs):
+    count_log(instance.farm_id, instance.date, -1)
+
+
+@receiver(pre_save, sender=Animal)
+def remember_previous_health(sender, instance, raw=False, **kwargs):
+    """Keep the stored (farm, health status) so a change moves the animal between counters"""
+    if raw or instance.pk is None:
+        return
+    instance._previous_counted = (
+        Animal._base_manager.filter(pk=instance.pk).values_list('farm_id', 'health_status').first()
+    )
+
+
+@receiver(post_save, sender=Animal)
+def count_animal_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_counted', None)
+    current = (instance.farm_id, instance.health_status)
+    if created or previous is None:
+        count_animal(*current, 1)
+    elif previous != current:
+        count_animal(*previous, -1)
+        count_animal(*current, 1)
+
+
+@receiver(post_delete, sender=Animal)
+def count_animal_on_delete(sender, instance, **kwargs):
+    count_animal(instance.farm_id, instance.health_status, -1)
+
+
+@receiver(post_save, sender=Animal)
+def move_animal_rows(sender, instance, created, raw=False, **kwargs):
+    """
+    Move the logs and rollups of an animal given to another farm, which
+    carry the farm themselves, within the save's transaction. The logs are
+    renumbered so the new farm's devices pull them, and the old farm's get
+    a tombstone for the animal.
+    """
+    previous = getattr(instance, '_previous_counted', None)
+    if raw or created or previous is None or previous[0] == instance.farm_id:
+        return
+    old_farm_id = previous[0]
+    logs = list(DailyLog._base_manager.filter(animal_id=instance.pk).only('id', 'date'))
+    for log in logs:
+        log.farm_id = instance.farm_id
+    SyncCounter.stamp(logs)
+    DailyLog._base_manager.bulk_update(logs, ['farm', 'sync_seq'], batch_size=MOVE_BATCH_SIZE)
+    AnimalProductionRollup._base_manager.filter(animal_id=instance.pk).update(farm_id=instance.farm_id)
+    LactationCurve._base_manager.filter(animal_id=instance.pk).update(farm_id=instance.farm_id)
+    AnomalyFlag._base_manager.filter(animal_id=instance.pk).update(farm_id=instance.farm_id)
+    days = {log.date for log in logs}
+    refresh_log_counts({(farm_id, day) for farm_id in (old_farm_id, instance.farm_id) for day in days})
+    Tombstone.objects.create(
+        kind='animal', farm_id=old_farm_id, object_id=instance.pk, sync_seq=SyncCounter.allocate(old_farm_id),
+    )
+    invalidate('dailylog', f'animal:{instance.pk}', farm_ids=[old_farm_id, instance.farm_id])
+
+
+@receiver(post_save, sender=Animal)
+@receiver(post_delete, sender=Animal)
+def invalidate_animal_views(sender, instance, **kwargs):
+    # an animal given to another farm leaves the old farm's pages too
+    previous = getattr(instance, '_previous_counted', None)
+    farm_ids = [instance.farm_id] + ([previous[0]] if previous else [])
+    invalidate('animal', f'animal:{instance.pk}', farm_ids=farm_ids)
+
+
+@receiver(post_save, sender=DailyLog)
+@receiver(post_delete, sender=DailyLog)
+def invalidate_log_views(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_day', None)
+    farm_ids = [instance.farm_id] + ([previous[0]] if previous else [])
+    invalidate('dailylog', f'animal:{instance.animal_id}', farm_ids=farm_ids)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_views(sender, instance, **kwargs):
+    invalidate('profile', f'profile:{instance.user_id}')
+
+
+@receiver(post_delete, sender=Animal)
+def record_animal_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(
+        kind='animal', farm_id=instance.farm_id, object_id=instance.pk,
+        sync_seq=SyncCounter.allocate(instance.farm_id),
+    )
+
+
+@receiver(post_delete, sender=DailyLog)
+def record_log_tombstone(sender, instance, origin=None, **kwargs):
+    # an animal's tombstone already tells devices to drop all of its logs
+    if isinstance(origin, Animal):
+        return
+    Tombstone.objects.create(
+        kind='dailylog', farm_id=instance.farm_id, object_id=instance.pk, animal_id=instance.animal_id,
+        date=instance.date, sync_seq=SyncCounter.allocate(instance.farm_id),
+    )
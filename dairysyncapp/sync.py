@@ -0,0 +1,187 @@
+"""
+Delta sync for field devices that record daily logs offline.
+
+Every save of an Animal or DailyLog takes the next number from its farm's
+change sequence (``sync_seq``), and deletes leave a Tombstone numbered from
+the same sequence. Sync therefore works per farm, and accounts without one
+are refused. A device keeps the highest number it has seen and pulls
+with ``GET /api/sync/?since=<n>``: only rows changed or deleted after ``n``
+come back, in sequence order, a page at a time (``has_more`` /
+``next_since``), so a device that was offline for a week downloads a
+week of changes rather than the herd.
+
+Uploads are ``POST /api/sync/`` with ``{"strategy": ..., "logs": [...]}``,
+one object per log keyed on (animal_id, date). With ``report`` each log
+carries the ``base_seq`` it was edited from and is refused as a conflict
+if the server copy changed since; with ``last_writer_wins`` each log
+carries ``modified_at`` and the most recent edit wins. Conflicts come back
+with the server's row so the device can resolve them.
+"""
+import heapq
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .api import ANIMAL_FIELDS, LOG_FIELDS, ApiError, json_response, read_body, api_view
+from .imports import ImportResult, animal_ids_by_name, build_log, normalize_row, write_batch
+from .models import Animal, DailyLog, SyncCounter, Tombstone
+from .tenancy import NO_FARM, current_farm_id
+
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 5000
+SYNC_MAX_UPLOAD = 1000
+
+STRATEGIES = ['last_writer_wins', 'report']
+
+TOMBSTONE_FIELDS = ['kind', 'object_id', 'animal_id', 'date']
+
+
+def changes_since(since, limit=SYNC_PAGE_SIZE):
+    """
+    Return the first ``limit`` animals, logs and tombstones numbered after
+    ``since``, with the high-water mark to pull from next
+    """
+    sources = [
+        ('animals', Animal.objects.all(), ANIMAL_FIELDS),
+        ('logs', DailyLog.objects.all(), LOG_FIELDS),
+        ('deleted', Tombstone.objects.all(), TOMBSTONE_FIELDS),
+    ]
+    # each source is read in sequence order on its sync_seq index, so at most
+    # limit + 1 rows per table are needed to fill the merged page
+    streams = [
+        [
+            (row['sync_seq'], key, row)
+            for row in queryset.filter(sync_seq__gt=since)
+            .order_by('sync_seq')
+            .values(*fields, 'sync_seq')[:limit + 1]
+        ]
+        for key, queryset, fields in sources
+    ]
+    merged = list(heapq.merge(*streams, key=lambda item: item[0]))
+
+    changes = {key: [] for key, _, _ in sources}
+    for _, key, row in merged[:limit]:
+        changes[key].append(row)
+    page = merged[:limit]
+    changes['next_since'] = page[-1][0] if page else since
+    changes['has_more'] = len(merged) > limit
+    return changes
+
+
+def _server_row(log):
+    return {name: getattr(log, name) for name in LOG_FIELDS + ['sync_seq']}
+
+
+def _is_conflict(row, existing, strategy):
+    """Whether the server copy wins over an uploaded row, or raise ValueError"""
+    if strategy == 'report':
+        base_seq = row.get('base_seq')
+        if base_seq is None:
+            return True
+        try:
+            return existing.sync_seq > int(base_seq)
+        except (TypeError, ValueError):
+            raise ValueError('base_seq must be a whole number.')
+
+    modified_at = parse_datetime(str(row.get('modified_at') or ''))
+    if modified_at is None:
+        raise ValueError('modified_at must be an ISO 8601 timestamp.')
+    if timezone.is_naive(modified_at):
+        modified_at = timezone.make_aware(modified_at)
+    return existing.updated_at > modified_at
+
+
+def apply_uploads(rows, user=None, strategy='report'):
+    """
+    Write uploaded daily logs, each upserted on (animal_id, date), and
+    return the applied rows, the conflicts and the rejected rows, all
+    identified by their position in ``rows``
+    """
+    rows = [normalize_row(row) if isinstance(row, dict) else {} for row in rows]
+    names = animal_ids_by_name(rows)
+    result = ImportResult()
+    candidates = {}
+    for index, row in enumerate(rows):
+        try:
+            candidates[index] = build_log(row, names, user)
+        except ValidationError as exc:
+            for message in exc.messages:
+                result.add_error(index, message)
+
+    conflicts = []
+    with transaction.atomic():
+        # take the farm counter's write lock first so a concurrent upload
+        # cannot change a row between the conflict check and the write
+        SyncCounter.allocate(current_farm_id(), 0)
+        existing = {
+            (log.animal_id, log.date): log
+            for log in DailyLog.objects.filter(
+                animal_id__in={log.animal_id for log in candidates.values()},
+                date__in={log.date for log in candidates.values()},
+            )
+        }
+
+        accepted = {}
+        for index, log in candidates.items():
+            server = existing.get((log.animal_id, log.date))
+            try:
+                conflict = server is not None and _is_conflict(rows[index], server, strategy)
+            except ValueError as exc:
+                result.add_error(index, str(exc))
+                continue
+            if conflict:
+                conflicts.append({'index': index, 'server': _server_row(server)})
+            else:
+                accepted[index] = log
+        write_batch(accepted, result)
+
+    rejected = {index for index, _ in result.errors}
+    written = {
+        (log.animal_id, log.date): log
+        for log in DailyLog.objects.filter(
+            animal_id__in={log.animal_id for log in accepted.values()},
+            date__in={log.date for log in accepted.values()},
+        ).only('id', 'animal_id', 'date', 'sync_seq')
+    }
+    applied = [
+        {
+            'index': index,
+            'id': written[log.animal_id, log.date].id,
+            'animal_id': log.animal_id,
+            'date': log.date,
+            'sync_seq': written[log.animal_id, log.date].sync_seq,
+        }
+        for index, log in accepted.items()
+        if index not in rejected
+    ]
+    return {
+        'applied': applied,
+        'conflicts': conflicts,
+        'errors': [{'index': index, 'message': message} for index, message in result.errors],
+    }
+
+
+@api_view('GET', 'POST')
+def sync_view(request):
+    if current_farm_id() in (None, NO_FARM):
+        raise ApiError('Delta sync needs an account that belongs to a farm.', status=403)
+    if request.method == 'POST':
+        data = read_body(request)
+        strategy = data.get('strategy', 'report')
+        if strategy not in STRATEGIES:
+            raise ApiError(f"strategy must be one of: {', '.join(STRATEGIES)}")
+        logs = data.get('logs', [])
+        if not isinstance(logs, list):
+            raise ApiError('logs must be a list.')
+        if len(logs) > SYNC_MAX_UPLOAD:
+            raise ApiError(f'Upload at most {SYNC_MAX_UPLOAD} logs per request.', status=413)
+        return json_response(apply_uploads(logs, request.user, strategy))
+
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = int(request.GET.get('limit', SYNC_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('since and limit must be whole numbers.')
+    return json_response(changes_since(max(since, 0), max(1, min(limit, SYNC_MAX_PAGE_SIZE))))
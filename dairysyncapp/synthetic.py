@@ -0,0 +1,149 @@
+"""
+Synthetic herd data for benchmarks and local load testing.
+
+Milk yield follows Wood's lactation curve ``a * t^b * e^(-c*t)`` restarted
+at each calving, scaled by a seasonal factor, with random sickness episodes
+that depress yield and raise temperature. A fixed seed gives the same herd
+on every run.
+"""
+import math
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .caching import invalidate
+from .counters import reconcile
+from .models import Animal, DailyLog, Farm, Profile, SyncCounter
+from .rollups import rebuild_rollups
+
+GENERATE_BATCH_SIZE = 5000
+
+BREEDS = ['Friesian', 'Holstein', 'Jersey', 'Guernsey', 'Ayrshire']
+ACTIVITIES = ['grazing', 'grazing', 'grazing', 'resting', 'exercise']
+
+# share of the day's milk taken at each session
+SESSION_SPLIT = (0.40, 0.25, 0.35)
+
+
+def _quantize(value):
+    return Decimal(f'{max(value, 0):.3f}')
+
+
+def wood_yield(day_in_milk, a=18.0, b=0.2, c=0.004):
+    """Expected daily litres ``day_in_milk`` days after calving"""
+    t = max(day_in_milk, 1)
+    return a * t ** b * math.exp(-c * t)
+
+
+def _animal_logs(animal_id, farm_id, start, days, rng):
+    # cows calve roughly yearly and are dry for the last ~60 days
+    calving_offset = rng.randrange(0, 365)
+    capacity = rng.uniform(0.8, 1.2)
+    sick_until = -1
+    severity = 0.0
+
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        day_in_milk = (offset + calving_offset) % 365
+        dry = day_in_milk > 305
+
+        if offset > sick_until and rng.random() < 0.01:
+            sick_until = offset + rng.randint(3, 7)
+            severity = rng.uniform(0.2, 0.5)
+        sick = offset <= sick_until
+
+        season = 1 + 0.1 * math.sin(2 * math.pi * day.timetuple().tm_yday / 365)
+        milk = 0.0 if dry else wood_yield(day_in_milk) * capacity * season * rng.gauss(1, 0.05)
+        temperature = rng.gauss(38.6, 0.2)
+        if sick:
+            milk *= 1 - severity
+            temperature += severity * 4
+            health = 'critical' if severity > 0.4 else 'needs_attention'
+        else:
+            health = 'normal'
+
+        feed = rng.gauss(20 if not dry else 14, 1.5)
+        water = rng.gauss(80 if not dry else 50, 6)
+
+        yield DailyLog(
+            animal_id=animal_id,
+            farm_id=farm_id,
+            date=day,
+            morning_milk=_quantize(milk * SESSION_SPLIT[0]),
+            afternoon_milk=_quantize(milk * SESSION_SPLIT[1]),
+            evening_milk=_quantize(milk * SESSION_SPLIT[2]),
+            feed_amount=_quantize(feed),
+            water=_quantize(water),
+            temperature=_quantize(temperature),
+            health_observations=health,
+            activity='medical_treatment' if sick else rng.choice(ACTIVITIES),
+        )
+
+
+def _write_logs(batch):
+    with transaction.atomic():
+        SyncCounter.stamp(batch)
+        DailyLog.objects.bulk_create(batch)
+
+
+def generate_herd(farms=1, animals=50, days=365, seed=0, end=None, stdout=None):
+    """
+    Create ``farms`` farmer accounts and ``animals`` cows spread across
+    them, each with ``days`` consecutive daily logs ending at ``end``.
+
+    Returns the number of logs written.
+    """
+    rng = random.Random(seed)
+    end = end or date.today()
+    start = end - timedelta(days=days - 1)
+
+    with transaction.atomic():
+        farm_ids = []
+        for number in range(farms):
+            farm, _ = Farm.objects.get_or_create(name=f'Synthetic Farm {number}')
+            farm_ids.append(farm.id)
+            user, created = User.objects.get_or_create(
+                username=f'synthetic-farm-{number}',
+                defaults={'email': f'farm{number}@synthetic.invalid', 'first_name': f'Farm {number}'},
+            )
+            if created:
+                Profile.objects.create(
+                    user=user, phone='0700000000', farm_name=farm.name, farm=farm, role='farmer'
+                )
+
+        herd = [
+            Animal(
+                farm_id=farm_ids[number % farms],
+                name=f'F{number % farms}-Cow {number:05d}',
+                species='Cow',
+                breed=rng.choice(BREEDS),
+                gender='female',
+            )
+            for number in range(animals)
+        ]
+        SyncCounter.stamp(herd)
+        herd = Animal.objects.bulk_create(herd, batch_size=GENERATE_BATCH_SIZE)
+
+    written = 0
+    batch = []
+    for animal in herd:
+        for log in _animal_logs(animal.id, animal.farm_id, start, days, rng):
+            batch.append(log)
+            if len(batch) == GENERATE_BATCH_SIZE:
+                _write_logs(batch)
+                written += len(batch)
+                batch = []
+                if stdout:
+                    stdout.write(f'  {written} logs written')
+    if batch:
+        _write_logs(batch)
+        written += len(batch)
+
+    # bulk_create skips the signals that keep rollups, counters and view caches fresh
+    rebuild_rollups([animal.id for animal in herd])
+    reconcile()
+    invalidate('animal', 'dailylog')
+    return written
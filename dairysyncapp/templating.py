@@ -0,0 +1,29 @@
+"""
+Django template backend that reports render time to the perf middleware.
+"""
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from .perf import template_time
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        elapsed = template_time.get()
+        if elapsed is None:
+            return super().render(context, request)
+
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            template_time.set(elapsed + time.perf_counter() - start)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
@@ -0,0 +1,83 @@
+"""
+Farm (tenant) scoping.
+
+TenantMiddleware records the farm of the logged-in user's profile for the
+duration of each request, and FarmScopedManager, the default manager of
+Animal, DailyLog and the tables hanging off them, filters every queryset
+to that farm. Views therefore never see another farm's rows, and with the
+farm column leading their indexes a farm's page cost follows its own size.
+
+Scoping fails closed. Within a request, anonymous users and users without
+a farm get NO_FARM, for which every scoped queryset is empty; only staff
+without a farm of their own see every farm. Outside a request (management
+commands, the worker, the shell) no farm is set and querysets are not
+filtered; ``farm_scope()`` sets one explicitly.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.exceptions import PermissionDenied
+from django.db import models
+
+
+class _NoFarm:
+    def __repr__(self):
+        return 'NO_FARM'
+
+
+# the scope of a request by someone who belongs to no farm
+NO_FARM = _NoFarm()
+
+# a farm id, NO_FARM, None for no scoping, or a callable resolving to one of
+# them on first use
+_current_farm = ContextVar('current_farm', default=None)
+
+
+def current_farm_id():
+    farm = _current_farm.get()
+    if callable(farm):
+        farm = farm()
+        _current_farm.set(farm)
+    return farm
+
+
+def owning_farm_id():
+    """The farm new rows belong to, refusing users who belong to no farm"""
+    farm_id = current_farm_id()
+    if farm_id is NO_FARM:
+        raise PermissionDenied('You do not belong to a farm.')
+    return farm_id
+
+
+def activate(farm):
+    """Scope queries to ``farm`` (an id or a lazy callable) and return a reset token"""
+    return _current_farm.set(farm)
+
+
+def deactivate(token):
+    _current_farm.reset(token)
+
+
+@contextmanager
+def farm_scope(farm_id):
+    token = activate(farm_id)
+    try:
+        yield
+    finally:
+        deactivate(token)
+
+
+class FarmScopedManager(models.Manager):
+    """Default manager returning only the current farm's rows"""
+    # lookup from the model to its farm
+    farm_field = 'farm'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        farm_id = current_farm_id()
+        if farm_id is NO_FARM:
+            queryset = queryset.none()
+        elif farm_id is not None:
+            queryset = queryset.filter(**{self.farm_field: farm_id})
+        return queryset
+
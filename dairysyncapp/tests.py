@@ -1,3 +1,1405 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from importlib.util import find_spec
+from io import BytesIO, StringIO
+import math
+import os
+import tempfile
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Max, QuerySet, Sum
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import perf, views
+from .anomalies import detect_anomalies
+from .caching import VIEW_CACHE_ALIAS, get_cache, stats
+from .counters import herd_stats
+from .deletes import PRIVATE_APIS, can_raw_delete, delete_logs
+from .exports import iter_parquet
+from .filters import filter_logs
+from .imports import import_daily_logs
+from .jobs import HANDLERS, claim_job, enqueue, job_files_dir, requeue_stale
+from .lactation import fit_lactation_curves, stale_animal_ids
+from .middleware import PerformanceMiddleware
+from .management.commands.run_benchmarks import compare
+from .models import *
+from .partitions import _key_definition, yearly_partitions
+from .reports import feed_efficiency, window_filter
+from .sync import changes_since
+from .tenancy import farm_scope
+from .timeseries import choose_resolution
+from .views import ANIMALS_PER_PAGE
+
+# the views alias is shared with live web workers and run_worker, so tests
+# use a private in-memory one
+TEST_CACHES = {
+    **settings.CACHES,
+    VIEW_CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dairysync-tests'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DairySyncTestCase(TestCase):
+    """TestCase reading and writing a test-only view cache"""
+
+
+def make_log(animal, log_date, **fields):
+    values = {
+        'morning_milk': 5,
+        'afternoon_milk': 4,
+        'evening_milk': 3,
+        'feed_amount': 10,
+        'water': 40,
+        'health_observations': 'normal',
+        'activity': 'grazing',
+    }
+    values.update(fields)
+    return DailyLog.objects.create(animal=animal, date=log_date, **values)
+
+
+class ManageLogsTests(DairySyncTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer', 'farmer@example.com', 'Passw0rd!', is_staff=True)
+        self.client.force_login(self.user)
+        self.animal = Animal.objects.create(
+            name='Daisy', species='Cow', breed='Friesian', gender='female'
+        )
+        self.start = date(2025, 1, 1)
+        for offset in range(7):
+            make_log(self.animal, self.start + timedelta(days=offset))
+
+    def test_keyset_pages_cover_every_log_once(self):
+        seen = []
+        url = reverse('manage-logs') + '?page_size=3'
+        while url:
+            response = self.client.get(url)
+            seen.extend(log.date for log in response.context['logs'])
+            next_cursor = response.context['next_cursor']
+            url = reverse('manage-logs') + f'?page_size=3&cursor={next_cursor}' if next_cursor else None
+        expected = [self.start + timedelta(days=offset) for offset in reversed(range(7))]
+        self.assertEqual(seen, expected)
+
+    def test_sort_by_milk_pages_highest_first(self):
+        for offset, log in enumerate(DailyLog.objects.order_by('date')):
+            log.evening_milk = offset
+            log.save()
+        seen = []
+        url = reverse('manage-logs') + '?sort=milk&page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen.extend(log.total_milk for log in response.context['logs'])
+            next_cursor = response.context['next_cursor']
+            url = reverse('manage-logs') + f'?sort=milk&page_size=2&cursor={next_cursor}' if next_cursor else None
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(len(seen), 7)
+
+    def test_total_milk_is_queryable(self):
+        self.assertEqual(DailyLog.objects.filter(total_milk=12).count(), 7)
+        self.assertEqual(DailyLog.objects.aggregate(total=Sum('total_milk'))['total'], 84)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('manage-logs'), {'cursor': '!!bad!!'})
+        self.assertEqual(response.context['logs'][0].date, self.start + timedelta(days=6))
+
+    def test_stream_mode_renders_all_rows(self):
+        response = self.client.get(reverse('manage-logs'), {'stream': '1'})
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.count('name="log_ids"'), 7)
+        self.assertIn('</html>', body)
+
+
+class BulkDeleteLogsTests(DairySyncTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer', 'farmer@example.com', 'Passw0rd!', is_staff=True)
+        self.client.force_login(self.user)
+        self.daisy = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        self.bella = Animal.objects.create(name='Bella', species='Cow', breed='Jersey', gender='female')
+        self.start = date(2025, 1, 1)
+        for offset in range(10):
+            make_log(self.daisy, self.start + timedelta(days=offset))
+            make_log(self.bella, self.start + timedelta(days=offset))
+        self.url = reverse('bulk-delete-logs')
+
+    def test_selected_logs_summary_and_bookkeeping(self):
+        logs = list(DailyLog.objects.filter(animal=self.daisy, date__lte=self.start + timedelta(days=2)))
+        response = self.client.post(self.url, {'log_ids': [log.id for log in logs]}, follow=True)
+        self.assertContains(
+            response, 'Successfully deleted 3 log(s) for animal Daisy from 2025-01-01 to 2025-01-03.'
+        )
+        self.assertEqual(DailyLog.objects.count(), 17)
+        self.assertEqual(
+            set(Tombstone.objects.values_list('object_id', flat=True)), {log.id for log in logs}
+        )
+        self.assertFalse(AnimalProductionRollup.objects.filter(
+            animal=self.daisy, period='day', period_start=self.start
+        ).exists())
+        self.assertEqual(
+            AnimalProductionRollup.objects.get(animal=self.daisy, period='month', period_start=self.start).log_count,
+            7,
+        )
+
+    def test_delete_all_matching_filter(self):
+        data = {'delete_all_matching': '1', 'date_from': '2025-01-05', 'redirect_to': reverse('manage-logs')}
+        response = self.client.post(self.url, data, follow=True)
+        self.assertContains(response, 'Successfully deleted 12 log(s) for 2 animals from 2025-01-05 to 2025-01-10.')
+        self.assertEqual(DailyLog.objects.count(), 8)
+        self.assertEqual(Tombstone.objects.count(), 12)
+
+    def test_delete_logs_in_batches_without_per_row_signals(self):
+        self.assertTrue(can_raw_delete())
+        with CaptureQueriesContext(connection) as queries:
+            deleted = delete_logs(DailyLog.objects.filter(date__gte='2025-01-05'), batch_size=4)
+        self.assertEqual(deleted, 12)
+        self.assertEqual(DailyLog.objects.count(), 8)
+        log_deletes = [query for query in queries if query['sql'].startswith('DELETE FROM "dairysyncapp_dailylog"')]
+        self.assertEqual(len(log_deletes), 3)
+
+    def test_batch_query_count_does_not_grow_with_its_size(self):
+        def queries_to_delete(animal, days):
+            with CaptureQueriesContext(connection) as queries:
+                delete_logs(DailyLog.objects.filter(
+                    animal=animal, date__in=[self.start + timedelta(days=day) for day in days]
+                ))
+            return len(queries)
+
+        # both empty only their day rollups, one bucket against four
+        self.assertEqual(queries_to_delete(self.daisy, [9]), queries_to_delete(self.bella, [5, 6, 7, 8]))
+        self.assertEqual(AnimalProductionRollup.objects.filter(period='day').count(), 15)
+
+    def test_private_delete_apis_still_exist(self):
+        # a Django upgrade that drops these silently turns off the batched delete
+        for owner, name in PRIVATE_APIS:
+            self.assertTrue(callable(getattr(owner, name, None)), f'{owner.__name__}.{name} is gone')
+
+    def test_delete_logs_falls_back_without_private_apis(self):
+        # Django's own deletes need _raw_delete, so stand in a method that is missing
+        with mock.patch('dairysyncapp.deletes.PRIVATE_APIS', PRIVATE_APIS + [(QuerySet, '_removed_api')]):
+            self.assertFalse(can_raw_delete())
+            deleted = delete_logs(DailyLog.objects.filter(date__gte='2025-01-05'), batch_size=4)
+        self.assertEqual(deleted, 12)
+        self.assertEqual(Tombstone.objects.count(), 12)
+
+    def test_malformed_filters_show_an_error(self):
+        data = {'delete_all_matching': '1', 'animal_filter': 'abc'}
+        response = self.client.post(self.url, data, follow=True)
+        self.assertContains(response, 'Error deleting logs')
+        self.assertEqual(DailyLog.objects.count(), 20)
+
+    def test_delete_all_matching_requires_a_filter(self):
+        response = self.client.post(self.url, {'delete_all_matching': '1'}, follow=True)
+        self.assertContains(response, 'Apply at least one filter')
+        self.assertEqual(DailyLog.objects.count(), 20)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class DailyLogIndexTests(DairySyncTestCase):
+    def setUp(self):
+        farm = Farm.objects.create(name='Green Acres')
+        self.user = User.objects.create_user('vet', 'vet@example.com', 'Passw0rd!')
+        Profile.objects.create(user=self.user, phone='0700000000', farm_name=farm.name, farm=farm, role='vet')
+        self.client.force_login(self.user)
+        animal = Animal.objects.create(farm=farm, name='Daisy', species='Cow', breed='Friesian', gender='female')
+        make_log(animal, date.today(), health_observations='critical')
+
+    def assertNoDailyLogScan(self, url, params=None):
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(url, params or {})
+        explained = 0
+        for query in captured.captured_queries:
+            if 'dairysyncapp_dailylog' not in query['sql']:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plan = [row[-1] for row in cursor.fetchall()]
+            explained += 1
+            for step in plan:
+                if step.startswith('SCAN dairysyncapp_dailylog'):
+                    self.assertIn('INDEX', step, f"full scan in {query['sql']}")
+        self.assertTrue(explained, f'no DailyLog queries issued by {url}')
+
+    def test_vet_dashboard_uses_indexes(self):
+        self.assertNoDailyLogScan(reverse('vet-dashboard'))
+
+    def test_manage_logs_filters_use_indexes(self):
+        url = reverse('manage-logs')
+        self.assertNoDailyLogScan(url)
+        self.assertNoDailyLogScan(url, {'date_from': '2025-01-01', 'date_to': '2025-12-31'})
+        self.assertNoDailyLogScan(url, {'health': 'critical'})
+        self.assertNoDailyLogScan(url, {'animal': '1'})
+        self.assertNoDailyLogScan(url, {'sort': 'milk'})
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite profile')
+class SQLiteProductionProfileTests(DairySyncTestCase):
+    def test_new_connections_apply_pragmas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = {
+                **connection.settings_dict,
+                **settings.DAIRYSYNC_SQLITE_PRODUCTION,
+                'NAME': os.path.join(directory, 'profile.sqlite3'),
+            }
+            wrapper = connections['default'].__class__(settings_dict, alias='profile-test')
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(cursor.fetchone()[0], settings.DAIRYSYNC_SQLITE_PRAGMAS['busy_timeout'])
+                    cursor.execute('PRAGMA synchronous')
+                    self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+                self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+            finally:
+                wrapper.close()
+
+
+class DailyLogPartitionTests(DairySyncTestCase):
+    def test_yearly_partition_bounds(self):
+        self.assertEqual(yearly_partitions(2024, 2025), [
+            ('dairysyncapp_dailylog_y2024', date(2024, 1, 1), date(2025, 1, 1)),
+            ('dairysyncapp_dailylog_y2025', date(2025, 1, 1), date(2026, 1, 1)),
+        ])
+
+    def test_keys_gain_and_lose_the_partition_column(self):
+        self.assertEqual(_key_definition('p', 'PRIMARY KEY (id)', True), 'PRIMARY KEY (id, "date")')
+        self.assertEqual(_key_definition('p', 'PRIMARY KEY (id, "date")', False), 'PRIMARY KEY (id)')
+        self.assertEqual(_key_definition('u', 'UNIQUE (animal_id, date)', True), 'UNIQUE (animal_id, date)')
+        self.assertEqual(_key_definition('u', 'UNIQUE (animal_id, date)', False), 'UNIQUE (animal_id, date)')
+
+    @skipUnless(connection.vendor == 'postgresql', 'partitioning is PostgreSQL only')
+    def test_manage_logs_date_filter_prunes_partitions(self):
+        animal = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        make_log(animal, date(2025, 3, 1))
+        logs, _ = filter_logs({'date_from': '2025-01-01', 'date_to': '2025-12-31'})
+        plan = logs.explain()
+        self.assertIn('dairysyncapp_dailylog_y2025', plan)
+        self.assertNotIn('dairysyncapp_dailylog_default', plan)
+
+
+class VetDashboardTests(DairySyncTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('vet', 'vet@example.com', 'Passw0rd!', is_staff=True)
+        Profile.objects.create(user=self.user, phone='0700000000', farm_name='Green Acres', role='vet')
+        self.client.force_login(self.user)
+        self.today = date.today()
+
+    def add_sick_animals(self, count):
+        for number in range(count):
+            animal = Animal.objects.create(
+                name=f'Cow {number}', species='Cow', breed='Friesian', gender='female'
+            )
+            make_log(animal, self.today - timedelta(days=3), health_observations='needs_attention')
+            make_log(animal, self.today - timedelta(days=1), health_observations='critical')
+            make_log(animal, self.today)
+
+    def test_latest_problem_log_per_animal(self):
+        self.add_sick_animals(2)
+        response = self.client.get(reverse('vet-dashboard'))
+        attention = response.context['animals_needing_attention']
+        self.assertEqual(len(attention), 2)
+        for entry in attention:
+            self.assertEqual(entry['health_status'], 'critical')
+            self.assertEqual(entry['date'], self.today - timedelta(days=1))
+
+    def test_query_count_is_constant_in_herd_size(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_sick_animals(1)
+        with self.assertNumQueries(9):
+            self.client.get(reverse('vet-dashboard'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_sick_animals(20)
+        with self.assertNumQueries(9):
+            self.client.get(reverse('vet-dashboard'))
+
+
+class LactationCurveTests(DairySyncTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('vet', 'vet@example.com', 'Passw0rd!', is_staff=True)
+        self.client.force_login(self.user)
+        Profile.objects.create(user=self.user, phone='0700000000', farm_name='Green Acres', role='vet')
+        self.today = timezone.now().date()
+        self.start = self.today - timedelta(days=59)
+        self.daisy = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        self.bella = Animal.objects.create(name='Bella', species='Cow', breed='Jersey', gender='female')
+        # an earlier lactation, separated by a dry period, must not be fitted
+        make_log(self.daisy, self.start - timedelta(days=100), morning_milk=2, afternoon_milk=0, evening_milk=0)
+        for offset in range(60):
+            t = offset + 1
+            litres = self.wood(t)
+            make_log(self.daisy, self.start + timedelta(days=offset), morning_milk=round(litres, 3),
+                     afternoon_milk=0, evening_milk=0)
+            # Bella drops to half her curve in the last week
+            make_log(self.bella, self.start + timedelta(days=offset),
+                     morning_milk=round(litres * (0.5 if offset >= 53 else 1), 3), afternoon_milk=0, evening_milk=0)
+
+    @staticmethod
+    def wood(t, a=15.0, b=0.25, c=0.004):
+        return a * t ** b * math.exp(-c * t)
+
+    def test_herd_fit_recovers_parameters(self):
+        self.assertEqual(fit_lactation_curves(), 2)
+        curve = LactationCurve.objects.get(animal=self.daisy)
+        self.assertEqual(curve.lactation_start, self.start)
+        self.assertAlmostEqual(curve.a, 15.0, delta=0.1)
+        self.assertAlmostEqual(curve.b, 0.25, delta=0.01)
+        self.assertAlmostEqual(curve.c, 0.004, delta=0.0005)
+        self.assertAlmostEqual(curve.expected_on(self.today + timedelta(days=10)), self.wood(70), delta=0.2)
+        self.assertAlmostEqual(curve.performance, 1.0, delta=0.02)
+        self.assertLess(LactationCurve.objects.get(animal=self.bella).performance, 0.85)
+
+    def test_only_changed_animals_are_refitted(self):
+        fit_lactation_curves()
+        self.assertEqual(fit_lactation_curves(), 0)
+        # the counters and the last scan; no farm's logs moved, so none are read
+        with self.assertNumQueries(2):
+            self.assertEqual(stale_animal_ids(), set())
+        make_log(self.daisy, self.today + timedelta(days=1))
+        self.assertEqual(stale_animal_ids(), {self.daisy.id})
+        DailyLog.objects.filter(animal=self.bella, date=self.today).delete()
+        self.assertEqual(fit_lactation_curves(), 2)
+
+    def test_pages_show_stored_curve_without_fitting(self):
+        call_command('fit_lactation_curves', stdout=StringIO())
+        with mock.patch('dairysyncapp.lactation.fit_wood_curves') as fit:
+            detail = self.client.get(reverse('animal-detail', args=[self.daisy.id]))
+            dashboard = self.client.get(reverse('vet-dashboard'))
+        fit.assert_not_called()
+        self.assertEqual(len(detail.context['lactation']['forecast']), 30)
+        self.assertEqual(len(detail.context['lactation']['comparison']), 30)
+        self.assertEqual([curve.animal for curve in dashboard.context['underperformers']], [self.bella])
+
+
+class AnomalyDetectionTests(DairySyncTestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.start = self.today - timedelta(days=29)
+        self.daisy = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        self.bella = Animal.objects.create(name='Bella', species='Cow', breed='Jersey', gender='female')
+        for offset in range(30):
+            wobble = (offset % 3) * 0.2
+            for animal in (self.daisy, self.bella):
+                make_log(animal, self.start + timedelta(days=offset), morning_milk=10 + wobble,
+                         temperature=38.5 + wobble / 4, water=40 + wobble)
+
+    def test_flags_sudden_drop_and_fever(self):
+        day = self.start + timedelta(days=20)
+        DailyLog.objects.filter(animal=self.daisy, date=day).update(morning_milk=4, temperature=40.5)
+        detect_anomalies()
+        self.assertEqual(
+            set(AnomalyFlag.objects.values_list('animal__name', 'date', 'metric')),
+            {('Daisy', day, 'milk'), ('Daisy', day, 'temperature')},
+        )
+        flag = AnomalyFlag.objects.get(metric='milk')
+        self.assertAlmostEqual(flag.expected, 17.2, delta=0.2)
+        self.assertLess(flag.zscore, -3)
+
+    def test_incremental_scan_only_reads_changed_animals(self):
+        first = detect_anomalies()
+        self.assertEqual(first.rows_scored, 60)
+        self.assertEqual(AnomalyFlag.objects.count(), 0)
+
+        log = DailyLog.objects.get(animal=self.bella, date=self.today)
+        log.water = 10
+        log.save()
+        scan = detect_anomalies()
+        # Bella's logs only, all within the warm-up window
+        self.assertEqual(scan.rows_scored, 30)
+        self.assertEqual(list(AnomalyFlag.objects.values_list('animal', 'metric')), [(self.bella.id, 'water')])
+
+        log.delete()
+        self.assertEqual(detect_anomalies().flags, 0)
+        self.assertFalse(AnomalyFlag.objects.exists())
+        self.assertEqual(detect_anomalies().rows_scored, 0)
+
+    def test_dashboard_lists_recent_flags(self):
+        DailyLog.objects.filter(animal=self.bella, date=self.today).update(water=5)
+        call_command('detect_anomalies', '--full', stdout=StringIO())
+        vet = User.objects.create_user('vet', 'vet@example.com', 'Passw0rd!', is_staff=True)
+        Profile.objects.create(user=vet, phone='0700000000', farm_name='Green Acres', role='vet')
+        self.client.force_login(vet)
+        response = self.client.get(reverse('vet-dashboard'))
+        self.assertEqual([flag.animal for flag in response.context['anomalies']], [self.bella])
+        self.assertContains(response, 'Water Intake drop')
+
+
+class ProductionRollupTests(DairySyncTestCase):
+    def setUp(self):
+        self.animal = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+
+    def rollup(self, period, period_start):
+        return AnimalProductionRollup.objects.get(
+            animal=self.animal, period=period, period_start=period_start
+        )
+
+    def test_rollups_follow_saves_and_deletes(self):
+        # 2025-03-03 is a Monday
+        monday = make_log(self.animal, date(2025, 3, 3), temperature=38)
+        make_log(self.animal, date(2025, 3, 4), temperature=40, health_observations='critical')
+
+        week = self.rollup('week', date(2025, 3, 3))
+        self.assertEqual(week.log_count, 2)
+        self.assertEqual(week.total_milk, 24)
+        self.assertEqual(week.avg_temperature, 39)
+        self.assertEqual(week.problem_count, 1)
+        self.assertEqual(self.rollup('month', date(2025, 3, 1)).total_feed, 20)
+
+        monday.morning_milk = 10
+        monday.save()
+        self.assertEqual(self.rollup('day', date(2025, 3, 3)).total_milk, 17)
+
+        monday.delete()
+        self.assertFalse(
+            AnimalProductionRollup.objects.filter(period='day', period_start=date(2025, 3, 3)).exists()
+        )
+        self.assertEqual(self.rollup('week', date(2025, 3, 3)).log_count, 1)
+
+    def test_rebuild_matches_incremental(self):
+        for offset in range(40):
+            make_log(self.animal, date(2025, 1, 1) + timedelta(days=offset))
+        incremental = set(AnimalProductionRollup.objects.values_list(
+            'period', 'period_start', 'log_count', 'total_milk', 'total_water'
+        ))
+        AnimalProductionRollup.objects.all().delete()
+        call_command('rebuild_rollups', stdout=StringIO())
+        rebuilt = set(AnimalProductionRollup.objects.values_list(
+            'period', 'period_start', 'log_count', 'total_milk', 'total_water'
+        ))
+        self.assertEqual(incremental, rebuilt)
+
+    def test_deleting_animal_removes_rollups(self):
+        make_log(self.animal, date(2025, 3, 3))
+        self.animal.delete()
+        self.assertFalse(AnimalProductionRollup.objects.exists())
+
+
+class HerdLogEntryTests(DairySyncTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('milker', 'milker@example.com', 'Passw0rd!', is_staff=True)
+        self.client.force_login(self.user)
+        self.herd = [
+            Animal.objects.create(name=f'Cow {number:02d}', species='Cow', breed='Friesian', gender='female')
+            for number in range(30)
+        ]
+        self.day = date(2025, 3, 3)
+        self.existing = make_log(self.herd[0], self.day, notes='Kept')
+        self.url = reverse('herd-log-entry')
+
+    def grid(self, animals, **cells):
+        data = {'date': self.day.isoformat()}
+        for animal in animals:
+            data.update({f'{field}_{animal.id}': value for field, value in cells.items()})
+        return data
+
+    def test_whole_herd_in_one_submit(self):
+        data = self.grid(self.herd[:25], morning_milk='8', evening_milk='6', feed_amount='11', water='45')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data)
+        self.assertRedirects(response, f'{self.url}?date={self.day.isoformat()}')
+        self.assertLess(len(queries), 30)
+
+        self.assertEqual(DailyLog.objects.filter(date=self.day).count(), 25)
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.morning_milk, self.existing.afternoon_milk), (8, 0))
+        self.assertEqual(self.existing.notes, 'Kept')
+        self.assertEqual(
+            AnimalProductionRollup.objects.get(animal=self.herd[1], period='day', period_start=self.day).total_milk,
+            14,
+        )
+
+        page = self.client.get(response.url)
+        self.assertContains(page, f'name="morning_milk_{self.herd[24].id}" value="8.000"')
+
+    def test_errors_are_reported_per_animal_and_nothing_is_saved(self):
+        data = self.grid(self.herd[:5], morning_milk='7')
+        data[f'water_{self.herd[3].id}'] = 'lots'
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 200)
+        errors = {row['animal'].id: row['errors'] for row in response.context['rows'] if row['errors']}
+        self.assertEqual(list(errors), [self.herd[3].id])
+        self.assertContains(response, 'value="lots"')
+        self.assertEqual(DailyLog.objects.filter(date=self.day).count(), 1)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.morning_milk, 5)
+
+
+class DailyLogImportTests(DairySyncTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer', 'farmer@example.com', 'Passw0rd!', is_staff=True)
+        self.client.force_login(self.user)
+        self.daisy = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        self.bella = Animal.objects.create(name='Bella', species='Cow', breed='Jersey', gender='female')
+        make_log(self.daisy, date(2025, 3, 3))
+
+    def upload(self, content):
+        upload = SimpleUploadedFile('session.csv', content.encode(), content_type='text/csv')
+        return self.client.post(reverse('import-daily-logs'), {'file': upload})
+
+    def test_upserts_rows_and_reports_errors(self):
+        response = self.upload(
+            'animal,date,morning_milk,afternoon_milk,evening_milk,health_observations\n'
+            'Daisy,2025-03-03,10,10,10,normal\n'
+            'Bella,2025-03-03,1,2,3,\n'
+            'Bella,2025-03-04,1,2,3,sick\n'
+            'Nobody,2025-03-04,1,2,3,normal\n'
+            f'{self.bella.id},not-a-date,1,2,3,normal\n'
+        )
+        result = response.context['result']
+        self.assertEqual(result.imported, 2)
+        self.assertEqual(sorted({line for line, _ in result.errors}), [4, 5, 6])
+
+        self.assertEqual(DailyLog.objects.get(animal=self.daisy, date=date(2025, 3, 3)).total_milk, 30)
+        bella_log = DailyLog.objects.get(animal=self.bella)
+        self.assertEqual(bella_log.health_observations, 'normal')
+        self.assertEqual(bella_log.created_by, self.user)
+
+        week = AnimalProductionRollup.objects.get(animal=self.daisy, period='week')
+        self.assertEqual(week.total_milk, 30)
+
+    def test_command_imports_in_batches(self):
+        rows = ['animal_id,date,morning_milk']
+        rows += [f'{self.bella.id},{date(2025, 1, 1) + timedelta(days=day)},5' for day in range(25)]
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write('\n'.join(rows))
+        self.addCleanup(os.remove, file.name)
+        call_command('import_daily_logs', file.name, batch_size=10, stdout=StringIO())
+        self.assertEqual(self.bella.daily_logs.count(), 25)
+        self.assertEqual(
+            AnimalProductionRollup.objects.get(animal=self.bella, period='month').total_milk, 125
+        )
+
+
+class ExportLogsTests(DairySyncTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer', 'farmer@example.com', 'Passw0rd!', is_staff=True)
+        self.client.force_login(self.user)
+        self.animal = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        for offset in range(5):
+            make_log(self.animal, date(2025, 1, 1) + timedelta(days=offset))
+        make_log(self.animal, date(2025, 1, 6), health_observations='critical')
+
+    def test_csv_export_applies_filters(self):
+        response = self.client.get(reverse('export-logs'), {'date_from': '2025-01-03', 'health': 'normal'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['date', 'animal_id', 'animal'])
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ['2025-01-05', '2025-01-04', '2025-01-03'])
+
+    @skipUnless(find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_parquet_export_round_trips(self):
+        import pyarrow.parquet as pq
+
+        response = self.client.get(reverse('export-logs'), {'format': 'parquet'})
+        self.assertIn('.parquet', response['Content-Disposition'])
+        table = pq.read_table(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 6)
+        self.assertEqual(str(table.column('total_milk')[0]), '12.000')
+
+        chunked = pq.ParquetFile(BytesIO(b''.join(iter_parquet(DailyLog.objects.all(), chunk_size=4))))
+        self.assertEqual(chunked.num_row_groups, 2)
+
+
+class BackgroundJobTests(DairySyncTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(DAIRYSYNC_JOB_FILES_DIR=directory.name))
+        self.user = User.objects.create_user('farmer', 'farmer@example.com', 'Passw0rd!', is_staff=True)
+        self.client.force_login(self.user)
+        self.daisy = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        for offset in range(5):
+            make_log(self.daisy, date(2025, 1, 1) + timedelta(days=offset))
+
+    def run_worker(self):
+        call_command('run_worker', '--once', '--processes', '0', stdout=StringIO())
+
+    def test_background_import_runs_in_the_worker(self):
+        upload = SimpleUploadedFile('session.csv', b'animal,date,morning_milk\nDaisy,2025-03-03,7\nNobody,2025-03-04,1\n')
+        response = self.client.post(reverse('import-daily-logs'), {'file': upload, 'background': '1'})
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('job-detail', args=[job.id]))
+        self.assertEqual(job.status, 'queued')
+        self.assertFalse(DailyLog.objects.filter(date=date(2025, 3, 3)).exists())
+
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual((job.result['imported'], job.result['failed'], job.progress), (1, 1, 2))
+        self.assertTrue(DailyLog.objects.filter(animal=self.daisy, date=date(2025, 3, 3)).exists())
+        self.assertFalse(list((job_files_dir() / 'imports').iterdir()))
+
+        status = self.client.get(reverse('api-job', args=[job.id])).json()
+        self.assertEqual((status['status'], status['percent'], status['finished']), ('succeeded', 100, True))
+
+    def test_background_export_can_be_downloaded(self):
+        response = self.client.get(reverse('export-logs'), {'background': '1', 'date_from': '2025-01-03'})
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('job-detail', args=[job.id]))
+        self.assertEqual(self.client.get(reverse('job-download', args=[job.id])).status_code, 404)
+
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.total), ('succeeded', 3, 3))
+        response = self.client.get(reverse('job-download', args=[job.id]))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+
+        # a result naming a file outside the job files directory is not served
+        job.result['file'] = '../' * 8 + 'etc/passwd'
+        job.save()
+        self.assertEqual(self.client.get(reverse('job-download', args=[job.id])).status_code, 404)
+
+    def test_failures_are_retried_with_backoff_then_fail(self):
+        failing = mock.Mock(side_effect=RuntimeError('disk full'))
+        job = enqueue('rebuild_rollups', max_attempts=2)
+        with mock.patch.dict(HANDLERS, {'rebuild_rollups': failing}):
+            self.run_worker()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('queued', 1))
+            self.assertIn('disk full', job.error)
+            self.assertGreater(job.run_after, timezone.now())
+
+            # not due yet
+            self.run_worker()
+            self.assertEqual(failing.call_count, 1)
+
+            Job.objects.update(run_after=timezone.now())
+            self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_jobs_of_a_dead_worker_are_queued_again(self):
+        job = enqueue('detect_anomalies')
+        self.assertEqual(claim_job('gone'), job.id)
+        self.assertIsNone(claim_job('other'))
+        Job.objects.update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(claim_job('other'), job.id)
+
+    def test_large_delete_all_matching_is_queued(self):
+        with mock.patch.object(views, 'DELETE_INLINE_MAX_LOGS', 3):
+            response = self.client.post(reverse('bulk-delete-logs'), {'delete_all_matching': '1', 'date_from': '2025-01-01'})
+        job = Job.objects.get(kind='delete_logs')
+        self.assertRedirects(response, reverse('job-detail', args=[job.id]))
+        self.assertEqual(DailyLog.objects.count(), 5)
+        self.run_worker()
+        self.assertEqual(Job.objects.get().result, {'deleted': 5})
+        self.assertFalse(DailyLog.objects.exists())
+
+
+class AnimalListingTests(DairySyncTestCase):
+    def setUp(self):
+        for number in range(30):
+            Animal.objects.create(
+                name=f'Cow {number:02d}', species='Cow', breed='Friesian', gender='female',
+                health_status='sick' if number % 10 == 0 else 'healthy',
+            )
+        Animal.objects.create(name='Billy', species='Goat', breed='Saanen', gender='male')
+        self.client.force_login(User.objects.create_user('farmer', 'farmer@example.com', 'Passw0rd!', is_staff=True))
+
+    def test_filters_run_on_the_server(self):
+        response = self.client.get(reverse('animal-listing'), {'species': 'Cow', 'status': 'sick'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 3)
+
+        response = self.client.get(reverse('animal-listing'), {'search': 'bil'})
+        self.assertEqual([animal.name for animal in response.context['animals']], ['Billy'])
+
+    def test_sorts_and_paginates(self):
+        response = self.client.get(reverse('animal-listing'), {'sort': 'name', 'page': 2})
+        names = [animal.name for animal in response.context['animals']]
+        self.assertEqual(len(names), 31 - ANIMALS_PER_PAGE)
+        self.assertEqual(names, sorted(names))
+
+    def test_renders_only_the_active_view(self):
+        grid = self.client.get(reverse('animal-listing')).content.decode()
+        self.assertIn('id="gridView"', grid)
+        self.assertNotIn('id="tableView"', grid)
+
+        table = self.client.get(reverse('animal-listing'), {'view': 'table'}).content.decode()
+        self.assertIn('id="tableView"', table)
+        self.assertNotIn('id="gridView"', table)
+
+
+class FarmScopingTests(DairySyncTestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.green = Farm.objects.create(name='Green Acres')
+        self.hill = Farm.objects.create(name='Hill Farm')
+        self.user = User.objects.create_user('vet', 'vet@example.com', 'Passw0rd!')
+        Profile.objects.create(user=self.user, phone='0700000000', farm_name='Green Acres', farm=self.green, role='vet')
+        self.client.force_login(self.user)
+        self.daisy = Animal.objects.create(farm=self.green, name='Daisy', species='Cow', breed='Friesian', gender='female')
+        self.bella = Animal.objects.create(farm=self.hill, name='Bella', species='Cow', breed='Jersey', gender='female')
+        make_log(self.daisy, date.today(), health_observations='critical')
+        make_log(self.bella, date.today(), health_observations='critical')
+
+    def test_logs_take_their_animals_farm(self):
+        self.assertEqual(set(DailyLog.objects.values_list('animal__farm', 'farm')), {
+            (self.green.id, self.green.id), (self.hill.id, self.hill.id),
+        })
+
+    def test_pages_show_only_the_users_farm(self):
+        response = self.client.get(reverse('animal-listing'))
+        self.assertEqual([animal.name for animal in response.context['animals']], ['Daisy'])
+        response = self.client.get(reverse('manage-logs'))
+        self.assertEqual([log.animal_id for log in response.context['logs']], [self.daisy.id])
+        response = self.client.get(reverse('vet-dashboard'))
+        self.assertEqual(response.context['total_logs_today'], 1)
+        self.assertEqual([entry['animal'].name for entry in response.context['animals_needing_attention']], ['Daisy'])
+
+        response = self.client.get(reverse('animal-detail', args=[self.bella.id]))
+        self.assertRedirects(response, reverse('animal-listing'))
+
+    def test_cached_pages_are_not_shared_between_farms(self):
+        self.client.get(reverse('animal-listing'))
+        other = User.objects.create_user('hill', 'hill@example.com', 'Passw0rd!')
+        Profile.objects.create(user=other, phone='0700000001', farm_name='Hill Farm', farm=self.hill, role='farmer')
+        self.client.force_login(other)
+        response = self.client.get(reverse('animal-listing'))
+        self.assertEqual(response['X-View-Cache'], 'miss')
+        self.assertEqual([animal.name for animal in response.context['animals']], ['Bella'])
+
+    def test_writes_only_invalidate_their_own_farms_pages(self):
+        url = reverse('vet-dashboard')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_log(self.bella, date.today() - timedelta(days=1))
+            Animal.objects.create(farm=self.hill, name='Rosie', species='Cow', breed='Jersey', gender='female')
+        self.assertEqual(self.client.get(url)['X-View-Cache'], 'hit')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_log(self.daisy, date.today() - timedelta(days=1))
+        self.assertEqual(self.client.get(url)['X-View-Cache'], 'miss')
+
+    def test_writes_stay_within_the_farm(self):
+        response = self.client.post(
+            reverse('api-animals'),
+            {'name': 'Clover', 'species': 'Cow', 'breed': 'Jersey', 'gender': 'female'},
+            content_type='application/json',
+        )
+        self.assertEqual(Animal.objects.get(id=response.json()['id']).farm, self.green)
+
+        response = self.client.post(reverse('api-logs'), {
+            'animal_id': self.bella.id, 'date': '2025-02-01', 'morning_milk': '6', 'afternoon_milk': '4',
+            'evening_milk': '5', 'feed_amount': '12', 'water': '50',
+            'health_observations': 'normal', 'activity': 'grazing',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('animal', response.json()['details'])
+
+    def test_logs_cannot_be_moved_or_synced_to_another_farms_animal(self):
+        log = DailyLog.objects.get(animal=self.daisy)
+        response = self.client.patch(
+            reverse('api-log', args=[log.id]), {'animal_id': self.bella.id}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('api-sync'), {'strategy': 'last_writer_wins', 'logs': [
+            {'animal_id': self.bella.id, 'date': '2025-02-01', 'morning_milk': '9'},
+        ]}, content_type='application/json')
+        self.assertEqual(response.json()['applied'], [])
+        self.assertEqual(DailyLog._base_manager.filter(animal=self.bella).count(), 1)
+        self.assertEqual(DailyLog._base_manager.get(pk=log.pk).farm, self.green)
+
+    def test_assigning_an_animal_to_a_farm_moves_its_logs(self):
+        stray = Animal.objects.create(name='Stray', species='Cow', breed='Jersey', gender='female')
+        make_log(stray, date.today())
+        make_log(stray, date.today() - timedelta(days=1))
+        AnomalyFlag.objects.create(animal=stray, date=date.today(), metric='milk', value=1, expected=5, zscore=-4)
+        stray.farm = self.green
+        stray.save()
+
+        with farm_scope(self.green.id):
+            self.assertEqual(DailyLog.objects.filter(animal=stray).count(), 2)
+            self.assertEqual(AnomalyFlag.objects.filter(animal=stray).count(), 1)
+            self.assertEqual(AnimalProductionRollup.objects.filter(animal=stray, period='day').count(), 2)
+            self.assertEqual(herd_stats(date.today())['total_logs_today'], 2)
+            self.assertEqual(len(changes_since(0)['logs']), 3)
+        with farm_scope(None):
+            self.assertEqual(HerdDayStats.objects.get(farm_key=0, date=date.today()).log_count, 0)
+
+    def test_users_without_a_farm_see_nothing(self):
+        self.client.logout()
+        self.assertRedirects(
+            self.client.get(reverse('animal-listing')), f"{reverse('login')}?next={reverse('animal-listing')}",
+            fetch_redirect_response=False,
+        )
+        user = User.objects.create_user('drifter', 'drifter@example.com', 'Passw0rd!')
+        Profile.objects.create(user=user, phone='0700000002', farm_name='Gone', role='vet')
+        self.client.force_login(user)
+        self.assertEqual(list(self.client.get(reverse('animal-listing')).context['animals']), [])
+        self.assertEqual(self.client.get(reverse('api-logs')).json()['results'], [])
+        self.assertEqual(self.client.get(reverse('vet-dashboard')).context['total_animals'], 0)
+        response = self.client.post(
+            reverse('api-animals'),
+            {'name': 'Clover', 'species': 'Cow', 'breed': 'Jersey', 'gender': 'female'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_jobs_of_other_farms_are_hidden(self):
+        theirs = enqueue('rebuild_rollups', farm_id=self.hill.id)
+        ours = enqueue('rebuild_rollups', farm_id=self.green.id)
+        response = self.client.get(reverse('jobs'))
+        self.assertEqual([job.id for job in response.context['jobs']], [ours.id])
+        self.assertEqual(self.client.get(reverse('job-detail', args=[theirs.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('job-download', args=[theirs.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api-job', args=[theirs.id])).status_code, 404)
+
+    def test_registering_with_a_taken_farm_name_starts_a_new_farm(self):
+        self.client.logout()
+        self.client.post(reverse('register'), {
+            'fullname': 'Eve Intruder', 'email': 'eve@example.com', 'phone': '0700000009',
+            'farm': 'Green Acres', 'role': 'farmer', 'password1': 'Passw0rd!', 'password2': 'Passw0rd!',
+            'terms': 'on',
+        })
+        farm = Profile.objects.get(user__email='eve@example.com').farm
+        self.assertNotEqual(farm, self.green)
+        self.assertEqual(farm.name, 'Green Acres')
+        self.assertFalse(farm.animals.exists())
+
+
+class ViewCacheTests(DairySyncTestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user('vet', 'vet@example.com', 'Passw0rd!', is_staff=True)
+        Profile.objects.create(user=self.user, phone='0700000000', farm_name='Green Acres', role='vet')
+        self.client.force_login(self.user)
+        self.daisy = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        self.bella = Animal.objects.create(name='Bella', species='Cow', breed='Jersey', gender='female')
+
+    def test_dashboard_is_served_from_cache_until_a_log_changes(self):
+        url = reverse('vet-dashboard')
+        self.assertEqual(self.client.get(url)['X-View-Cache'], 'miss')
+        self.assertEqual(self.client.get(url)['X-View-Cache'], 'hit')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_log(self.daisy, date.today(), health_observations='critical')
+        response = self.client.get(url)
+        self.assertEqual(response['X-View-Cache'], 'miss')
+        self.assertEqual(response.context['total_logs_today'], 1)
+        self.assertEqual(stats()['vet_dashboard'], {'hits': 1, 'misses': 2})
+
+    def test_invalidation_waits_for_the_commit(self):
+        url = reverse('vet-dashboard')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks() as callbacks:
+            make_log(self.daisy, date.today())
+            self.assertEqual(self.client.get(url)['X-View-Cache'], 'hit')
+        self.assertTrue(callbacks)
+
+    def test_detail_invalidation_is_per_animal(self):
+        daisy_url = reverse('animal-detail', args=[self.daisy.id])
+        bella_url = reverse('animal-detail', args=[self.bella.id])
+        self.client.get(daisy_url)
+        self.client.get(bella_url)
+
+        self.bella.health_status = 'sick'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bella.save()
+        self.assertEqual(self.client.get(daisy_url)['X-View-Cache'], 'hit')
+        response = self.client.get(bella_url)
+        self.assertEqual(response['X-View-Cache'], 'miss')
+        self.assertEqual(response.context['animal'].health_status, 'sick')
+
+    def test_listing_pages_are_cached_per_parameters(self):
+        url = reverse('animal-listing')
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-View-Cache'], 'hit')
+        self.assertEqual(self.client.get(url, {'search': 'Bel'})['X-View-Cache'], 'miss')
+        with self.captureOnCommitCallbacks(execute=True):
+            Animal.objects.create(name='Clover', species='Cow', breed='Jersey', gender='female')
+        self.assertEqual(self.client.get(url).context['page_obj'].paginator.count, 3)
+
+
+class JsonApiTests(DairySyncTestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user('farmer', 'farmer@example.com', 'Passw0rd!', is_staff=True)
+        self.client.force_login(self.user)
+        self.daisy = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        self.start = date(2025, 1, 1)
+        for offset in range(5):
+            make_log(self.daisy, self.start + timedelta(days=offset))
+
+    def test_cursor_pages_with_sparse_fields(self):
+        url = reverse('api-logs')
+        seen = []
+        params = {'fields': 'date,total_milk', 'page_size': 2}
+        while True:
+            body = self.client.get(url, params).json()
+            for row in body['results']:
+                self.assertEqual(set(row), {'date', 'total_milk'})
+            seen.extend(row['date'] for row in body['results'])
+            if not body['next_cursor']:
+                break
+            params['cursor'] = body['next_cursor']
+        expected = [(self.start + timedelta(days=offset)).isoformat() for offset in reversed(range(5))]
+        self.assertEqual(seen, expected)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('api-logs'), {'fields': 'date,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_detail_conditional_get(self):
+        url = reverse('api-animal', args=[self.daisy.id])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['name'], 'Daisy')
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+
+        self.daisy.health_status = 'sick'
+        self.daisy.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_conditional_get_until_a_log_changes(self):
+        url = reverse('api-logs')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(4):  # session, user, profile (for the farm) and the rows' state
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # read from the rows, so writes by other processes count too
+        log = make_log(self.daisy, self.start + timedelta(days=10))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        DailyLog.objects.filter(pk=log.pk)._raw_delete(connection.alias)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_staff_list_etag_sees_edits_in_every_farm(self):
+        quiet = Animal.objects.create(
+            farm=Farm.objects.create(name='Quiet Hollow'), name='Rosie', species='Cow', breed='Jersey',
+            gender='female',
+        )
+        log = make_log(quiet, self.start)
+        url = reverse('api-logs')
+        etag = self.client.get(url)['ETag']
+        # numbered below the other farm's logs, so one overall maximum would not move
+        log.notes = 'Limping'
+        log.save()
+        self.assertLess(log.sync_seq, DailyLog.objects.aggregate(latest=Max('sync_seq'))['latest'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_create_update_and_delete_log(self):
+        url = reverse('api-logs')
+        payload = {
+            'animal_id': self.daisy.id, 'date': '2025-02-01', 'morning_milk': '6.5',
+            'afternoon_milk': '4', 'evening_milk': '5', 'feed_amount': '12', 'water': '50',
+            'health_observations': 'normal', 'activity': 'grazing',
+        }
+        response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total_milk'], '15.500')
+        log_url = reverse('api-log', args=[response.json()['id']])
+
+        duplicate = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(duplicate.status_code, 400)
+
+        etag = response['ETag']
+        response = self.client.patch(
+            log_url, {'evening_milk': '7'}, content_type='application/json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.json()['total_milk'], '17.500')
+        # the old ETag no longer matches, so a second writer is refused
+        stale = self.client.patch(
+            log_url, {'evening_milk': '1'}, content_type='application/json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(stale.status_code, 412)
+
+        self.assertEqual(self.client.delete(log_url).status_code, 204)
+        self.assertEqual(self.client.get(log_url).status_code, 404)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api-animals')).status_code, 401)
+
+
+class TimeSeriesTests(DairySyncTestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user('vet', 'vet@example.com', 'Passw0rd!', is_staff=True)
+        self.client.force_login(self.user)
+        self.daisy = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        self.bella = Animal.objects.create(name='Bella', species='Cow', breed='Jersey', gender='female')
+        # 2025-03-03 is a Monday; no logs on the 5th
+        self.start = date(2025, 3, 3)
+        for offset in [0, 1, 3, 4, 5, 6, 7]:
+            make_log(self.daisy, self.start + timedelta(days=offset), temperature=38)
+        make_log(self.bella, self.start, temperature=40)
+
+    def series(self, **params):
+        response = self.client.get(reverse('api-timeseries'), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_auto_resolution_follows_the_range(self):
+        end = date(2025, 12, 31)
+        for days, resolution in [(30, 'day'), (365, 'day'), (5 * 365, 'week'), (20 * 365, 'month')]:
+            self.assertEqual(choose_resolution(end - timedelta(days=days - 1), end), resolution)
+        body = self.series(start='2021-01-01', end='2025-12-31')
+        self.assertEqual(body['resolution'], 'week')
+        # the partial weeks at both ends included
+        self.assertEqual(len(body['points']), 262)
+
+    def test_daily_herd_series_fills_gaps(self):
+        body = self.series(start='2025-03-03', end='2025-03-06')
+        self.assertEqual(body['points'], [
+            ['2025-03-03', 24.0], ['2025-03-04', 12.0], ['2025-03-05', None], ['2025-03-06', 12.0],
+        ])
+        body = self.series(start='2025-03-03', end='2025-03-06', fill='previous', animal=self.bella.id)
+        self.assertEqual([value for _, value in body['points']], [12.0, 12.0, 12.0, 12.0])
+
+    def test_weeks_match_the_logs(self):
+        body = self.series(start='2025-03-03', end='2025-03-16', resolution='week', metric='water')
+        self.assertEqual(body['points'], [['2025-03-03', 280.0], ['2025-03-10', 40.0]])
+        body = self.series(start='2025-03-03', end='2025-03-09', resolution='week', metric='temperature')
+        # six logs at 38 and one at 40
+        self.assertAlmostEqual(body['points'][0][1], 38.286)
+
+    def test_rejects_too_many_points(self):
+        response = self.client.get(reverse('api-timeseries'), {'days': 20 * 365, 'resolution': 'day'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FeedEfficiencyTests(DairySyncTestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user('vet', 'vet@example.com', 'Passw0rd!', is_staff=True)
+        self.client.force_login(self.user)
+        self.daisy = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        self.bella = Animal.objects.create(name='Bella', species='Cow', breed='Friesian', gender='female')
+        self.rosa = Animal.objects.create(name='Rosa', species='Cow', breed='Jersey', gender='female')
+        # 12 L of milk a day on 10, 8 and 12 kg of feed
+        for day in [date(2025, 1, 30), date(2025, 2, 10), date(2025, 3, 2)]:
+            make_log(self.daisy, day)
+            make_log(self.bella, day, feed_amount=8)
+            make_log(self.rosa, day, feed_amount=12)
+
+    def test_window_reads_months_and_edge_days(self):
+        rows = AnimalProductionRollup.objects.filter(window_filter(date(2025, 1, 30), date(2025, 3, 2)))
+        self.assertEqual(
+            sorted(rows.filter(animal=self.daisy).values_list('period', 'period_start')),
+            [('day', date(2025, 1, 30)), ('day', date(2025, 3, 2)), ('month', date(2025, 2, 1))],
+        )
+
+    def test_ranks_animals_and_totals_breeds(self):
+        report = feed_efficiency(date(2025, 1, 1), date(2025, 3, 31), feed_cost=0.5, milk_price=0.4)
+        self.assertEqual([row['name'] for row in report['animals']], ['Bella', 'Daisy', 'Rosa'])
+        self.assertEqual(report['animals'][0]['efficiency'], 1.5)
+        self.assertEqual(report['herd']['efficiency'], round(108 / 90, 3))
+        friesian = report['breeds'][0]
+        self.assertEqual((friesian['breed'], friesian['animals']), ('Friesian', 2))
+        # total milk over total feed, not the mean of 1.5 and 1.2
+        self.assertEqual(friesian['efficiency'], round(72 / 54, 3))
+        self.assertEqual(report['animals'][2]['feed_cost_per_litre'], 0.5)
+        self.assertEqual(report['herd']['margin'], round(108 * 0.4 - 90 * 0.5, 2))
+
+        report = feed_efficiency(date(2025, 2, 1), date(2025, 2, 28))
+        self.assertEqual(report['herd']['log_count'], 3)
+        self.assertIsNone(report['herd']['feed_cost'])
+
+    def test_page_and_csv_are_cached(self):
+        params = {'start': '2025-01-01', 'end': '2025-03-31'}
+        response = self.client.get(reverse('feed-efficiency'), params)
+        self.assertContains(response, 'Bella')
+        self.assertEqual(response['X-View-Cache'], 'miss')
+
+        response = self.client.get(reverse('feed-efficiency'), dict(params, format='csv', level='breed'))
+        self.assertEqual(response['X-View-Cache'], 'hit')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'breed,animals,logs,total_milk,total_feed,efficiency,feed_cost_per_litre,margin')
+        self.assertTrue(lines[1].startswith('Friesian,2,6,72.0,54.0,1.333'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_log(self.rosa, date(2025, 3, 3), feed_amount=4)
+        response = self.client.get(reverse('feed-efficiency'), params)
+        self.assertEqual(response['X-View-Cache'], 'miss')
+        rosa = next(row for row in response.context['animals'] if row['name'] == 'Rosa')
+        self.assertEqual((rosa['log_count'], rosa['efficiency']), (4, 1.2))
+
+
+class HerdStatsTests(DairySyncTestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.farm = Farm.objects.create(name='Green Acres')
+        self.daisy = Animal.objects.create(farm=self.farm, name='Daisy', species='Cow', breed='Friesian', gender='female')
+        self.bella = Animal.objects.create(farm=self.farm, name='Bella', species='Cow', breed='Jersey', gender='female')
+        self.today = date.today()
+
+    def stats(self):
+        with farm_scope(self.farm.id):
+            return herd_stats(self.today)
+
+    def test_signals_keep_counts(self):
+        self.bella.health_status = 'sick'
+        self.bella.save()
+        log = make_log(self.daisy, self.today)
+        make_log(self.bella, self.today)
+        stats = self.stats()
+        self.assertEqual((stats['total_animals'], stats['total_logs_today']), (2, 2))
+        self.assertEqual(stats['health_counts'], {'healthy': 1, 'sick': 1, 'recovering': 0, 'unknown': 0})
+
+        log.date = self.today - timedelta(days=1)
+        log.save()
+        self.assertEqual(self.stats()['total_logs_today'], 1)
+        # deleting an animal also uncounts its logs
+        self.bella.delete()
+        stats = self.stats()
+        self.assertEqual((stats['total_animals'], stats['total_logs_today']), (1, 0))
+        self.assertEqual(stats['health_counts']['sick'], 0)
+
+    def test_bulk_writes_recount_their_days(self):
+        result = import_daily_logs([
+            {'animal_id': self.daisy.id, 'date': self.today.isoformat(), 'morning_milk': '5'},
+            {'animal_id': self.bella.id, 'date': self.today.isoformat(), 'morning_milk': '6'},
+        ])
+        self.assertEqual(result.imported, 2)
+        self.assertEqual(self.stats()['total_logs_today'], 2)
+
+        self.assertTrue(can_raw_delete())
+        delete_logs(DailyLog.objects.filter(animal=self.bella))
+        self.assertEqual(self.stats()['total_logs_today'], 1)
+
+    def test_headline_is_one_query(self):
+        make_log(self.daisy, self.today)
+        with farm_scope(self.farm.id), self.assertNumQueries(1):
+            stats = herd_stats(self.today)
+        self.assertEqual(stats['total_logs_today'], 1)
+        # unscoped, every farm is summed
+        self.assertEqual(herd_stats(self.today)['total_animals'], 2)
+
+    def test_reconcile_repairs_drift(self):
+        make_log(self.daisy, self.today)
+        HerdStats.objects.filter(pk=self.farm.id).update(animal_count=7, sick_count=3)
+        HerdDayStats.objects.update(log_count=0)
+        HerdDayStats.objects.create(farm_key=self.farm.id, date=self.today - timedelta(days=3), log_count=4)
+
+        out = StringIO()
+        call_command('reconcile_stats', stdout=out)
+        self.assertIn('Repaired 3 counter row(s).', out.getvalue())
+        stats = self.stats()
+        self.assertEqual((stats['total_animals'], stats['total_logs_today']), (2, 1))
+        self.assertEqual(stats['health_counts']['sick'], 0)
+        self.assertEqual(HerdDayStats.objects.count(), 1)
+
+        call_command('reconcile_stats', stdout=out)
+        self.assertIn('All counters are correct.', out.getvalue())
+
+
+class DeltaSyncTests(DairySyncTestCase):
+    def setUp(self):
+        get_cache().clear()
+        # sync is per farm
+        farm = Farm.objects.create(name='Green Acres')
+        self.user = User.objects.create_user('milker', 'milker@example.com', 'Passw0rd!')
+        Profile.objects.create(user=self.user, phone='0700000000', farm_name=farm.name, farm=farm, role='farmer')
+        self.client.force_login(self.user)
+        self.daisy = Animal.objects.create(farm=farm, name='Daisy', species='Cow', breed='Friesian', gender='female')
+        self.bella = Animal.objects.create(farm=farm, name='Bella', species='Cow', breed='Jersey', gender='female')
+        self.start = date(2025, 1, 1)
+        self.logs = [make_log(self.daisy, self.start + timedelta(days=offset)) for offset in range(3)]
+        self.url = reverse('api-sync')
+
+    def upload(self, strategy, *logs):
+        return self.client.post(
+            self.url, {'strategy': strategy, 'logs': list(logs)}, content_type='application/json'
+        ).json()
+
+    def row(self, log_date, **fields):
+        return {'animal_id': self.daisy.id, 'date': log_date.isoformat(), 'morning_milk': '9', **fields}
+
+    def test_pull_returns_only_changes_and_tombstones(self):
+        mark = self.client.get(self.url).json()['next_since']
+        self.assertEqual(mark, max(log.sync_seq for log in self.logs))
+
+        self.logs[0].notes = 'Limping'
+        self.logs[0].save()
+        deleted_id = self.logs[1].id
+        self.logs[1].delete()
+        bella_id = self.bella.id
+        self.bella.delete()
+
+        body = self.client.get(self.url, {'since': mark}).json()
+        self.assertEqual([row['id'] for row in body['logs']], [self.logs[0].id])
+        self.assertEqual(body['animals'], [])
+        self.assertEqual(
+            [(row['kind'], row['object_id']) for row in body['deleted']],
+            [('dailylog', deleted_id), ('animal', bella_id)],
+        )
+        self.assertFalse(body['has_more'])
+        self.assertEqual(self.client.get(self.url, {'since': body['next_since']}).json()['logs'], [])
+
+    def test_pull_pages_in_sequence_order(self):
+        seen = []
+        since = 0
+        while True:
+            body = self.client.get(self.url, {'since': since, 'limit': 2}).json()
+            seen.extend(row['sync_seq'] for row in body['animals'] + body['logs'])
+            since = body['next_since']
+            if not body['has_more']:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(sorted(seen), sorted(set(seen)))
+
+    def test_each_farm_numbers_its_own_changes(self):
+        other = Farm.objects.create(name='Hill Top')
+        mark = SyncCounter.values()[self.daisy.farm_id]
+        rosie = Animal.objects.create(farm=other, name='Rosie', species='Cow', breed='Jersey', gender='female')
+        make_log(rosie, self.start)
+        self.assertEqual(SyncCounter.values()[self.daisy.farm_id], mark)
+        self.assertEqual(SyncCounter.values()[other.id], 2)
+        self.assertEqual(self.client.get(self.url, {'since': mark}).json()['logs'], [])
+
+    def test_report_strategy_flags_stale_edits(self):
+        base_seq = self.logs[0].sync_seq
+        self.logs[0].notes = 'Edited on the server'
+        self.logs[0].save()
+
+        body = self.upload(
+            'report',
+            self.row(self.start, base_seq=base_seq),
+            self.row(self.start + timedelta(days=7)),
+        )
+        self.assertEqual([conflict['index'] for conflict in body['conflicts']], [0])
+        self.assertEqual(body['conflicts'][0]['server']['notes'], 'Edited on the server')
+        self.assertEqual([row['index'] for row in body['applied']], [1])
+        self.logs[0].refresh_from_db()
+        self.assertEqual(self.logs[0].morning_milk, 5)
+
+        body = self.upload('report', self.row(self.start, base_seq=self.logs[0].sync_seq))
+        self.assertEqual(body['conflicts'], [])
+        self.logs[0].refresh_from_db()
+        self.assertEqual(self.logs[0].morning_milk, 9)
+        self.assertEqual(self.logs[0].sync_seq, body['applied'][0]['sync_seq'])
+
+    def test_last_writer_wins(self):
+        server_time = self.logs[0].updated_at
+        body = self.upload(
+            'last_writer_wins',
+            self.row(self.start, modified_at=(server_time - timedelta(hours=1)).isoformat()),
+            self.row(self.start + timedelta(days=1), modified_at=(server_time + timedelta(hours=1)).isoformat()),
+            self.row(self.start + timedelta(days=2)),
+        )
+        self.assertEqual([conflict['index'] for conflict in body['conflicts']], [0])
+        self.assertEqual([row['index'] for row in body['applied']], [1])
+        self.assertEqual([error['index'] for error in body['errors']], [2])
+        self.logs[1].refresh_from_db()
+        self.assertEqual(self.logs[1].morning_milk, 9)
+
+
+class AsyncViewTests(DairySyncTestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user('vet', 'vet@example.com', 'Passw0rd!', is_staff=True)
+        Profile.objects.create(user=self.user, phone='0700000000', farm_name='Green Acres', role='vet')
+        self.daisy = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        make_log(self.daisy, date.today() - timedelta(days=1), health_observations='critical')
+        make_log(self.daisy, date.today())
+
+    def make_request(self):
+        request = AsyncRequestFactory().get('/')
+        request.user = self.user
+
+        async def auser():
+            return self.user
+
+        request.auser = auser
+        return request
+
+    async def test_dashboard_data_matches_sync_view(self):
+        today = date.today()
+        self.assertEqual(
+            await views._async_vet_dashboard_data(today),
+            await sync_to_async(views._vet_dashboard_data)(today),
+        )
+
+    async def test_dashboard_renders_and_caches(self):
+        response = await views.async_vet_dashboard(self.make_request())
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Daisy')
+        self.assertEqual(response['X-View-Cache'], 'miss')
+        response = await views.async_vet_dashboard(self.make_request())
+        self.assertEqual(response['X-View-Cache'], 'hit')
+
+    async def test_detail_and_missing_animal(self):
+        response = await views.async_animal_detail(self.make_request(), self.daisy.id)
+        self.assertContains(response, 'Daisy')
+        request = self.make_request()
+        request._messages = CookieStorage(request)
+        response = await views.async_animal_detail(request, self.daisy.id + 100)
+        self.assertEqual(response.status_code, 302)
+
+    async def test_middleware_times_async_views(self):
+        with override_settings(DAIRYSYNC_PERF_ENABLED=True, DAIRYSYNC_PERF_CACHE_ALIAS='default'):
+            middleware = PerformanceMiddleware(views.async_vet_dashboard)
+            response = await middleware(self.make_request())
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+
+@override_settings(DAIRYSYNC_PERF_ENABLED=True, DAIRYSYNC_PERF_CACHE_ALIAS='default')
+class PerformanceMiddlewareTests(DairySyncTestCase):
+    def setUp(self):
+        perf.reset()
+        self.user = User.objects.create_user('farmer', 'farmer@example.com', 'Passw0rd!', is_staff=True)
+        self.client.force_login(self.user)
+        animal = Animal.objects.create(name='Daisy', species='Cow', breed='Friesian', gender='female')
+        make_log(animal, date(2025, 1, 1))
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('manage-logs'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertRegex(timing, r'view;dur=[\d.]+')
+
+    def test_histograms_feed_perf_report(self):
+        for _ in range(3):
+            self.client.get(reverse('manage-logs'))
+        report = perf.report()['manage-logs']
+        self.assertEqual(report['view_ms']['count'], 3)
+        self.assertGreater(report['queries']['mean'], 0)
+        self.assertGreater(report['template_ms']['mean'], 0)
+
+        out = StringIO()
+        call_command('perf_report', stdout=out)
+        self.assertIn('manage-logs', out.getvalue())
+
+    @override_settings(DAIRYSYNC_PERF_FLUSH_INTERVAL=3600)
+    def test_requests_are_counted_in_memory_until_a_flush(self):
+        perf.flush()
+        self.client.get(reverse('manage-logs'))
+        self.assertIsNone(perf.get_cache().get(perf.REGISTRY_KEY))
+        self.assertEqual(perf.report()['manage-logs']['view_ms']['count'], 1)
+        self.assertEqual(len(perf.get_cache().get(perf.REGISTRY_KEY)), 1)
+
+    def test_percentiles_come_from_bucket_bounds(self):
+        bounds = [1, 10, 100, float('inf')]
+        self.assertEqual(perf.percentile(bounds, [50, 45, 4, 1], 0.5), 1)
+        self.assertEqual(perf.percentile(bounds, [50, 45, 4, 1], 0.95), 10)
+        self.assertEqual(perf.percentile(bounds, [50, 45, 4, 1], 0.99), 100)
+
+
+class SyntheticHerdTests(DairySyncTestCase):
+    def test_generate_herd_command(self):
+        call_command('generate_herd', farms=2, animals=4, logs=400, seed=1, stdout=StringIO())
+        self.assertEqual(Animal.objects.count(), 4)
+        self.assertEqual(DailyLog.objects.count(), 400)
+        self.assertEqual(Profile.objects.filter(farm_name__startswith='Synthetic Farm').count(), 2)
+        self.assertEqual(
+            AnimalProductionRollup.objects.filter(period='day').count(), DailyLog.objects.count()
+        )
+
+    def test_benchmark_comparison_flags_regressions(self):
+        baseline = {'1000': {'manage_logs': {'ms': 10.0, 'queries': 4}}}
+        self.assertEqual(compare({'1000': {'manage_logs': {'ms': 12.0, 'queries': 4}}}, baseline, 0.25), [])
+        regressions = compare({'1000': {'manage_logs': {'ms': 20.0, 'queries': 9}}}, baseline, 0.25)
+        self.assertEqual(len(regressions), 2)
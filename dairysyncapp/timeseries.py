@@ -0,0 +1,157 @@
+"""
+Herd and animal time series for charts.
+
+Series are read from AnimalProductionRollup, never from DailyLog: a day
+rollup holds exactly what the animal's log for that day did, and the week
+and month rollups hold the same totals pre-aggregated. ``resolution``
+names the level to read; with ``auto`` (the default) it is the finest
+level whose points fit in ``max_points``, so no more detail is read than
+the chart can draw. A 30-day or 1-year chart reads day rollups and a
+5-year chart about 260 week rollups per animal, summed by the database
+into one row per period.
+
+Periods without data are filled in Python while walking the period
+starts, which costs one step per point: ``none`` leaves them null,
+``zero`` reports 0 and ``previous`` carries the last value forward.
+
+``GET /api/timeseries/?metric=milk&days=1825`` returns
+``{"metric", "resolution", "start", "end", "points": [[date, value], ...]}``;
+``animal=<id>`` narrows the series to one animal.
+"""
+from datetime import timedelta
+
+from django.db.models import ExpressionWrapper, F, FloatField, Q, Sum
+from django.db.models.functions import Cast
+
+from .api import ApiError, conditional_json, api_view
+from .filters import parse_range
+from .models import AnimalProductionRollup, DailyLog
+from .rollups import PERIODS, period_bounds
+
+TIMESERIES_MAX_POINTS = 400
+# the most points any request may ask for, e.g. ten years of days
+TIMESERIES_POINT_LIMIT = 4000
+
+RESOLUTIONS = ['auto'] + PERIODS
+FILLS = ['none', 'zero', 'previous']
+
+
+def _weighted_temperature():
+    # herd temperature is the mean of the animals' means, weighted by their logs
+    weighted = Cast(F('avg_temperature'), FloatField()) * F('log_count')
+    return ExpressionWrapper(
+        Sum(weighted, output_field=FloatField()) / Sum('log_count', filter=Q(avg_temperature__isnull=False)),
+        output_field=FloatField(),
+    )
+
+
+# metric -> aggregate over the rollup rows of one period
+METRICS = {
+    'milk': lambda: Sum('total_milk'),
+    'feed': lambda: Sum('total_feed'),
+    'water': lambda: Sum('total_water'),
+    'temperature': _weighted_temperature,
+}
+
+
+def _next_period_start(period, start):
+    return period_bounds(period, start)[1] + timedelta(days=1)
+
+
+def period_starts(period, start, end):
+    """First day of every ``period`` overlapping ``start``..``end``"""
+    current = period_bounds(period, start)[0]
+    while current <= end:
+        yield current
+        current = _next_period_start(period, current)
+
+
+def count_periods(period, start, end):
+    first = period_bounds(period, start)[0]
+    if period == 'day':
+        return (end - first).days + 1
+    if period == 'week':
+        return (end - first).days // 7 + 1
+    return (end.year - first.year) * 12 + end.month - first.month + 1
+
+
+def choose_resolution(start, end, max_points=TIMESERIES_MAX_POINTS):
+    """The finest rollup period giving at most ``max_points`` points"""
+    for period in PERIODS:
+        if count_periods(period, start, end) <= max_points:
+            return period
+    return PERIODS[-1]
+
+
+def fill_gaps(period, start, end, values, fill='none'):
+    """``[[period_start, value], ...]`` for every period, ``values`` keyed by period start"""
+    points = []
+    last = None
+    for period_start in period_starts(period, start, end):
+        value = values.get(period_start)
+        if value is None:
+            value = {'none': None, 'zero': 0.0, 'previous': last}[fill]
+        else:
+            last = value
+        points.append([period_start, value])
+    return points
+
+
+def herd_series(metric, start, end, resolution='auto', animal_id=None, fill='none',
+                max_points=TIMESERIES_MAX_POINTS):
+    """
+    Return ``(resolution, points)`` for ``metric`` between ``start`` and
+    ``end``, summed over the herd or for ``animal_id`` only. Week and month
+    points cover whole periods, so the first and last may reach outside
+    the range.
+    """
+    if resolution == 'auto':
+        resolution = choose_resolution(start, end, max_points)
+
+    rows = AnimalProductionRollup.objects.filter(
+        period=resolution, period_start__range=(period_bounds(resolution, start)[0], end)
+    )
+    if animal_id is not None:
+        rows = rows.filter(animal_id=animal_id)
+    rows = rows.order_by().values('period_start').annotate(value=METRICS[metric]())
+    values = {
+        row['period_start']: round(float(row['value']), 3) for row in rows if row['value'] is not None
+    }
+    return resolution, fill_gaps(resolution, start, end, values, fill)
+
+
+@api_view('GET', 'HEAD')
+def timeseries_view(request):
+    params = request.GET
+    metric = params.get('metric', 'milk')
+    if metric not in METRICS:
+        raise ApiError(f"metric must be one of: {', '.join(METRICS)}")
+    resolution = params.get('resolution', 'auto')
+    if resolution not in RESOLUTIONS:
+        raise ApiError(f"resolution must be one of: {', '.join(RESOLUTIONS)}")
+    fill = params.get('fill', 'none')
+    if fill not in FILLS:
+        raise ApiError(f"fill must be one of: {', '.join(FILLS)}")
+    try:
+        start, end = parse_range(params)
+        animal_id = int(params['animal']) if params.get('animal') else None
+        max_points = max(1, int(params.get('max_points', TIMESERIES_MAX_POINTS)))
+    except (ValueError, OverflowError) as e:
+        raise ApiError(f'Invalid range: {e}')
+
+    if resolution == 'auto':
+        resolution = choose_resolution(start, end, max_points)
+    if count_periods(resolution, start, end) > TIMESERIES_POINT_LIMIT:
+        raise ApiError(f'At most {TIMESERIES_POINT_LIMIT} points per request; choose a coarser resolution.')
+
+    def build():
+        _, series = herd_series(metric, start, end, resolution, animal_id, fill)
+        return {'metric': metric, 'resolution': resolution, 'start': start, 'end': end, 'points': series}
+
+    # the logs summed into the points, whole periods included
+    changes = DailyLog.objects.filter(
+        date__range=(period_bounds(resolution, start)[0], period_bounds(resolution, end)[1])
+    )
+    if animal_id is not None:
+        changes = changes.filter(animal_id=animal_id)
+    return conditional_json(request, changes, build)
@@ -14,9 +14,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from dairysyncapp import views
+from dairysyncapp import api, sync, timeseries, views
+
+# async views only when DAIRYSYNC_ASYNC_VIEWS is set, see settings
+if settings.DAIRYSYNC_ASYNC_VIEWS:
+    animal_detail, vet_dashboard = views.async_animal_detail, views.async_vet_dashboard
+else:
+    animal_detail, vet_dashboard = views.animal_detail, views.vet_dashboard
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,7 +34,7 @@ urlpatterns = [
     path('password_reset/', views.password_reset, name='password_reset'), 
     path('animal_registration/', views.animal_registration_page, name='animal-registration'),
     path('animal_listing/', views.animal_listing_page, name='animal-listing'),
-    path('animal/<int:animal_id>/', views.animal_detail, name='animal-detail'),  # View animal details
+    path('animal/<int:animal_id>/', animal_detail, name='animal-detail'),  # View animal details
     path('animal/<int:animal_id>/delete/', views.animal_delete, name='animal-delete'),  # Delete animal
     path('add_daily_log/<int:animal_id>/',views.add_daily_log,name='add-daily-log'),
     path('edit_daily_log/<int:log_id>/',views.edit_daily_log,name='edit-daily-log'),
@@ -35,5 +42,19 @@ urlpatterns = [
     path('manage-logs', views.manage_logs, name='manage-logs'),
     path('delete-daily-log/<int:log_id>/', views.delete_daily_log, name='delete-daily-log'),
     path('logs/bulk-delete/', views.bulk_delete_logs, name='bulk-delete-logs'),
-     path('vet-dashboard/', views.vet_dashboard, name='vet-dashboard'),
+    path('logs/herd-entry/', views.herd_log_entry, name='herd-log-entry'),
+    path('logs/import/', views.import_daily_logs_view, name='import-daily-logs'),
+    path('logs/export/', views.export_logs, name='export-logs'),
+    path('reports/feed-efficiency/', views.feed_efficiency_report, name='feed-efficiency'),
+    path('jobs/', views.jobs_page, name='jobs'),
+    path('jobs/<int:job_id>/', views.job_detail, name='job-detail'),
+    path('jobs/<int:job_id>/download/', views.job_download, name='job-download'),
+     path('vet-dashboard/', vet_dashboard, name='vet-dashboard'),
+    path('api/animals/', api.animals, name='api-animals'),
+    path('api/animals/<int:animal_id>/', api.animal, name='api-animal'),
+    path('api/logs/', api.logs, name='api-logs'),
+    path('api/logs/<int:log_id>/', api.log, name='api-log'),
+    path('api/sync/', sync.sync_view, name='api-sync'),
+    path('api/timeseries/', timeseries.timeseries_view, name='api-timeseries'),
+    path('api/jobs/<int:job_id>/', api.job, name='api-job'),
 ]   
\ No newline at end of file
@@ -1,13 +1,35 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect,get_object_or_404
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.contrib.auth import login as auth_login, authenticate, logout as auth_logout
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
-from django.db.models import Sum ,Count,Avg,Q
+from django.core.paginator import Page, Paginator
+from django.db import transaction
+from django.db.models import Sum ,Count,Avg,Q,F,Window
+from django.db.models.functions import RowNumber
 from datetime import datetime,timedelta
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
 from .models import *
+from .anomalies import recent_anomalies
+from .caching import acached, cached
+from .counters import aherd_stats, herd_stats
+from .exports import EXPORT_FORMATS, iter_csv, iter_parquet, require_pyarrow
+from .filters import LOG_SORTS, filter_logs, parse_range
+from .deletes import delete_logs, summarize_logs
+from .herd_entry import GRID_FIELDS, grid_input_name, read_grid, save_herd_entries
+from .imports import import_daily_logs, iter_rows
+from .jobs import enqueue, enqueue_import, stored_job_file
+from .lactation import lactation_summary, underperformers
+from .reports import FEED_COST_PER_KG, MILK_PRICE_PER_LITRE, REPORT_LEVELS, cached_feed_efficiency, iter_report_csv
+import asyncio
+import base64
 import re
 
 
@@ -161,11 +183,15 @@ def register(request):
                 last_name=last_name
             )
             
-            # Create user profile with additional info
+            # Create user profile with additional info. Every registration
+            # starts its own farm: matching an existing farm by its typed
+            # name would hand its herd to anyone who guessed the name, so
+            # staff add members to a farm from the admin instead
             Profile.objects.create(
                 user=user,
                 phone=phone,
                 farm_name=farm,
+                farm=Farm.objects.create(name=farm),
                 role=role
             )
             
@@ -198,56 +224,124 @@ def vet_dashboard(request):
     except Profile.DoesNotExist:
         messages.error(request, 'Profile not found. Please complete your profile.')
         return redirect('login')
-    
-    # Get statistics for the vet dashboard
-    total_animals = Animal.objects.count()
-    
+
     # Get today's date
     today = timezone.now().date()
-    total_logs_today = DailyLog.objects.filter(date=today).count()
-    
-    
-   
-    sick_animals = Animal.objects.filter(
-        daily_logs__health_observations__in=['sick', 'critical', 'needs_attention']
-    ).distinct()
-    
-    # OR Method 2: If you want only animals with recent health issues (last 7 days)
-    sick_animals = Animal.objects.filter(
-        daily_logs__health_observations__in=['sick', 'critical', 'needs_attention'],
-        daily_logs__date__gte=today - timezone.timedelta(days=7)
-    ).distinct()
+
+    data, hit = cached(
+        'vet_dashboard', (today,), ['animal', 'dailylog', 'lactation', 'anomaly'],
+        lambda: _vet_dashboard_data(today)
+    )
+
+    context = dict(data, user_profile=profile, today=today)
+    response = render(request, 'vet_dashboard.html', context)
+    response['X-View-Cache'] = 'hit' if hit else 'miss'
+    return response
+
+
+def _vet_dashboard_querysets(today):
+    """The dashboard's problem-log and production queries, shared by the sync and async views"""
+    # Latest problem log per animal with health issues in the last 7 days,
+    # picked in a single query by numbering each animal's logs newest first
+    latest_problem_logs = DailyLog.objects.filter(
+        health_observations__in=DailyLog.PROBLEM_OBSERVATIONS,
+        date__gte=today - timedelta(days=7)
+    ).annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('animal_id')],
+            order_by=[F('date').desc(), F('id').desc()],
+        )
+    ).filter(row_number=1).select_related('animal').order_by('-date')
     
     # Get recent logs with health issues
     recent_health_issues = DailyLog.objects.filter(
-        health_observations__in=['sick', 'critical', 'needs_attention']
+        health_observations__in=DailyLog.PROBLEM_OBSERVATIONS
     ).select_related('animal').order_by('-date')[:10]
-    
+
+    return latest_problem_logs, recent_health_issues, underperformers(), recent_anomalies(today)
+
+
+def _vet_dashboard_summary(stats, latest_problem_logs, recent_health_issues, low_producers, anomalies):
     # Get animals that need attention (with their latest health status)
-    animals_needing_attention = []
-    for animal in sick_animals:
-        latest_log = animal.daily_logs.filter(
-            health_observations__in=['sick', 'critical', 'needs_attention']
-        ).order_by('-date').first()
-        if latest_log:
-            animals_needing_attention.append({
-                'animal': animal,
-                'latest_log': latest_log,
-                'health_status': latest_log.health_observations,
-                'date': latest_log.date
-            })
+    animals_needing_attention = [
+        {
+            'animal': log.animal,
+            'latest_log': log,
+            'health_status': log.health_observations,
+            'date': log.date
+        }
+        for log in latest_problem_logs
+    ]
+    sick_animals = [entry['animal'] for entry in animals_needing_attention]
     
-    context = {
-        'total_animals': total_animals,
-        'total_logs_today': total_logs_today,
+    return {
+        # total_animals, total_logs_today and health_counts
+        **stats,
         'sick_animals': sick_animals,
         'animals_needing_attention': animals_needing_attention,
-        'recent_health_issues': recent_health_issues,
-        'user_profile': profile,
-        'today': today,
+        'recent_health_issues': list(recent_health_issues),
+        # producing below their fitted lactation curve
+        'underperformers': list(low_producers),
+        # flagged by the anomaly detector rather than entered by hand
+        'anomalies': list(anomalies),
     }
-    
-    return render(request, 'vet_dashboard.html', context)
+
+
+def _vet_dashboard_data(today):
+    """Herd-wide dashboard figures, cached until an animal or log changes"""
+    latest_problem_logs, recent_health_issues, low_producers, anomalies = _vet_dashboard_querysets(today)
+    return _vet_dashboard_summary(
+        herd_stats(today),
+        latest_problem_logs,
+        recent_health_issues,
+        low_producers,
+        anomalies,
+    )
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def _async_vet_dashboard_data(today):
+    """_vet_dashboard_data() with the five independent queries gathered"""
+    latest_problem_logs, recent_health_issues, low_producers, anomalies = _vet_dashboard_querysets(today)
+    return _vet_dashboard_summary(*await asyncio.gather(
+        aherd_stats(today),
+        _alist(latest_problem_logs),
+        _alist(recent_health_issues),
+        _alist(low_producers),
+        _alist(anomalies),
+    ))
+
+
+@login_required
+async def async_vet_dashboard(request):
+    """Async vet_dashboard, routed instead of it with DAIRYSYNC_ASYNC_VIEWS"""
+    # reuse the user loaded by login_required when the template reads request.user
+    request.user = user = await request.auser()
+    try:
+        profile = await Profile.objects.aget(user=user)
+        if profile.role != 'vet':
+            messages.error(request, 'Access denied. Veterinarian account required.')
+            return redirect('login')
+    except Profile.DoesNotExist:
+        messages.error(request, 'Profile not found. Please complete your profile.')
+        return redirect('login')
+
+    today = timezone.now().date()
+
+    data, hit = await acached(
+        'vet_dashboard', (today,), ['animal', 'dailylog', 'lactation', 'anomaly'],
+        lambda: _async_vet_dashboard_data(today)
+    )
+
+    context = dict(data, user_profile=profile, today=today)
+    # rendering reads request.user and the session, which are sync-only
+    response = await sync_to_async(render)(request, 'vet_dashboard.html', context)
+    response['X-View-Cache'] = 'hit' if hit else 'miss'
+    return response
 
 # Logout View
 def logout_view(request):
@@ -262,12 +356,92 @@ def password_reset(request):
 # Dashboard
 
 
+ANIMALS_PER_PAGE = 24
+
+# animal listing sort options, each backed by an index on Animal
+ANIMAL_SORTS = {
+    '-created_at': 'Newest First',
+    'created_at': 'Oldest First',
+    'name': 'Name (A-Z)',
+    '-name': 'Name (Z-A)',
+}
+
+
 # Animal Listing Page
+@login_required
 def animal_listing_page(request):
-    animals = Animal.objects.all()
-    return render(request, 'listing.html', {'animals': animals})    
+    search = request.GET.get('search', '').strip()
+    species_filter = request.GET.get('species', '')
+    status_filter = request.GET.get('status') or request.GET.get('health_status', '')
+    sort = request.GET.get('sort', '-created_at')
+    if sort not in ANIMAL_SORTS:
+        sort = '-created_at'
+    view_mode = 'table' if request.GET.get('view') == 'table' else 'grid'
+
+    animals = Animal.objects.only('id', 'name', 'species', 'breed', 'gender', 'health_status')
+
+    if search:
+        # prefix match so the name index can be used; numbers also match the id
+        match = Q(name__istartswith=search)
+        if search.isdigit():
+            match |= Q(id=int(search))
+        animals = animals.filter(match)
+
+    if species_filter:
+        animals = animals.filter(species=species_filter)
+
+    if status_filter in dict(Animal.HEALTH_STATUS_CHOICES):
+        animals = animals.filter(health_status=status_filter)
+    else:
+        status_filter = ''
+
+    animals = animals.order_by(sort, '-id')
+
+    filters = {'search': search, 'species': species_filter, 'status': status_filter}
+    if sort != '-created_at':
+        filters['sort'] = sort
+    filter_query = urlencode({key: value for key, value in filters.items() if value})
+    page_query = f"{filter_query}&view={view_mode}" if filter_query else f"view={view_mode}"
+
+    def build():
+        page = Paginator(animals, ANIMALS_PER_PAGE).get_page(request.GET.get('page'))
+        return {
+            'animals': list(page.object_list),
+            'count': page.paginator.count,
+            'number': page.number,
+            'species_options': list(
+                Animal.objects.order_by('species').values_list('species', flat=True).distinct()
+            ),
+        }
+
+    data, hit = cached(
+        'animal_listing_page',
+        (filter_query, request.GET.get('page', '')),
+        ['animal'],
+        build,
+    )
+    # rebuild the page around the cached rows; the range only supplies the count
+    page_obj = Page(data['animals'], data['number'], Paginator(range(data['count']), ANIMALS_PER_PAGE))
+
+    response = render(request, 'listing.html', {
+        'animals': page_obj.object_list,
+        'page_obj': page_obj,
+        'search': search,
+        'species_filter': species_filter,
+        'status_filter': status_filter,
+        'sort': sort,
+        'sort_options': ANIMAL_SORTS.items(),
+        'species_options': data['species_options'],
+        'health_status_choices': Animal.HEALTH_STATUS_CHOICES,
+        'view_mode': view_mode,
+        'filter_query': filter_query,
+        'page_query': page_query,
+    })
+    response['X-View-Cache'] = 'hit' if hit else 'miss'
+    return response
 
 # Animal Registration Page
+@login_required
 def animal_registration_page(request):
     if request.method == 'POST':
         try:
@@ -291,15 +465,51 @@ def animal_registration_page(request):
 
 
 
+@login_required
 def animal_detail(request, animal_id):
     try:
-        animal = Animal.objects.get(id=animal_id)
-        return render(request, 'animal_detail.html', {'animal': animal})
+        today = timezone.now().date()
+        data, hit = cached(
+            'animal_detail', (animal_id, today), [f'animal:{animal_id}'],
+            lambda: {
+                'animal': Animal.objects.get(id=animal_id),
+                'lactation': lactation_summary(animal_id, today),
+            }
+        )
+        response = render(request, 'animal_detail.html', data)
+        response['X-View-Cache'] = 'hit' if hit else 'miss'
+        return response
+    except Animal.DoesNotExist:
+        messages.error(request, 'Animal not found.')
+        return redirect('animal-listing')
+
+
+async def _async_animal_detail_data(animal_id, today):
+    animal, lactation = await asyncio.gather(
+        Animal.objects.aget(id=animal_id),
+        sync_to_async(lactation_summary)(animal_id, today),
+    )
+    return {'animal': animal, 'lactation': lactation}
+
+
+@login_required
+async def async_animal_detail(request, animal_id):
+    """Async animal_detail, routed instead of it with DAIRYSYNC_ASYNC_VIEWS"""
+    try:
+        today = timezone.now().date()
+        data, hit = await acached(
+            'animal_detail', (animal_id, today), [f'animal:{animal_id}'],
+            lambda: _async_animal_detail_data(animal_id, today)
+        )
+        response = await sync_to_async(render)(request, 'animal_detail.html', data)
+        response['X-View-Cache'] = 'hit' if hit else 'miss'
+        return response
     except Animal.DoesNotExist:
         messages.error(request, 'Animal not found.')
         return redirect('animal-listing')
 
 # Delete Animal
+@login_required
 def animal_delete(request, animal_id):
     if request.method == 'POST':
         try:
@@ -316,6 +526,7 @@ def animal_delete(request, animal_id):
             return redirect('animal-listing')
     else:
         return redirect('animal-listing')   
+@login_required
 def add_daily_log(request, animal_id):
     animal = get_object_or_404(Animal, id=animal_id)
 
@@ -333,40 +544,43 @@ def add_daily_log(request, animal_id):
             activity = request.POST.get('activity', 'grazing')
             notes = request.POST.get('notes', '')
             
-            # Check if log already exists for this date
-            existing_log = DailyLog.objects.filter(animal=animal, date=date).first()
+            # check and insert in one transaction so two hands submitting the
+            # same animal and date cannot both pass the existence check
+            with transaction.atomic():
+                # Check if log already exists for this date
+                existing_log = DailyLog.objects.filter(animal=animal, date=date).first()
             
-            if existing_log:
-                messages.error(request, f'A log entry already exists for {date}. Please edit that entry instead.')
-                return redirect('animal-detail', animal_id=animal_id)
+                if existing_log:
+                    messages.error(request, f'A log entry already exists for {date}. Please edit that entry instead.')
+                    return redirect('animal-detail', animal_id=animal_id)
             
-            # Create daily log
-            DailyLog.objects.create(
-                animal=animal,
-                date=date,
+                # Create daily log
+                DailyLog.objects.create(
+                    animal=animal,
+                    date=date,
                 
-                # Milk production
-                morning_milk=morning_milk,
-                afternoon_milk=afternoon_milk,
-                evening_milk=evening_milk,
+                    # Milk production
+                    morning_milk=morning_milk,
+                    afternoon_milk=afternoon_milk,
+                    evening_milk=evening_milk,
                 
-                # Feeding (note: field is water_consumption, not water)
-                feed_amount=feed_amount,
-                water=water,
+                    # Feeding (note: field is water_consumption, not water)
+                    feed_amount=feed_amount,
+                    water=water,
                 
-                # Health (note: field is health_observation, not health_observations)
-                temperature=temperature if temperature else None,
-                health_observations=health_observations,
+                    # Health (note: field is health_observation, not health_observations)
+                    temperature=temperature if temperature else None,
+                    health_observations=health_observations,
                 
-                # Activity
-                activity=activity,
+                    # Activity
+                    activity=activity,
                 
-                # Notes
-                notes=notes,
+                    # Notes
+                    notes=notes,
                 
-                # Who created it
-                created_by=request.user if request.user.is_authenticated else None
-            )
+                    # Who created it
+                    created_by=request.user if request.user.is_authenticated else None
+                )
             
             messages.success(request, f'Daily log for {animal.name} on {date} has been added successfully.')
             return redirect('manage-logs')
@@ -379,6 +593,7 @@ def add_daily_log(request, animal_id):
 
 
 
+@login_required
 def edit_daily_log(request, log_id):
     """
     Edit an existing daily log entry
@@ -427,91 +642,328 @@ def edit_daily_log(request, log_id):
 
 
 
+LOGS_PAGE_SIZE = 50
+LOGS_MAX_PAGE_SIZE = 200
+LOGS_STREAM_CHUNK_SIZE = 500
+
+
+def _encode_log_cursor(log, sort='date'):
+    """Opaque keyset cursor pointing just past ``log`` in (-sort column, -id) order."""
+    value = getattr(log, LOG_SORTS[sort])
+    value = value.isoformat() if sort == 'date' else str(value)
+    raw = f"{value}|{log.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_log_cursor(cursor, sort='date'):
+    """Return (sort value, id) from a cursor, or None if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, log_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        if sort == 'date':
+            value = datetime.strptime(value, '%Y-%m-%d').date()
+        else:
+            value = Decimal(value)
+        return value, int(log_id)
+    except (ValueError, UnicodeDecodeError, InvalidOperation):
+        return None
+
+
+def _stream_manage_logs(request, logs, context):
+    """
+    Render the manage-logs page around a row generator so the full result
+    set is never held in memory at once
+    """
+    page = render_to_string('manage_logs.html', context, request=request)
+    head, tail = page.split('<!--log-rows-->', 1)
+
+    def rows():
+        yield head
+        chunk = []
+        for log in logs.iterator(chunk_size=LOGS_STREAM_CHUNK_SIZE):
+            chunk.append(log)
+            if len(chunk) == LOGS_STREAM_CHUNK_SIZE:
+                yield render_to_string('manage_logs_rows.html', {'logs': chunk})
+                chunk = []
+        if chunk:
+            yield render_to_string('manage_logs_rows.html', {'logs': chunk})
+        yield tail
+
+    return StreamingHttpResponse(rows(), content_type='text/html; charset=utf-8')
+
+
 @login_required
 def manage_logs(request):
-    logs = DailyLog.objects.select_related('animal').order_by('-date')
+    """
+    List daily logs newest first using keyset pagination on (date, id), or
+    highest producers first on (total_milk, id) with ``?sort=milk``.
 
-    animal_filter = request.GET.get('animal', '')
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
-    health_filter = request.GET.get('health', '')
+    ``?cursor=`` continues after the last row of the previous page and
+    ``?stream=1`` streams every matching row instead of a single page.
+    """
+    logs, filters = filter_logs(request.GET)
 
-    if animal_filter:
-        logs = logs.filter(animal_id=animal_filter)
+    sort = request.GET.get('sort', 'date')
+    if sort not in LOG_SORTS:
+        sort = 'date'
+    sort_column = LOG_SORTS[sort]
+    logs = logs.order_by(f'-{sort_column}', '-id')
 
-    if date_from:
-        logs = logs.filter(date__gte=date_from)
+    query = {key: value for key, value in filters.items() if value}
+    if sort != 'date':
+        query['sort'] = sort
+    filter_query = urlencode(query)
 
-    if date_to:
-        logs = logs.filter(date__lte=date_to)
+    all_animals = Animal.objects.only('id', 'name').order_by('name')
 
-    if health_filter:
-        logs = logs.filter(health_observation=health_filter)
+    context = {
+        'all_animals': all_animals,
+        'animal_filter': filters['animal'],
+        'date_from': filters['date_from'],
+        'date_to': filters['date_to'],
+        'health_filter': filters['health'],
+        'sort': sort,
+        'filter_query': filter_query,
+    }
 
-    all_animals = Animal.objects.all().order_by('name')
+    if request.GET.get('stream'):
+        context['stream'] = True
+        return _stream_manage_logs(request, logs, context)
 
-    return render(request, 'manage_logs.html', {
-        'logs': logs,
-        'all_animals': all_animals,
-        'animal_filter': animal_filter,
-        'date_from': date_from,
-        'date_to': date_to,
-        'health_filter': health_filter,
+    cursor = request.GET.get('cursor', '')
+    if cursor:
+        position = _decode_log_cursor(cursor, sort)
+        if position is None:
+            messages.warning(request, 'Invalid page cursor, showing the first page.')
+            cursor = ''
+        else:
+            last_value, last_id = position
+            logs = logs.filter(
+                Q(**{f'{sort_column}__lt': last_value})
+                | Q(**{sort_column: last_value, 'id__lt': last_id})
+            )
+
+    try:
+        page_size = int(request.GET.get('page_size', LOGS_PAGE_SIZE))
+    except ValueError:
+        page_size = LOGS_PAGE_SIZE
+    page_size = max(1, min(page_size, LOGS_MAX_PAGE_SIZE))
+
+    # Fetch one extra row to learn whether an older page exists
+    page = list(logs[:page_size + 1])
+    next_cursor = _encode_log_cursor(page[page_size - 1], sort) if len(page) > page_size else ''
+
+    context.update({
+        'logs': page[:page_size],
+        'cursor': cursor,
+        'next_cursor': next_cursor,
     })
+    return render(request, 'manage_logs.html', context)
+
+@login_required
+def export_logs(request):
+    """
+    Stream the logs matching the manage-logs filters as CSV or Parquet
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        messages.error(request, f'Unsupported export format: {export_format}.')
+        return redirect('manage-logs')
+
+    if request.GET.get('background'):
+        filters = {name: value for name, value in request.GET.items() if name not in ('format', 'background')}
+        job = enqueue('export_logs', {'format': export_format, 'filters': filters}, request.user)
+        messages.info(request, 'Your export is being prepared; download it here when it is ready.')
+        return redirect('job-detail', job_id=job.id)
+
+    logs, _ = filter_logs(request.GET)
+
+    if export_format == 'parquet':
+        try:
+            require_pyarrow()
+        except ImportError as e:
+            messages.error(request, str(e))
+            return redirect('manage-logs')
+        content = iter_parquet(logs)
+    else:
+        content = iter_csv(logs)
+
+    content_type, extension = EXPORT_FORMATS[export_format]
+    filename = f"dairysync-logs-{timezone.now():%Y%m%d}.{extension}"
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+IMPORT_ERRORS_SHOWN = 100
+
+# larger uploads are always imported by a background job
+IMPORT_INLINE_MAX_BYTES = 2 * 1024 * 1024
+
+
+@login_required
+def import_daily_logs_view(request):
+    """
+    Upsert daily logs from an uploaded CSV or XLSX file in batches
+    """
+    context = {'inline_max_mb': IMPORT_INLINE_MAX_BYTES // (1024 * 1024)}
+    if request.method != 'POST':
+        return render(request, 'import_daily_logs.html', context)
+
+    upload = request.FILES.get('file')
+    if not upload:
+        messages.warning(request, 'Please choose a CSV or XLSX file to import.')
+        return render(request, 'import_daily_logs.html', context)
+
+    if request.POST.get('background') or upload.size > IMPORT_INLINE_MAX_BYTES:
+        job = enqueue_import(upload, request.user)
+        messages.info(request, f'{upload.name} will be imported in the background.')
+        return redirect('job-detail', job_id=job.id)
+
+    try:
+        result = import_daily_logs(iter_rows(upload, upload.name), user=request.user)
+    except Exception as e:
+        messages.error(request, f'Error importing logs: {str(e)}')
+        return render(request, 'import_daily_logs.html', context)
+
+    if result.errors:
+        messages.warning(request, f'Imported {result.imported} log(s); {result.failed} row(s) had errors.')
+    else:
+        messages.success(request, f'Successfully imported {result.imported} log(s).')
+
+    return render(request, 'import_daily_logs.html', dict(
+        context,
+        result=result,
+        errors=result.errors[:IMPORT_ERRORS_SHOWN],
+    ))
+
+def _herd_grid_rows(animals, values_by_animal, errors=None):
+    return [
+        {
+            'animal': animal,
+            'cells': [
+                (grid_input_name(field, animal.id), values_by_animal.get(animal.id, {}).get(field, ''))
+                for field in GRID_FIELDS
+            ],
+            'errors': (errors or {}).get(animal.id, []),
+        }
+        for animal in animals
+    ]
+
+
+@login_required
+def herd_log_entry(request):
+    """
+    Enter milk, feed and water for the whole herd on one date in a single submit
+    """
+    raw_date = request.POST.get('date') if request.method == 'POST' else request.GET.get('date')
+    try:
+        log_date = DailyLog._meta.get_field('date').clean(raw_date or timezone.localdate(), None)
+        valid_date = True
+    except ValidationError:
+        messages.error(request, f'Invalid date: {raw_date}')
+        log_date = timezone.localdate()
+        valid_date = False
+
+    animals = list(Animal.objects.order_by('name', 'id').only('id', 'name', 'breed'))
+    errors = None
+    if request.method == 'POST':
+        # keep what was typed so only the bad cells need fixing
+        values_by_animal = read_grid(request.POST, [animal.id for animal in animals])
+        if valid_date:
+            result = save_herd_entries(log_date, values_by_animal, user=request.user)
+            if not result.errors:
+                messages.success(
+                    request,
+                    f'Saved logs for {log_date}: {result.created} added, {result.updated} updated.',
+                )
+                return redirect(f"{reverse('herd-log-entry')}?{urlencode({'date': log_date})}")
+            messages.error(
+                request,
+                f'Nothing was saved: {len(result.errors)} animal(s) have errors. Fix them and submit again.',
+            )
+            errors = result.errors
+    else:
+        values_by_animal = {
+            log['animal_id']: {field: log[field] for field in GRID_FIELDS}
+            for log in DailyLog.objects.filter(date=log_date).values('animal_id', *GRID_FIELDS)
+        }
+
+    return render(request, 'herd_log_entry.html', {
+        'date': log_date,
+        'fields': GRID_FIELDS,
+        'rows': _herd_grid_rows(animals, values_by_animal, errors),
+    })
+
+
+# deleting more matching logs than this is left to a background job
+DELETE_INLINE_MAX_LOGS = 5000
+
 
 @login_required
 def bulk_delete_logs(request):
     """
-    Handle bulk deletion of daily logs
+    Handle bulk deletion of daily logs, either the selected ones or, with
+    ``delete_all_matching``, every log matching the current filters
     """
     if request.method != 'POST':
         messages.warning(request, 'Invalid request method.')
         return redirect('manage-logs')
-    
-    # Get log IDs from form
-    log_ids = request.POST.getlist('log_ids')
-    
-    if not log_ids:
-        messages.warning(request, 'No logs selected for deletion.')
-        return redirect('manage-logs')
-    
+
+    # the form carries the manage-logs filters under its own names
+    filter_params = {
+        'animal': request.POST.get('animal_filter', ''),
+        'date_from': request.POST.get('date_from', ''),
+        'date_to': request.POST.get('date_to', ''),
+        'health': request.POST.get('health_filter', ''),
+    }
+
     try:
-        # Get logs to be deleted for the success message
-        logs_to_delete = DailyLog.objects.filter(id__in=log_ids).select_related('animal')
-        
-        if not logs_to_delete.exists():
+        # malformed filters or ids fail here, inside the try
+        if request.POST.get('delete_all_matching'):
+            if not any(filter_params.values()):
+                messages.warning(request, 'Apply at least one filter before deleting all matching logs.')
+                return redirect('manage-logs')
+            logs_to_delete, _ = filter_logs(filter_params)
+        else:
+            # Get log IDs from form
+            log_ids = request.POST.getlist('log_ids')
+
+            if not log_ids:
+                messages.warning(request, 'No logs selected for deletion.')
+                return redirect('manage-logs')
+            logs_to_delete = DailyLog.objects.filter(id__in=log_ids)
+
+        # Collect information for the success message in one query
+        summary = summarize_logs(logs_to_delete)
+
+        if not summary['count']:
             messages.warning(request, 'No valid logs found to delete.')
             return redirect('manage-logs')
-        
-        # Collect information for success message
-        animal_names = set()
-        date_range = []
-        
-        for log in logs_to_delete:
-            animal_names.add(log.animal.name)
-            date_range.append(log.date)
-        
+
+        if request.POST.get('delete_all_matching') and summary['count'] > DELETE_INLINE_MAX_LOGS:
+            job = enqueue('delete_logs', {'filters': filter_params}, request.user)
+            messages.info(request, f"{summary['count']} log(s) will be deleted in the background.")
+            return redirect('job-detail', job_id=job.id)
+
         # Delete the logs
-        deleted_count, _ = logs_to_delete.delete()
-        
+        deleted_count = delete_logs(logs_to_delete)
+
         # Create success message
-        if len(animal_names) == 1:
-            animal_msg = f"animal {list(animal_names)[0]}"
+        if summary['animal_name']:
+            animal_msg = f"animal {summary['animal_name']}"
         else:
-            animal_msg = f"{len(animal_names)} animals"
-        
-        date_min = min(date_range) if date_range else ''
-        date_max = max(date_range) if date_range else ''
-        
+            animal_msg = f"{summary['animals']} animals"
+
+        date_min, date_max = summary['first_date'], summary['last_date']
+
         if date_min == date_max:
             date_msg = f"from {date_min}"
-        elif date_min and date_max:
-            date_msg = f"from {date_min} to {date_max}"
         else:
-            date_msg = ""
-        
+            date_msg = f"from {date_min} to {date_max}"
+
         messages.success(request, f'Successfully deleted {deleted_count} log(s) for {animal_msg} {date_msg}.')
-        
+
         # Build redirect URL with preserved filters
         redirect_url = 'manage-logs'
         params = {}
@@ -530,7 +982,6 @@ def bulk_delete_logs(request):
         redirect_to = request.POST.get('redirect_to', 'manage-logs')
         
         # Build the final URL
-        from urllib.parse import urlencode
         if params:
             redirect_url = f"{redirect_to}?{urlencode(params)}"
         else:
@@ -565,4 +1016,84 @@ def delete_daily_log(request, log_id):
     return render(request, 'delete_daily_log.html', {
         'daily_log': daily_log,
         'animal': daily_log.animal,
-    })
\ No newline at end of file
+    })
+
+JOBS_SHOWN = 50
+
+
+@login_required
+def jobs_page(request):
+    """
+    The farm's recent background jobs
+    """
+    jobs = Job.objects.select_related('created_by')[:JOBS_SHOWN]
+    return render(request, 'jobs.html', {'jobs': jobs})
+
+
+@login_required
+def job_detail(request, job_id):
+    """
+    One background job; the page polls the job status API until it finishes
+    """
+    job = get_object_or_404(Job, id=job_id)
+    return render(request, 'job_detail.html', {'job': job})
+
+
+@login_required
+def job_download(request, job_id):
+    """
+    Download the file written by a finished export job
+    """
+    job = get_object_or_404(Job, id=job_id, kind='export_logs', status='succeeded')
+    try:
+        # FileResponse closes the file once it has been sent
+        file = open(stored_job_file(job.result['file']), 'rb')
+    except (ValueError, FileNotFoundError):
+        raise Http404('The export file is no longer available.')
+    return FileResponse(
+        file, as_attachment=True, filename=job.result['filename'], content_type=job.result['content_type'],
+    )
+
+
+def _price(value, default):
+    if value in (None, ''):
+        return default
+    price = float(value)
+    if price < 0:
+        raise ValueError('prices must not be negative')
+    return price
+
+
+@login_required
+def feed_efficiency_report(request):
+    """
+    Milk per kilogram of feed for each animal, breed and the herd over a
+    range of days, as a page or, with ``format=csv``, a CSV download
+    """
+    try:
+        start, end = parse_range(request.GET)
+        feed_cost = _price(request.GET.get('feed_cost'), FEED_COST_PER_KG)
+        milk_price = _price(request.GET.get('milk_price'), MILK_PRICE_PER_LITRE)
+    except (ValueError, OverflowError) as e:
+        messages.error(request, f'Invalid report range: {e}.')
+        return redirect('feed-efficiency')
+
+    try:
+        report, hit = cached_feed_efficiency(start, end, feed_cost, milk_price)
+    except ImportError as e:
+        messages.error(request, str(e))
+        return redirect('manage-logs')
+
+    if request.GET.get('format') == 'csv':
+        level = request.GET.get('level', 'animal')
+        if level not in REPORT_LEVELS:
+            level = 'animal'
+        response = StreamingHttpResponse(iter_report_csv(report, level), content_type='text/csv')
+        response['Content-Disposition'] = (
+            f'attachment; filename="dairysync-feed-efficiency-{level}-{start:%Y%m%d}-{end:%Y%m%d}.csv"'
+        )
+    else:
+        context = dict(report, feed_cost=feed_cost, milk_price=milk_price, params=request.GET.urlencode())
+        response = render(request, 'feed_efficiency.html', context)
+    response['X-View-Cache'] = 'hit' if hit else 'miss'
+    return response
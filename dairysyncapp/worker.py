@@ -0,0 +1,24 @@
+"""
+Entry points of the run_worker pool processes.
+
+The pool starts its processes with ``spawn``, so none of them inherits
+the parent's open database connections. Each sets Django up on its own,
+which is why this module imports nothing that needs the app registry.
+"""
+import django
+from django.db import close_old_connections
+
+
+def setup_process():
+    django.setup()
+
+
+def run_job(job_id):
+    """Run one claimed job and return its final status"""
+    from .jobs import run_job
+
+    close_old_connections()
+    try:
+        return run_job(job_id).status
+    finally:
+        close_old_connections()